@@ -44,12 +44,17 @@ from components.estadisticas import estadisticas
 from components.ajustes import ajustes
 
 import services.auth as auth
+from services.db import init_pool
 import components.login_page as login_page
 
 #Imagen en assets (luis.jpg)
 img = Path(__file__).parent / 'assets' / 'gota.png'
 st.set_page_config(page_title="Rainly", layout="wide", initial_sidebar_state="auto", page_icon=img)
 
+# Pool de conexiones listo (y precalentado) antes de la primera consulta.
+# Idempotente: en los reruns siguientes no hace nada.
+init_pool()
+
 # Cargar CSS
 _css_general = Path(__file__).parent / 'assets' / 'general.css'
 _css_registrar = Path(__file__).parent / 'assets' / '1_registrar.css'
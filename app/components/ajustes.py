@@ -6,6 +6,7 @@ import streamlit as st
 from pathlib import Path
 import pandas as pd
 from components.loader import show_loader
+from components.rendimiento import rendimiento
 
 def ajustes():
     show_loader('show_ajustes_loader', min_seconds=2.0)
@@ -47,8 +48,18 @@ def ajustes():
         evaluados(can_delete=False, user_id=uid)
         return
 
+    is_admin = False
+    try:
+        is_admin = auth.is_admin()
+    except Exception:
+        is_admin = False
+
     # Usuario no especialista -> vista completa de ajustes
-    tab1, tab2, tab3, tab4 = st.tabs(["Evaluados", "Grupos", "Usuarios", "Indicadores"])
+    tab_names = ["Evaluados", "Grupos", "Usuarios", "Indicadores"]
+    if is_admin:
+        tab_names.append("Rendimiento")
+    tabs = st.tabs(tab_names)
+    tab1, tab2, tab3, tab4 = tabs[:4]
 
     with tab1:
         evaluados()
@@ -58,5 +69,8 @@ def ajustes():
         usuarios()  
     with tab4:
         indicadores()
+    if is_admin:
+        with tabs[4]:
+            rendimiento()
     # show_loader('show_ajustes_loader', min_seconds=1.0)
     
\ No newline at end of file
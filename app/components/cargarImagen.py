@@ -8,9 +8,10 @@ from streamlit_js_eval import streamlit_js_eval
 
 from config.settings import TEMP_DIR, ORIGINALS_DIR
 from services.image_preprocess import estandarizar_imagen
-from services.indicadores import simular_resultado
+from services.inferencia import enviar_inferencia, estado_inferencia, resultado_inferencia
 from services.db import fetch_df
-from services.queries.q_registro import CREAR_EVALUADO, GET_GRUPOS, POST_PRUEBA, POST_RESULTADO 
+from services.queries.q_registro import CREAR_EVALUADO, GET_GRUPOS
+from services.pruebas import construir_resultados, guardar_prueba_con_resultados, metadata_imagen_archivada
 from services.queries.q_usuarios import GET_ESPECIALISTAS
 from components.bounding_boxes import imagen_bboxes
 import streamlit as st
@@ -360,11 +361,14 @@ def cargar_imagen_component():
                         should_run = st.session_state.get('_run_inference_on_results', False)
                         cached = st.session_state.get('raw_indicadores', None)
                         if should_run or cached is None:
-                            raw_indicadores = simular_resultado(id_evaluado, show_overlay=True)
-                            try:
+                            # Encola la inferencia una sola vez; los reruns sólo consultan el estado
+                            job_id = st.session_state.get('_inferencia_job_id')
+                            estado = estado_inferencia(job_id) if job_id else None
+                            if should_run or estado is None or estado.get('estado') == 'error':
+                                job_id = enviar_inferencia(id_evaluado)
+                                st.session_state['_inferencia_job_id'] = job_id
                                 st.session_state['_run_inference_on_results'] = False
-                            except Exception:
-                                pass
+                            raw_indicadores = resultado_inferencia(job_id, show_overlay=True)
                             try:
                                 st.session_state['raw_indicadores'] = raw_indicadores
                             except Exception:
@@ -942,64 +946,20 @@ def cargar_imagen_component():
                                     "fecha": fecha_actual,
                                 }
 
-                                sql_prueba = POST_PRUEBA
-                                df_prueba = fetch_df(sql_prueba, params_prueba)
-                                if not df_prueba.empty:
-                                    try:
-                                        id_prueba = int(df_prueba.at[0, "id_prueba"])
-                                    except Exception:
-                                        id_prueba = int(df_prueba.iloc[0, 0])
-                                else:
-                                    raise Exception("No se obtuvo id_prueba al insertar la prueba")
+                                # Prueba + resultados en un solo lote atómico
+                                indicadores = st.session_state.get("indicadores", [])
+                                # Metadata de la imagen archivada (tamaño, orientación, hash) leída una sola vez;
+                                # se guarda con la prueba para que las vistas no tengan que abrirla
+                                imagen_meta = metadata_imagen_archivada(
+                                    ruta_imagen, st.session_state["uploaded_file"],
+                                    st.session_state.get('last_ruta_gcs'), st.session_state.get('last_preview_local'),
+                                )
+                                resultados = construir_resultados(indicadores, imagen_meta["ancho"], imagen_meta["alto"])
+                                id_prueba = guardar_prueba_con_resultados(params_prueba, resultados, imagen_meta)
                         except Exception as e:
                             st.error(f"Error al registrar la prueba en la base de datos: {e}")
                             return
 
-                        # SUBIR RESULTADOS
-                        try:
-                            indicadores = st.session_state.get("indicadores", [])
-                            try:
-                                img_for_norm = Image.open(st.session_state["uploaded_file"])
-                                img_w, img_h = img_for_norm.size
-                            except Exception:
-                                img_w, img_h = None, None
-
-                            for ind in indicadores:
-                                iid = ind.get("id_indicador") or ind.get("id")
-                                x_min = float(ind.get("x_min", 0))
-                                x_max = float(ind.get("x_max", 0))
-                                y_min = float(ind.get("y_min", 0))
-                                y_max = float(ind.get("y_max", 0))
-                                confianza = float(ind.get("confianza", 0.0))
-
-                                if img_w and img_h and img_w > 0 and img_h > 0:
-                                    x_min_norm = x_min / img_w
-                                    y_min_norm = y_min / img_h
-                                    w_norm = (x_max - x_min) / img_w
-                                    h_norm = (y_max - y_min) / img_h
-                                else:
-                                    x_min_norm = x_min
-                                    y_min_norm = y_min
-                                    w_norm = (x_max - x_min)
-                                    h_norm = (y_max - y_min)
-
-                                params_res = {
-                                    "id_prueba": id_prueba,
-                                    "id_indicador": iid,
-                                    "x_min": x_min_norm,
-                                    "y_min": y_min_norm,
-                                    "x_max": w_norm,
-                                    "y_max": h_norm,
-                                    "confianza": confianza,
-                                }
-
-                                sql_res = POST_RESULTADO
-                                # Ejecutar INSERT de resultado (fetch_df manejará commit)
-                                fetch_df(sql_res, params_res)
-                        except Exception as e:
-                            st.error(f"Error al registrar los resultados en la base de datos: {e}")
-                            return
-
                         # LIMPIAR Y VOLVER A INICIO
                         st.session_state['created_ok'] = True
                         st.session_state["active_view"] = "inicio"
@@ -1018,6 +978,7 @@ def cargar_imagen_component():
                         st.session_state["uploaded_file"] = None
                         st.session_state["indicadores"] = None
                         # Clear cached raw indicators used to avoid re-running inference
+                        st.session_state.pop('_inferencia_job_id', None)
                         if 'raw_indicadores' in st.session_state:
                             try:
                                 del st.session_state['raw_indicadores']
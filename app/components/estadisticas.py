@@ -1,23 +1,13 @@
 from pathlib import Path
 from services.queries.q_estadisticas import (
-    GET_EVALUACIONES_TOTALES, 
-    GET_CANTIDAD_EVALUADOS, 
-    GET_EVALUACIONES_POR_PERSONA, 
-    GET_EVALUACIONES_TOTALES_FILTERED,
-    GET_CANTIDAD_EVALUADOS_FILTERED,
-    GET_EVALUACIONES_POR_PERSONA_FILTERED,
-    GET_EVALUACIONES_POR_MES_FILTERED,
-    GET_EVALUACIONES_POR_ANIO_FILTERED,
     GET_LISTA_EVALUADOS,
     GET_LISTA_GRUPOS,
     GET_LISTA_SEXOS,
     GET_RANGO_FECHAS
 )
-from services.queries.q_estadisticas import (
-    GET_EVALUACIONES_POR_MES,
-    GET_EVALUACIONES_POR_ANIO,
-)
-from services.db import fetch_df
+from services.db import fetch_df_many
+from services.estadisticas import resumen_estadisticas
+from services.analitica_indicadores import analitica_indicadores
 import streamlit as st
 import pandas as pd
 import datetime
@@ -30,10 +20,17 @@ def modal_filtros():
     
     # Obtener datos para los selectores
     try:
-        df_evaluados = fetch_df(GET_LISTA_EVALUADOS)
-        df_grupos = fetch_df(GET_LISTA_GRUPOS)
-        df_sexos = fetch_df(GET_LISTA_SEXOS)
-        df_rango_fechas = fetch_df(GET_RANGO_FECHAS)
+        # Cuatro consultas independientes: en paralelo
+        opciones, _ = fetch_df_many({
+            'evaluados': GET_LISTA_EVALUADOS,
+            'grupos': GET_LISTA_GRUPOS,
+            'sexos': GET_LISTA_SEXOS,
+            'rango_fechas': GET_RANGO_FECHAS,
+        })
+        df_evaluados = opciones['evaluados']
+        df_grupos = opciones['grupos']
+        df_sexos = opciones['sexos']
+        df_rango_fechas = opciones['rango_fechas']
     except Exception as e:
         st.error(f"Error al cargar opciones de filtros: {e}")
         df_evaluados = pd.DataFrame()
@@ -207,6 +204,90 @@ def modal_filtros():
             st.rerun()
 
 
+def indicadores_estadisticas(filtros):
+    """Prevalencia, co-ocurrencia (lift) y prevalencia por cohorte de los indicadores."""
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        st.markdown('<div class="chart-title">Indicadores</div>', unsafe_allow_html=True)
+    with col2:
+        cohorte = st.selectbox('Cohorte', options=['Sexo', 'Grupo'], key='indicadores_cohorte',
+                               label_visibility='collapsed')
+
+    try:
+        datos = analitica_indicadores(filtros, cohorte=cohorte.lower())
+    except Exception as e:
+        st.error(f"Error al obtener la analítica de indicadores: {e}")
+        return
+
+    prevalencia = datos['prevalencia']
+    if prevalencia.empty:
+        st.info('No hay indicadores detectados para los filtros seleccionados.')
+        return
+
+    st.caption(f"{datos['n_pruebas']} evaluaciones")
+    top = prevalencia.head(12)['indicador'].tolist()
+    tab_prev, tab_cooc, tab_asoc, tab_coh = st.tabs(['Prevalencia', 'Co-ocurrencia', 'Asociaciones', 'Por cohorte'])
+
+    with tab_prev:
+        df_prev = prevalencia.head(15).assign(Porcentaje=lambda d: (d['prevalencia'] * 100).round(1))
+        chart = (
+            alt.Chart(df_prev)
+            .mark_bar(color='#FFD751')
+            .encode(
+                x=alt.X('Porcentaje', title='% de evaluaciones'),
+                y=alt.Y('indicador', sort='-x', title=None),
+                tooltip=['indicador', 'pruebas', 'Porcentaje'],
+            )
+            .properties(height=360)
+        )
+        st.altair_chart(chart, use_container_width=True)
+
+    with tab_cooc:
+        # Lift > 1: aparecen juntos más de lo esperado si fueran independientes
+        df_cooc = datos['coocurrencia']
+        df_cooc = df_cooc[df_cooc['indicador_a'].isin(top) & df_cooc['indicador_b'].isin(top)
+                          & (df_cooc['indicador_a'] != df_cooc['indicador_b'])]
+        chart = (
+            alt.Chart(df_cooc)
+            .mark_rect()
+            .encode(
+                x=alt.X('indicador_a', sort=top, title=None),
+                y=alt.Y('indicador_b', sort=top, title=None),
+                color=alt.Color('lift', scale=alt.Scale(scheme='yelloworangered'), title='Lift'),
+                tooltip=['indicador_a', 'indicador_b', 'pruebas', alt.Tooltip('lift', format='.2f')],
+            )
+            .properties(height=420)
+        )
+        st.altair_chart(chart, use_container_width=True)
+
+    with tab_asoc:
+        df_asoc = datos['asociaciones']
+        if df_asoc.empty:
+            st.info('No hay pares de indicadores con suficientes evaluaciones en común.')
+        else:
+            st.dataframe(
+                df_asoc.rename(columns={
+                    'indicador_a': 'Indicador A', 'indicador_b': 'Indicador B', 'pruebas': 'Evaluaciones',
+                    'soporte': 'Soporte', 'confianza_ab': 'P(B | A)', 'confianza_ba': 'P(A | B)', 'lift': 'Lift',
+                }).round(3),
+                hide_index=True,
+                use_container_width=True,
+            )
+
+    with tab_coh:
+        df_coh = datos['por_cohorte']
+        df_coh = df_coh[df_coh['indicador'].isin(top)]
+        tabla = (
+            df_coh.assign(Porcentaje=(df_coh['prevalencia'] * 100).round(1))
+            .pivot_table(index='indicador', columns='cohorte', values='Porcentaje')
+            .reindex(top)
+        )
+        tabla.index.name = 'Indicador'
+        st.dataframe(tabla, use_container_width=True)
+        n_coh = df_coh.drop_duplicates('cohorte').set_index('cohorte')['pruebas_cohorte']
+        st.caption(' · '.join(f"{c}: {int(n)} evaluaciones" for c, n in n_coh.items()) + ' · valores en % de evaluaciones de la cohorte')
+
+
 def estadisticas():
     _loader_handle = start_loader('show_estadisticas_loader')
     
@@ -272,22 +353,16 @@ def estadisticas():
     # ---------- CARDS DE ESTADÍSTICAS PRINCIPALES ----------
     col1, col2, col3 = st.columns(3)
     
-    # Preparar parámetros según si hay filtros o no
-    if filtros_activos:
-        params = st.session_state.filtros_aplicados
-    else:
-        params = None
-    
+    # KPIs y series en una sola consulta, cacheada por filtros
+    try:
+        resumen = resumen_estadisticas(st.session_state.filtros_aplicados)
+    except Exception as e:
+        resumen = {}
+        st.error(f"Error al obtener estadísticas: {e}")
+
     with col1:
-        try:
-            if filtros_activos:
-                evaluaciones_totales = fetch_df(GET_EVALUACIONES_TOTALES_FILTERED, params).iloc[0, 0]
-            else:
-                evaluaciones_totales = fetch_df(GET_EVALUACIONES_TOTALES).iloc[0, 0]
-        except Exception as e:
-            evaluaciones_totales = 0
-            st.error(f"Error al obtener evaluaciones totales: {e}")
-        
+        evaluaciones_totales = resumen.get('evaluaciones_totales', 0)
+
         st.markdown(f"""
         <div class="stat-card">
             <div class="stat-icon">{folder_icon}</div>
@@ -299,15 +374,8 @@ def estadisticas():
         """, unsafe_allow_html=True)
     
     with col2:
-        try:
-            if filtros_activos:
-                cantidad_evaluados = fetch_df(GET_CANTIDAD_EVALUADOS_FILTERED, params).iloc[0, 0]
-            else:
-                cantidad_evaluados = fetch_df(GET_CANTIDAD_EVALUADOS).iloc[0, 0]
-        except Exception as e:
-            cantidad_evaluados = 0
-            st.error(f"Error al obtener cantidad de evaluados: {e}")
-        
+        cantidad_evaluados = resumen.get('cantidad_evaluados', 0)
+
         st.markdown(f"""
         <div class="stat-card">
             <div class="stat-icon">{users_icon}</div>
@@ -319,15 +387,8 @@ def estadisticas():
         """, unsafe_allow_html=True)
     
     with col3:
-        try:
-            if filtros_activos:
-                avg_evaluaciones = round(fetch_df(GET_EVALUACIONES_POR_PERSONA_FILTERED, params).iloc[0, 0], 2)
-            else:
-                avg_evaluaciones = round(fetch_df(GET_EVALUACIONES_POR_PERSONA).iloc[0, 0], 2)
-        except Exception as e:
-            avg_evaluaciones = 0.0
-            st.error(f"Error al obtener promedio de evaluaciones: {e}")
-        
+        avg_evaluaciones = resumen.get('promedio_evaluaciones', 0.0)
+
         st.markdown(f"""
         <div class="stat-card">
             <div class="stat-icon">{chart_icon}</div>
@@ -350,14 +411,7 @@ def estadisticas():
         
         MONTH_SHORT = ['Ene', 'Feb', 'Mar', 'Abr', 'May', 'Jun', 'Jul', 'Ago', 'Sep', 'Oct', 'Nov', 'Dic']
 
-        try:
-            if filtros_activos:
-                params_anio = st.session_state.filtros_aplicados.copy()
-                df_years = fetch_df(GET_EVALUACIONES_POR_ANIO_FILTERED, params_anio)
-            else:
-                df_years = fetch_df(GET_EVALUACIONES_POR_ANIO)
-        except Exception:
-            df_years = pd.DataFrame()
+        df_years = resumen.get('por_anio', pd.DataFrame())
 
         available_years = []
         if not df_years.empty and 'anio' in df_years.columns:
@@ -371,15 +425,10 @@ def estadisticas():
                               index=(len(available_years)-1 if available_years else 0), 
                               label_visibility='collapsed')
 
-        try:
-            if filtros_activos:
-                params_mes = st.session_state.filtros_aplicados.copy()
-                params_mes['anio'] = int(year)
-                df_mes = fetch_df(GET_EVALUACIONES_POR_MES_FILTERED, params_mes)
-            else:
-                df_mes = fetch_df(GET_EVALUACIONES_POR_MES, {'anio': int(year)})
-        except Exception:
-            df_mes = pd.DataFrame()
+        # La serie mensual trae todos los años: cambiar de año no consulta la BD
+        df_mes = resumen.get('por_mes', pd.DataFrame())
+        if not df_mes.empty:
+            df_mes = df_mes[df_mes['anio'].astype(int) == int(year)].copy()
 
         months_df = pd.DataFrame({'mes_num': list(range(1, 13)), 'Mes': MONTH_SHORT})
         if df_mes.empty:
@@ -410,13 +459,7 @@ def estadisticas():
     with col_right:
         st.markdown('<div class="chart-title">Evaluaciones por año</div>', unsafe_allow_html=True)
         
-        try:
-            if filtros_activos:
-                df_anio = fetch_df(GET_EVALUACIONES_POR_ANIO_FILTERED, st.session_state.filtros_aplicados)
-            else:
-                df_anio = fetch_df(GET_EVALUACIONES_POR_ANIO)
-        except Exception:
-            df_anio = pd.DataFrame()
+        df_anio = resumen.get('por_anio', pd.DataFrame())
 
         if df_anio.empty:
             st.info('No hay datos de evaluaciones por año en la base de datos.')
@@ -438,6 +481,10 @@ def estadisticas():
             stop_loader(_loader_handle, min_seconds=1.0)
             _loader_handle = None
 
+    # ---------- INDICADORES: PREVALENCIA, CO-OCURRENCIA Y LIFT ----------
+    st.markdown('<div class="section-spacer"></div>', unsafe_allow_html=True)
+    indicadores_estadisticas(st.session_state.filtros_aplicados)
+
     try:
         if _loader_handle is not None:
             stop_loader(_loader_handle, min_seconds=1.0)
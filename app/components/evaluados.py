@@ -3,8 +3,11 @@ import pandas as pd
 from typing import List, Dict
 from pathlib import Path
 from services.exportar import render_export_popover
-from services.db import fetch_df
-from services.queries.q_evaluados import LISTADO_EVALUADOS_SQL, ELIMINAR_EVALUADOS
+from services.db import fetch_df, transaction
+from services.estadisticas import invalidar_estadisticas
+from services.resumen_diario import dias_de_evaluados, actualizar_resumen_diario
+from services import listados
+from services.queries.q_evaluados import ELIMINAR_EVALUADOS
 from services.queries.q_registro import GET_GRUPOS, CREAR_EVALUADO
 from services.queries.q_usuarios import GET_ESPECIALISTAS
 # sqlalchemy removed; use fetch_df
@@ -21,11 +24,6 @@ def load_grupos_cache():
     return fetch_df(GET_GRUPOS)
 
 
-@st.cache_data(ttl=300, max_entries=64)
-def load_listado_evaluados_base():
-    return fetch_df(LISTADO_EVALUADOS_SQL)
-
-
 @st.dialog(":material/warning: Confirmar Eliminación")
 def confirmar_eliminacion_historial(selected_rows_df):
     """Dialogo para confirmar eliminación de registros en historial."""
@@ -77,7 +75,11 @@ def confirmar_eliminacion_historial(selected_rows_df):
 
                         placeholders = ','.join(['%s'] * len(ids))
                         sql_del = f"DELETE FROM Evaluado OUTPUT DELETED.id_evaluado AS deleted_id WHERE id_evaluado IN ({placeholders})"
-                        df_deleted = fetch_df(sql_del, tuple(ids))
+                        with transaction() as uow:
+                            dias = dias_de_evaluados(uow, ids)
+                            df_deleted = uow.fetch_df(sql_del, tuple(ids))
+                            actualizar_resumen_diario(uow, dias)
+                        invalidar_estadisticas()
                         try:
                             rows_deleted = len(df_deleted) if df_deleted is not None else 0
                         except Exception:
@@ -87,13 +89,13 @@ def confirmar_eliminacion_historial(selected_rows_df):
                         st.session_state[msg_key] = f"Se eliminaron {rows_deleted} evaluado(s)."
                         # Invalidate cached read results so next view shows fresh data
                         try:
-                            load_listado_evaluados_base.clear()
                             load_grupos_cache.clear()
                             load_especialistas.clear()
                         except Exception:
                             pass
-                        # Actualizar datos en session_state
-                        st.session_state['evaluados_df'] = pd.DataFrame(get_historial_data())
+                        # La página se vuelve a pedir en el siguiente render
+                        if 'evaluados_df' in st.session_state:
+                            del st.session_state['evaluados_df']
                         st.session_state['historial_selection'] = {'rows': []}
                     except Exception as e:
                         st.error(f"Error al eliminar evaluados: {e}")
@@ -385,7 +387,6 @@ def dialog_crear_evaluado():
                     del st.session_state['evaluados_df']
                 # Invalidate cached read results so next view shows fresh data
                 try:
-                    load_listado_evaluados_base.clear()
                     load_grupos_cache.clear()
                     load_especialistas.clear()
                 except Exception:
@@ -622,14 +623,17 @@ def dialog_editar_evaluado(evaluado_data):
                     "id_usuario": int(id_usuario_selected) if id_usuario_selected is not None else None
                 }
 
-                fetch_df(update_query, params_update)
+                # Sexo, grupo o especialista cambian las filas del resumen diario
+                with transaction() as uow:
+                    uow.execute(update_query, params_update)
+                    actualizar_resumen_diario(uow, dias_de_evaluados(uow, [id_evaluado]))
+                invalidar_estadisticas()
 
                 st.success(f":material/check: Evaluado '{nombre}' actualizado correctamente")
                 if 'evaluados_df' in st.session_state:
                     del st.session_state['evaluados_df']
                 # Invalidate cached read results so next view shows fresh data
                 try:
-                    load_listado_evaluados_base.clear()
                     load_grupos_cache.clear()
                     load_especialistas.clear()
                 except Exception:
@@ -643,209 +647,144 @@ def dialog_editar_evaluado(evaluado_data):
 
 
 @st.dialog(":material/filter_list: Filtros")
-def dialog_filtros(key_prefix: str = None):
+def _filtros_key(key_prefix: str = None) -> str:
+    """Clave de los filtros activos en session_state, propia de cada instancia de
+    la vista: así no se mezclan con los de otra vista ni con los de otro usuario."""
+    return f"{key_prefix}__active_filters" if key_prefix else "evaluados_active_filters"
+
+
+def dialog_filtros(key_prefix: str = None, user_id: int = None):
     """Diálogo para filtrar datos por columnas."""
     
     st.write("Selecciona los filtros que deseas aplicar:")
     
-    # Obtener datos originales
-    original_data = get_historial_data()
-    df_original = pd.DataFrame(original_data)
+    # Opciones de cada filtro calculadas en el servidor (sin traer el listado)
+    try:
+        opciones = listados.evaluados_opciones_filtro(user_id)
+    except Exception as e:
+        st.error(f"Error fetching data from database: {e}")
+        opciones = {}
     
     # Inicializar filtros en session_state si no existen
-    if 'active_filters' not in st.session_state:
-        st.session_state['active_filters'] = {}
-    
-    # Filtro por Sexo
-    sexo_options = ["Todos"] + sorted(df_original['Sexo'].dropna().unique().tolist())
-    sexo_filter = st.selectbox(
-        "Sexo",
-        sexo_options,
-        index=sexo_options.index(st.session_state['active_filters'].get('Sexo', 'Todos')) if st.session_state['active_filters'].get('Sexo', 'Todos') in sexo_options else 0,
-        key=(f"{key_prefix}__filter_sexo" if key_prefix else "filter_sexo")
-    )
-    
-    # Filtro por Estado civil
-    estado_options = ["Todos"] + sorted(df_original['Estado civil'].dropna().unique().tolist())
-    estado_filter = st.selectbox(
-        "Estado civil",
-        estado_options,
-        index=estado_options.index(st.session_state['active_filters'].get('Estado civil', 'Todos')) if st.session_state['active_filters'].get('Estado civil', 'Todos') in estado_options else 0,
-        key=(f"{key_prefix}__filter_estado" if key_prefix else "filter_estado")
-    )
-    
-    # Filtro por Escolaridad
-    escolaridad_options = ["Todos"] + sorted(df_original['Escolaridad'].dropna().unique().tolist())
-    escolaridad_filter = st.selectbox(
-        "Escolaridad",
-        escolaridad_options,
-        index=escolaridad_options.index(st.session_state['active_filters'].get('Escolaridad', 'Todos')) if st.session_state['active_filters'].get('Escolaridad', 'Todos') in escolaridad_options else 0,
-        key=(f"{key_prefix}__filter_escolaridad" if key_prefix else "filter_escolaridad")
-    )
-    
-    # Filtro por Ocupación
-    ocupacion_options = ["Todos"] + sorted(df_original['Ocupación'].dropna().unique().tolist())
-    ocupacion_filter = st.selectbox(
-        "Ocupación",
-        ocupacion_options,
-        index=ocupacion_options.index(st.session_state['active_filters'].get('Ocupación', 'Todos')) if st.session_state['active_filters'].get('Ocupación', 'Todos') in ocupacion_options else 0,
-        key=(f"{key_prefix}__filter_ocupacion" if key_prefix else "filter_ocupacion")
-    )
-    
-    # Filtro por Grupo
-    grupo_options = ["Todos"] + sorted(df_original['Grupo'].dropna().unique().tolist())
-    grupo_filter = st.selectbox(
-        "Grupo",
-        grupo_options,
-        index=grupo_options.index(st.session_state['active_filters'].get('Grupo', 'Todos')) if st.session_state['active_filters'].get('Grupo', 'Todos') in grupo_options else 0,
-        key=(f"{key_prefix}__filter_grupo" if key_prefix else "filter_grupo")
-    )
+    filtros_key = _filtros_key(key_prefix)
+    if filtros_key not in st.session_state:
+        st.session_state[filtros_key] = {}
+    activos = st.session_state[filtros_key]
+
+    if key_prefix:
+        def _k(s):
+            return f"{key_prefix}__{s}"
+    else:
+        def _k(s):
+            return s
+
+    campos = [
+        ('Sexo', 'filter_sexo'),
+        ('Estado civil', 'filter_estado'),
+        ('Escolaridad', 'filter_escolaridad'),
+        ('Ocupación', 'filter_ocupacion'),
+        ('Grupo', 'filter_grupo'),
+    ]
+    # El especialista sólo tiene sentido en el listado global
+    if user_id is None:
+        campos.append(('Especialista', 'filter_especialista'))
+
+    seleccion = {}
+    for campo, widget_key in campos:
+        options = ["Todos"] + opciones.get(campo, [])
+        actual = activos.get(campo, 'Todos')
+        seleccion[campo] = st.selectbox(
+            campo,
+            options,
+            index=options.index(actual) if actual in options else 0,
+            key=_k(widget_key)
+        )
     
     # Filtro por edad mínima
     edad_min = st.number_input(
         "Edad mínima",
         min_value=18,
         max_value=100,
-        value=st.session_state['active_filters'].get('edad_min', 18),
-        key=(f"{key_prefix}__filter_edad_min" if key_prefix else "filter_edad_min")
+        value=activos.get('edad_min', 18),
+        key=_k("filter_edad_min")
     )
     
     col1, col3 = st.columns(2)
-    if key_prefix:
-        def _k(s):
-            return f"{key_prefix}__{s}"
-    else:
-        def _k(s):
-            return s
 
     with col1:
         st.markdown("<br><br/>", unsafe_allow_html=True)
         if st.button(":material/refresh: Limpiar", use_container_width=True, key=_k("clear_filters")):
-            st.session_state['active_filters'] = {}
-            if 'evaluados_df' in st.session_state:
-                del st.session_state['evaluados_df']
+            st.session_state[filtros_key] = {}
+            _reset_evaluados_paginacion(key_prefix)
             st.rerun()
 
     
     with col3:
         st.markdown("<br><br/>", unsafe_allow_html=True)
         if st.button(":material/check: Aplicar", use_container_width=True, type="primary", key=_k("apply_filters")):
-            # Guardar filtros activos
-            filters = {}
-            if sexo_filter != "Todos":
-                filters['Sexo'] = sexo_filter
-            if estado_filter != "Todos":
-                filters['Estado civil'] = estado_filter
-            if escolaridad_filter != "Todos":
-                filters['Escolaridad'] = escolaridad_filter
-            if ocupacion_filter != "Todos":
-                filters['Ocupación'] = ocupacion_filter
-            if grupo_filter != "Todos":
-                filters['Grupo'] = grupo_filter
+            # Guardar filtros activos; se aplican en la consulta de cada página
+            filters = {campo: valor for campo, valor in seleccion.items() if valor != "Todos"}
 
             # edad mínima siempre se guarda
             filters['edad_min'] = edad_min
             
-            st.session_state['active_filters'] = filters
-            
-            # Aplicar filtros
-            df_filtered = df_original.copy()
-            
-            if sexo_filter != "Todos":
-                df_filtered = df_filtered[df_filtered['Sexo'] == sexo_filter]
-            
-            if estado_filter != "Todos":
-                df_filtered = df_filtered[df_filtered['Estado civil'] == estado_filter]
-            
-            if escolaridad_filter != "Todos":
-                df_filtered = df_filtered[df_filtered['Escolaridad'] == escolaridad_filter]
-            
-            if ocupacion_filter != "Todos":
-                df_filtered = df_filtered[df_filtered['Ocupación'] == ocupacion_filter]
-            
-            if grupo_filter != "Todos":
-                df_filtered = df_filtered[df_filtered['Grupo'] == grupo_filter]
-
-            # Filtrar por edad mínima
-            df_filtered = df_filtered[df_filtered['Edad'] >= edad_min]
-            
-            st.session_state['evaluados_df'] = df_filtered
+            st.session_state[filtros_key] = filters
+            _reset_evaluados_paginacion(key_prefix)
             st.rerun()
 
 
-def get_historial_data(user_id: int = None) -> List[Dict]:
-    """Attempt to fetch historial data from the DB using the LISTADO_EVALUADOS_SQL.
-    If user_id is provided, tries to filter the query by e.id_usuario = @id_usuario.
-    Falls back to client-side filtering if the query-based filtering fails.
-    """
-    try:
-        if user_id is None:
-            # prefer cached base listado when available
-            df = load_listado_evaluados_base()
-        else:
-            # Try server-side filtering first by appending WHERE on the base SQL
-            try:
-                    base_sql = LISTADO_EVALUADOS_SQL.strip().rstrip(';')
-                    # If query already contains a WHERE, append with AND
-                    if ' where ' in base_sql.lower():
-                        qry = base_sql + " AND e.id_usuario = @id_usuario"
-                    else:
-                        # If the base SQL contains an ORDER BY clause, insert the WHERE before ORDER BY
-                        lower_base = base_sql.lower()
-                        order_idx = lower_base.rfind('order by')
-                        if order_idx != -1:
-                            before_order = base_sql[:order_idx]
-                            order_clause = base_sql[order_idx:]
-                            qry = before_order + " WHERE e.id_usuario = @id_usuario " + order_clause
-                        else:
-                            qry = base_sql + " WHERE e.id_usuario = @id_usuario"
-                    df = fetch_df(qry, {"id_usuario": int(user_id)})
-            except Exception:
-                df = fetch_df(LISTADO_EVALUADOS_SQL)
-        if df is None:
-            raise ValueError("No rows returned from DB")
-
-        if user_id is not None:
+def _reset_evaluados_paginacion(key_prefix: str = None):
+    """Vuelve a la página 1 y descarta la página cacheada y los cursores."""
+    if key_prefix:
+        st.session_state[f"{key_prefix}__page"] = 1
+    for k in ('evaluados_df', 'evaluados_total', 'evaluados_page_key', 'evaluados_page_cursors'):
+        if k in st.session_state:
             try:
-                if 'id_usuario' in df.columns:
-                    df = df[df['id_usuario'].astype('Int64') == int(user_id)]
-                else:
-                    try:
-                        ids_df = fetch_df("SELECT id_evaluado FROM Evaluado WHERE id_usuario = @id_usuario", {"id_usuario": int(user_id)})
-                        if ids_df is None or ids_df.empty:
-                            df = df.iloc[0:0]
-                        else:
-                            ids = [int(x) for x in ids_df['id_evaluado'].tolist()]
-                            if ids:
-                                df = df[df['id_evaluado'].astype('Int64').isin(ids)]
-                            else:
-                                df = df.iloc[0:0]
-                    except Exception:
-                        # En caso de fallo, devolver vacío para no exponer todos los registros
-                        df = df.iloc[0:0]
+                del st.session_state[k]
             except Exception:
-                # En caso de cualquier error de filtrado, devolver vacío para seguridad
-                df = df.iloc[0:0]
+                pass
 
-        if df is None or df.empty:
-            raise ValueError("No rows returned from DB")
 
-        if 'Ocupacion' in df.columns:
-            df = df.rename(columns={'Ocupacion': 'Ocupación'})
+def _load_evaluados_page(user_id, filtros, busqueda, page, rows_per_page):
+    """Carga (o reutiliza de la sesión) la página pedida y el total de filas.
 
+    Cada página es una consulta acotada: keyset con el último id de la página
+    anterior si se conoce, OFFSET si no.
+    """
+    filtros_key = tuple(sorted((k, str(v)) for k, v in (filtros or {}).items()))
+    total_key = (user_id, filtros_key, busqueda)
+    page_key = (total_key, page)
+
+    # Crear/editar/eliminar invalidan el listado borrando 'evaluados_df'
+    stale = st.session_state.get('evaluados_df') is None
+    if stale or 'evaluados_total' not in st.session_state or st.session_state.get('evaluados_total_key') != total_key:
+        st.session_state['evaluados_page_cursors'] = {}
+        st.session_state['evaluados_total'] = listados.evaluados_total(filtros, busqueda, user_id)
+        st.session_state['evaluados_total_key'] = total_key
+    cursors = st.session_state.setdefault('evaluados_page_cursors', {})
+
+    if stale or st.session_state.get('evaluados_page_key') != page_key:
+        df_page = listados.evaluados_pagina(
+            filtros, busqueda, user_id,
+            limite=rows_per_page,
+            despues_de=cursors.get(page),
+            offset=(page - 1) * rows_per_page,
+        )
+        if df_page is None:
+            df_page = pd.DataFrame()
+        if not df_page.empty:
+            cursors[page + 1] = int(df_page.iloc[-1]['id_evaluado'])
         expected_cols = [
             'id_evaluado', 'Nombre', 'Apellido', 'Edad', 'Sexo', 'Estado civil',
             'Escolaridad', 'Ocupación', 'Grupo', 'id_usuario', 'Especialista'
         ]
         for c in expected_cols:
-            if c not in df.columns:
-                df[c] = ''
+            if c not in df_page.columns:
+                df_page[c] = ''
+        st.session_state['evaluados_df'] = df_page[expected_cols].fillna('').reset_index(drop=True)
+        st.session_state['evaluados_page_key'] = page_key
 
-        records = df[expected_cols].fillna('').to_dict(orient='records')
-        return records
-    except Exception as e:
-        st.error(f"Error fetching data from database: {e}")
-        return []
+    return st.session_state['evaluados_df'], st.session_state['evaluados_total']
 
 
 def evaluados(can_delete: bool = True, user_id: int = None, owner_name: str = None):
@@ -856,27 +795,6 @@ def evaluados(can_delete: bool = True, user_id: int = None, owner_name: str = No
     - user_id: si provisto, mostrará sólo evaluados asignados a ese usuario.
     """
     
-    # --- Reset filters/session state ---
-    # Ensure filters and any evaluados-related session keys are cleared so the view
-    # always starts fresh and shows all evaluados (avoid stale cache/state interference).
-    try:
-        if 'active_filters' in st.session_state:
-            try:
-                del st.session_state['active_filters']
-            except Exception:
-                pass
-    except Exception:
-        pass
-
-    try:
-        if 'evaluados_df' in st.session_state:
-            try:
-                del st.session_state['evaluados_df']
-            except Exception:
-                pass
-    except Exception:
-        pass
-
     _css_evaluados = Path(__file__).parent.parent / 'assets' / 'evaluados.css'
     
     try:
@@ -900,53 +818,6 @@ def evaluados(can_delete: bool = True, user_id: int = None, owner_name: str = No
     instance_idx = st.session_state.get(counter_key, 1)
     key_prefix = f"evaluados_{str(user_id) if user_id is not None else 'global'}_{instance_idx}"
 
-    # Cargar datos
-    # Evitar recargar en cada rerun: solo hacerlo si no existe el cache o si cambió el user_id
-    last_user_key = '_evaluados_last_user_id'
-    need_refresh = False
-    if 'evaluados_df' not in st.session_state:
-        need_refresh = True
-    else:
-        if st.session_state.get(last_user_key) != user_id:
-            need_refresh = True
-
-    if need_refresh:
-        st.session_state['evaluados_df'] = pd.DataFrame(get_historial_data(user_id=user_id))
-        try:
-            st.session_state[last_user_key] = user_id
-        except Exception:
-            pass
-    
-    # Verificar si hay evaluados
-    if st.session_state['evaluados_df'].empty:
-        col1, col2, col3 = st.columns([1, 5, 1])
-        with col1:
-            button_label = ":material/add: Crear"
-            if st.button(button_label, use_container_width=True, type="primary"):
-                dialog_crear_evaluado()
-        
-        st.info(":material/info: No hay evaluados registrados.")
-        return
-    
-    # Preparar DataFrame
-    df = st.session_state['evaluados_df'].copy()
-
-    # Crear columna de selección
-    df.insert(0, 'Seleccionar', False)
-
-    # Reordenar columnas para display (sin id_evaluado visible) e incluir Especialista
-    columns_order = ['Seleccionar', 'Nombre', 'Apellido', 'Edad', 'Sexo', 'Estado civil', 'Escolaridad', 'Ocupación', 'Grupo', 'Especialista']
-    # Asegurar columna Especialista (proviene de la query que une con Usuario)
-    if 'Especialista' not in df.columns and 'id_usuario' in df.columns:
-        try:
-            df_esp = load_especialistas()
-            esp_map = dict(zip(df_esp['id_usuario'], df_esp['nombre_completo'])) if not df_esp.empty else {}
-            df['Especialista'] = df['id_usuario'].apply(lambda x: esp_map.get(int(x), '') if pd.notna(x) and x != '' else '')
-        except Exception:
-            df['Especialista'] = ''
-
-    df_display = df[[col for col in columns_order if col in df.columns]]
-    
     # Barra de búsqueda y botones (prefijados para evitar colisiones de key)
     if can_delete:
         # Barra de búsqueda y botones (prefijados para evitar colisiones de key)
@@ -982,13 +853,6 @@ def evaluados(can_delete: bool = True, user_id: int = None, owner_name: str = No
             crear_btn = st.button(button_label, use_container_width=True, type="primary", key=crear_key)
 
         st.markdown("<br/>", unsafe_allow_html=True)
-        # Aplicar búsqueda si hay texto
-        if buscar:
-            mask = df_display[['Nombre', 'Apellido', 'Sexo', 'Estado civil', 'Escolaridad', 'Ocupación', 'Grupo']].apply(
-                lambda row: row.astype(str).str.contains(buscar, case=False).any(), axis=1
-            )
-            df_display = df_display[mask]
-            df = df[mask]
     else:
         # Barra de búsqueda y botones (prefijados para evitar colisiones de key)
         col_buscar, col_filtros, col_editar, col_crear = st.columns([4, 1, 1, 1])
@@ -1018,32 +882,57 @@ def evaluados(can_delete: bool = True, user_id: int = None, owner_name: str = No
             crear_btn = st.button(button_label, use_container_width=True, type="primary", key=crear_key)
 
         st.markdown("<br/>", unsafe_allow_html=True)
-        # Aplicar búsqueda si hay texto
-        if buscar:
-            mask = df_display[['Nombre', 'Apellido', 'Sexo', 'Estado civil', 'Escolaridad', 'Ocupación', 'Grupo']].apply(
-                lambda row: row.astype(str).str.contains(buscar, case=False).any(), axis=1
-            )
-            df_display = df_display[mask]
-            df = df[mask]
     
 
     # ========== PAGINACIÓN ==========
+    # Filtros, búsqueda y paginación se resuelven en la consulta: sólo viaja la página visible
     ROWS_PER_PAGE = 9
     page_key = f"{key_prefix}__page"
     if page_key not in st.session_state:
         st.session_state[page_key] = 1
 
-    total_rows = len(df_display)
-    total_pages = max(1, (total_rows + ROWS_PER_PAGE - 1) // ROWS_PER_PAGE)
-    if st.session_state[page_key] > total_pages:
-        st.session_state[page_key] = total_pages
+    filtros = st.session_state.get(_filtros_key(key_prefix), {})
+    busqueda = buscar.strip() if buscar else ''
+    # Una búsqueda distinta vuelve a la página 1
+    query_key = (user_id, tuple(sorted((k, str(v)) for k, v in filtros.items())), busqueda)
+    query_state_key = f"{key_prefix}__query_key"
+    if st.session_state.get(query_state_key) != query_key:
+        st.session_state[query_state_key] = query_key
+        st.session_state[page_key] = 1
+
+    try:
+        df, total_rows = _load_evaluados_page(user_id, filtros, busqueda, st.session_state[page_key], ROWS_PER_PAGE)
+        total_pages = max(1, (total_rows + ROWS_PER_PAGE - 1) // ROWS_PER_PAGE)
+        if st.session_state[page_key] > total_pages:
+            st.session_state[page_key] = total_pages
+            df, total_rows = _load_evaluados_page(user_id, filtros, busqueda, total_pages, ROWS_PER_PAGE)
+    except Exception as e:
+        st.error(f"Error fetching data from database: {e}")
+        df, total_rows, total_pages = pd.DataFrame(), 0, 1
+
+    # Verificar si hay evaluados
+    if total_rows == 0:
+        if crear_btn:
+            dialog_crear_evaluado()
+        if filtros_btn:
+            dialog_filtros(key_prefix, user_id)
+        if filtros or busqueda:
+            st.info(":material/info: No se encontraron evaluados con los filtros aplicados.")
+        else:
+            st.info(":material/info: No hay evaluados registrados.")
+        return
 
     page = st.session_state[page_key]
     start_idx = (page - 1) * ROWS_PER_PAGE
     end_idx = start_idx + ROWS_PER_PAGE
 
-    # Filtrar el DataFrame para la página actual (conservar índices originales)
-    df_display_page = df_display.iloc[start_idx:end_idx].copy()
+    # Crear columna de selección
+    df_display_page = df.copy()
+    df_display_page.insert(0, 'Seleccionar', False)
+
+    # Reordenar columnas para display (sin id_evaluado visible) e incluir Especialista (viene del JOIN con Usuario)
+    columns_order = ['Seleccionar', 'Nombre', 'Apellido', 'Edad', 'Sexo', 'Estado civil', 'Escolaridad', 'Ocupación', 'Grupo', 'Especialista']
+    df_display_page = df_display_page[[col for col in columns_order if col in df_display_page.columns]]
 
     # Mostrar tabla con checkboxes
     edited_df = st.data_editor(
@@ -1067,7 +956,7 @@ def evaluados(can_delete: bool = True, user_id: int = None, owner_name: str = No
         disabled=['Nombre', 'Apellido', 'Edad', 'Sexo', 'Estado civil', 'Escolaridad', 'Ocupación', 'Grupo', 'Especialista']
     )
     
-    st.caption(f"**Total de evaluados:** {len(df)} | **Mostrando:** {start_idx + 1}-{min(end_idx, total_rows)}")
+    st.caption(f"**Total de evaluados:** {total_rows} | **Mostrando:** {start_idx + 1}-{min(end_idx, total_rows)}")
 
     # --- PAGINACIÓN (debajo de la tabla) ---
     if total_pages > 1:
@@ -1099,7 +988,7 @@ def evaluados(can_delete: bool = True, user_id: int = None, owner_name: str = No
         dialog_crear_evaluado()
     
     if filtros_btn:
-        dialog_filtros(key_prefix)
+        dialog_filtros(key_prefix, user_id)
     
     if editar_btn:
         if len(seleccionados) == 0:
@@ -1,25 +1,16 @@
 import streamlit as st
 import pandas as pd
-from typing import List, Dict
 from pathlib import Path
-from services.db import fetch_df
+from services.db import fetch_df, transaction
+from services import listados
 from services.queries.q_individual import GET_RESULTADOS_POR_PRUEBA
 from services.exportar import render_export_popover
-from services.queries.q_historial import LISTADO_HISTORIAL_SQL, LISTADO_HISTORIAL_POR_ESPECIALISTA
+from services.estadisticas import invalidar_estadisticas
+from services.resumen_diario import dias_de_pruebas, actualizar_resumen_diario
 from components.loader import show_loader
 
 
 # Cached loaders for historial
-@st.cache_data(ttl=300, max_entries=64)
-def load_historial_base():
-    return fetch_df(LISTADO_HISTORIAL_SQL)
-
-
-@st.cache_data(ttl=300, max_entries=256)
-def load_historial_por_especialista(id_usuario: int):
-    return fetch_df(LISTADO_HISTORIAL_POR_ESPECIALISTA, {"id_usuario": int(id_usuario)})
-
-
 @st.cache_data(ttl=300, max_entries=512)
 def load_resultados_por_prueba(id_prueba: int):
     return fetch_df(GET_RESULTADOS_POR_PRUEBA, {"id_prueba": int(id_prueba)})
@@ -90,15 +81,17 @@ def confirmar_eliminacion_pruebas(selected_rows_df):
                         placeholders = ','.join(['%s'] * len(ids))
 
                         sql_del_resultados = f"DELETE FROM dbo.Resultado WHERE id_prueba IN ({placeholders})"
-                        fetch_df(sql_del_resultados, tuple(ids))
-
-                        sql_del_pruebas = f"DELETE FROM dbo.Prueba OUTPUT DELETED.id_prueba AS id_prueba WHERE id_prueba IN ({placeholders})"
-                        fetch_df(sql_del_pruebas, tuple(ids))
+                        sql_del_pruebas = f"DELETE FROM dbo.Prueba WHERE id_prueba IN ({placeholders})"
+                        # Resultados, pruebas y resumen diario se actualizan juntos o no se toca nada
+                        with transaction() as uow:
+                            dias = dias_de_pruebas(uow, ids)
+                            uow.execute(sql_del_resultados, tuple(ids))
+                            uow.execute(sql_del_pruebas, tuple(ids))
+                            actualizar_resumen_diario(uow, dias)
+                        invalidar_estadisticas()
 
                         # Invalidate cached historial data so UI shows fresh results
                         try:
-                            load_historial_base.clear()
-                            load_historial_por_especialista.clear()
                             load_resultados_por_prueba.clear()
                         except Exception:
                             pass
@@ -140,13 +133,16 @@ def confirmar_eliminacion_pruebas(selected_rows_df):
 @st.dialog(":material/filter_list: Filtros")
 def dialog_filtros():
     """Diálogo para filtrar datos por columnas."""
-    original_data = get_historial_data()
-    df_original = pd.DataFrame(original_data)
+    scope = _historial_scope()
+    try:
+        opciones = listados.historial_opciones_filtro(scope) if scope is not False else {}
+    except Exception:
+        opciones = {}
     
     if 'active_historial_filters' not in st.session_state:
         st.session_state['active_historial_filters'] = {}
     
-    evaluado_options = ["Todos"] + sorted(df_original['Nombre del evaluado'].dropna().unique().tolist())
+    evaluado_options = ["Todos"] + opciones.get('Evaluado', [])
     evaluado_filter = st.selectbox(
         "Evaluado",
         evaluado_options,
@@ -154,7 +150,7 @@ def dialog_filtros():
         key="filter_evaluado"
     )
     
-    sexo_options = ["Todos"] + sorted(df_original['Sexo'].dropna().unique().tolist())
+    sexo_options = ["Todos"] + opciones.get('Sexo', [])
     sexo_filter = st.selectbox(
         "Sexo",
         sexo_options,
@@ -162,7 +158,7 @@ def dialog_filtros():
         key="filter_sexo"
     )
     
-    grupo_options = ["Todos"] + sorted(df_original['Grupo'].dropna().unique().tolist())
+    grupo_options = ["Todos"] + opciones.get('Grupo', [])
     grupo_filter = st.selectbox(
         "Grupo",
         grupo_options,
@@ -212,9 +208,7 @@ def dialog_filtros():
         st.markdown("<br><br/>", unsafe_allow_html=True)
         if st.button(":material/refresh: Limpiar", use_container_width=True, key="clear_filters"):
             st.session_state['active_historial_filters'] = {}
-            st.session_state.historial_current_page = 1
-            if 'historial_df' in st.session_state:
-                del st.session_state['historial_df']
+            _reset_historial_paginacion()
             if 'historial_selected_indices' in st.session_state:
                 del st.session_state['historial_selected_indices']
             if 'historial_page_selections' in st.session_state:
@@ -243,8 +237,6 @@ def dialog_filtros():
             if fecha_hasta:
                 filters['fecha_hasta'] = fecha_hasta
 
-            st.session_state['active_historial_filters'] = filters
-
             try:
                 if fecha_desde is not None and fecha_hasta is not None and fecha_hasta < fecha_desde:
                     st.session_state['historial_filters_invalid_date'] = True
@@ -258,40 +250,16 @@ def dialog_filtros():
             except Exception:
                 pass
 
-            df_filtered = df_original.copy()
-
-            if evaluado_filter != "Todos":
-                df_filtered = df_filtered[df_filtered['Nombre del evaluado'] == evaluado_filter]
-
-            if sexo_filter != "Todos":
-                df_filtered = df_filtered[df_filtered['Sexo'] == sexo_filter]
-
-            if grupo_filter != "Todos":
-                df_filtered = df_filtered[df_filtered['Grupo'] == grupo_filter]
-
-            df_filtered = df_filtered[df_filtered['Edad'] >= edad_min]
-
-            if fecha_desde:
-                try:
-                    fecha_series = pd.to_datetime(df_filtered['Fecha de evaluación'], dayfirst=True, errors='coerce')
-                    fecha_cmp = pd.to_datetime(fecha_desde)
-                    df_filtered = df_filtered[fecha_series >= fecha_cmp]
-                except Exception:
-                    pass
-
-            if fecha_hasta:
-                try:
-                    fecha_series = pd.to_datetime(df_filtered['Fecha de evaluación'], dayfirst=True, errors='coerce')
-                    fecha_cmp = pd.to_datetime(fecha_hasta)
-                    df_filtered = df_filtered[fecha_series <= fecha_cmp]
-                except Exception:
-                    pass
+            try:
+                total = listados.historial_total(filters, None, scope) if scope is not False else 0
+            except Exception:
+                total = 0
 
-            if df_filtered is None or df_filtered.empty:
+            if total == 0:
                 st.session_state['historial_filters_no_results'] = True
             else:
-                st.session_state['historial_df'] = df_filtered
-                st.session_state.historial_current_page = 1
+                st.session_state['active_historial_filters'] = filters
+                _reset_historial_paginacion()
                 if 'historial_selected_indices' in st.session_state:
                     del st.session_state['historial_selected_indices']
                 if 'historial_page_selections' in st.session_state:
@@ -304,75 +272,86 @@ def dialog_filtros():
                 st.rerun()
 
 
-def get_historial_data() -> List[Dict]:
-    """Obtiene el historial de pruebas/evaluaciones desde la BD."""
+def _historial_scope():
+    """Alcance del historial según el rol.
+
+    None -> todas las pruebas (admin/operador); int -> sólo los evaluados del
+    especialista; False -> sin acceso (especialista sin id válido).
+    """
+    is_especialista = False
+    is_admin = False
     try:
-        is_especialista = False
-        is_admin = False
+        import services.auth as auth
         try:
-            import services.auth as auth
-            try:
-                auth.is_logged_in()
-            except Exception:
-                pass
-            try:
-                is_admin = auth.is_admin()
-            except Exception:
-                is_admin = False
-            try:
-                is_especialista = auth.is_especialista()
-            except Exception:
-                is_especialista = False
+            is_admin = auth.is_admin()
         except Exception:
             is_admin = False
+        try:
+            is_especialista = auth.is_especialista()
+        except Exception:
             is_especialista = False
+    except Exception:
+        is_admin = False
+        is_especialista = False
 
-        if is_admin:
-            df = load_historial_base()
-        elif is_especialista:
-            user = st.session_state.get("user", {})
-            id_usuario = user.get("id_usuario")
-            if not id_usuario:
-                return []
-            try:
-                id_usuario = int(id_usuario)
-            except Exception:
-                return []
+    if is_admin or not is_especialista:
+        return None
+    user = st.session_state.get("user", {})
+    try:
+        return int(user.get("id_usuario"))
+    except Exception:
+        return False
 
-            df = load_historial_por_especialista(id_usuario)
+
+def _reset_historial_paginacion():
+    """Vuelve a la página 1 y descarta la página cacheada y los cursores."""
+    st.session_state.historial_current_page = 1
+    for k in ('historial_df', 'historial_page_key', 'historial_page_cursors', 'historial_total'):
+        if k in st.session_state:
             try:
-                ids_df = fetch_df("SELECT id_evaluado FROM Evaluado WHERE id_usuario = @id_usuario", {"id_usuario": int(id_usuario)})
-                if ids_df is None or ids_df.empty:
-                    return []
-                assigned_ids = [int(x) for x in ids_df['id_evaluado'].tolist()]
-                if 'id_evaluado' in df.columns:
-                    df = df[df['id_evaluado'].astype('Int64').isin(assigned_ids)]
-                else:
-                    try:
-                        df = df[df['id_evaluado'].astype('Int64').isin(assigned_ids)]
-                    except Exception:
-                        return []
+                del st.session_state[k]
             except Exception:
-                return []
-        else:
-            df = load_historial_base()
+                pass
 
-        if df is None or df.empty:
-            return []
 
-        expected_cols = [
-            'id_prueba', 'id_evaluado', 'ruta_imagen', 'Nombre del evaluado', 
-            'Edad', 'Sexo', 'Grupo', 'Fecha de evaluación'
-        ]
-        for c in expected_cols:
-            if c not in df.columns:
-                df[c] = ''
+def _load_historial_page(scope, filtros, busqueda, page, rows_per_page):
+    """Carga (o reutiliza de la sesión) la página pedida y el total de filas.
+
+    Cada página es una consulta acotada: keyset con el cursor de la página
+    anterior si se conoce, OFFSET si no (p. ej. tras invalidar la sesión).
+    """
+    filtros_key = tuple(sorted((k, str(v)) for k, v in (filtros or {}).items()))
+    total_key = (scope, filtros_key, busqueda)
+    page_key = (total_key, page)
+
+    # Otros módulos invalidan el historial borrando 'historial_df' (p. ej. al guardar una prueba)
+    stale = st.session_state.get('historial_df') is None
+    if stale or 'historial_total' not in st.session_state or st.session_state.get('historial_total_key') != total_key:
+        # Otro conjunto de filas: los cursores de keyset anteriores ya no aplican
+        st.session_state['historial_page_cursors'] = {}
+        st.session_state['historial_total'] = listados.historial_total(filtros, busqueda, scope)
+        st.session_state['historial_total_key'] = total_key
+    cursors = st.session_state.setdefault('historial_page_cursors', {})
+
+    if stale or st.session_state.get('historial_page_key') != page_key:
+        df_page = listados.historial_pagina(
+            filtros, busqueda, scope,
+            limite=rows_per_page,
+            despues_de=cursors.get(page),
+            offset=(page - 1) * rows_per_page,
+        )
+        if df_page is None:
+            df_page = pd.DataFrame()
+        if not df_page.empty:
+            last = df_page.iloc[-1]
+            fecha_orden = last['fecha_orden']
+            if hasattr(fecha_orden, 'to_pydatetime'):
+                fecha_orden = fecha_orden.to_pydatetime()
+            cursors[page + 1] = (fecha_orden, int(last['id_prueba']))
+        st.session_state['historial_df'] = df_page
+        st.session_state['historial_page_key'] = page_key
 
-        records = df[expected_cols].fillna('').to_dict(orient='records')
-        return records
-    except Exception as e:
-        st.error(f"Error fetching data from database: {e}")
-        return []
+    return st.session_state['historial_df'], st.session_state['historial_total']
 
 
 def historial():
@@ -395,23 +374,18 @@ def historial():
     
     st.markdown('<div class="page-header">Historial de evaluaciones</div>', unsafe_allow_html=True)
     
-    if 'historial_df' not in st.session_state:
-        st.session_state['historial_df'] = pd.DataFrame(get_historial_data())
-    
-    if st.session_state['historial_df'].empty:
+    scope = _historial_scope()
+    if scope is False:
         st.info(":material/info: No hay evaluaciones registradas.")
         return
-    
-    df = st.session_state['historial_df'].copy()
-    
+
     if 'historial_selected_indices' not in st.session_state:
-        st.session_state['historial_selected_indices'] = set()
+        st.session_state['historial_selected_indices'] = {}
     
     if 'historial_page_selections' not in st.session_state:
         st.session_state['historial_page_selections'] = {}
     
     columns_order = ['id_prueba', 'Nombre del evaluado', 'Edad', 'Sexo', 'Grupo', 'Fecha de evaluación']
-    df_display = df[[col for col in columns_order if col in df.columns]]
     
     col_buscar, col_filtros, col_exportar, col_eliminar, col_vermas = st.columns([3, 1, 1, 1, 1])
     
@@ -437,35 +411,48 @@ def historial():
     
     st.markdown("<br/>", unsafe_allow_html=True)
     
-    if buscar:
-        mask = df_display[['Nombre del evaluado', 'Sexo', 'Grupo', 'id_prueba']].apply(
-            lambda row: row.astype(str).str.contains(buscar, case=False).any(), axis=1
-        )
-        df_display = df_display[mask]
-        df = df[mask]
+    buscar = (buscar or '').strip()
+    if st.session_state.get('historial_last_search', '') != buscar:
+        st.session_state['historial_last_search'] = buscar
+        st.session_state.historial_current_page = 1
+        st.session_state['historial_page_selections'] = {}
     
     ROWS_PER_PAGE = 10
 
     if 'historial_current_page' not in st.session_state:
         st.session_state.historial_current_page = 1
 
-    total_rows = len(df_display)
+    filtros = st.session_state.get('active_historial_filters', {})
+    try:
+        df, total_rows = _load_historial_page(
+            scope, filtros, buscar, st.session_state.historial_current_page, ROWS_PER_PAGE
+        )
+    except Exception as e:
+        st.error(f"Error fetching data from database: {e}")
+        return
+
+    if total_rows == 0 and not buscar and not filtros:
+        st.info(":material/info: No hay evaluaciones registradas.")
+        return
+
     total_pages = max(1, (total_rows + ROWS_PER_PAGE - 1) // ROWS_PER_PAGE)
 
     if st.session_state.historial_current_page > total_pages:
         st.session_state.historial_current_page = total_pages
+        df, total_rows = _load_historial_page(scope, filtros, buscar, total_pages, ROWS_PER_PAGE)
 
     page = st.session_state.historial_current_page
     start_idx = (page - 1) * ROWS_PER_PAGE
     end_idx = start_idx + ROWS_PER_PAGE
-    df_display_page = df_display.iloc[start_idx:end_idx].copy()
-    
-    global_to_local = {global_idx: local_idx for local_idx, global_idx in enumerate(df_display_page.index)}
+    df = df.reset_index(drop=True)
+    df_display_page = df[[col for col in columns_order if col in df.columns]].copy()
     
+    # Las selecciones se guardan por id_prueba: cada página es una consulta distinta
+    page_ids = [int(x) for x in df['id_prueba'].tolist()] if 'id_prueba' in df.columns else []
     preselected_local = [
-        global_to_local[idx] 
-        for idx in st.session_state['historial_selected_indices'] 
-        if idx in global_to_local
+        local_idx
+        for local_idx, id_prueba in enumerate(page_ids)
+        if id_prueba in st.session_state['historial_selected_indices']
     ]
     
     table_key = f"historial_table_page_{page}"
@@ -492,14 +479,12 @@ def historial():
     
     if current_local_selections != previous_local_selections:
         for local_idx in current_local_selections - previous_local_selections:
-            if local_idx < len(df_display_page):
-                global_idx = df_display_page.index[local_idx]
-                st.session_state['historial_selected_indices'].add(global_idx)
+            if local_idx < len(page_ids):
+                st.session_state['historial_selected_indices'][page_ids[local_idx]] = df.iloc[local_idx].to_dict()
         
         for local_idx in previous_local_selections - current_local_selections:
-            if local_idx < len(df_display_page):
-                global_idx = df_display_page.index[local_idx]
-                st.session_state['historial_selected_indices'].discard(global_idx)
+            if local_idx < len(page_ids):
+                st.session_state['historial_selected_indices'].pop(page_ids[local_idx], None)
         
         st.session_state['historial_page_selections'][page] = list(current_local_selections)
     
@@ -507,10 +492,10 @@ def historial():
         st.session_state['historial_page_selections'][page] = preselected_local
         st.rerun()
     
-    all_selected_indices = list(st.session_state['historial_selected_indices'])
-    seleccionados = df.loc[df.index.isin(all_selected_indices)] if all_selected_indices else pd.DataFrame()
+    selected_rows = list(st.session_state['historial_selected_indices'].values())
+    seleccionados = pd.DataFrame(selected_rows) if selected_rows else pd.DataFrame()
     
-    st.caption(f"**Total de evaluaciones:** {len(df)} - **Mostrando:** {start_idx + 1}-{min(end_idx, total_rows)} - **Seleccionadas:** {len(seleccionados)}")
+    st.caption(f"**Total de evaluaciones:** {total_rows} - **Mostrando:** {min(start_idx + 1, total_rows)}-{min(end_idx, total_rows)} - **Seleccionadas:** {len(seleccionados)}")
 
     if total_pages > 1:
         col_prev, col_center, col_next = st.columns([1, 2, 1])
@@ -552,7 +537,7 @@ def historial():
                 info_list = []
                 for idx in seleccionados.index.tolist():
                     try:
-                        row = df.loc[idx]
+                        row = seleccionados.loc[idx]
                     except Exception:
                         continue
 
@@ -575,7 +560,7 @@ def historial():
                     indicadores_por_fila = []
                     for idx in seleccionados.index.tolist():
                         try:
-                            row = df.loc[idx]
+                            row = seleccionados.loc[idx]
                         except Exception:
                             indicadores_por_fila.append([])
                             continue
@@ -639,7 +624,7 @@ def historial():
         else:
             try:
                 idx = seleccionados.index[0]
-                selected_data = df.loc[idx]
+                selected_data = seleccionados.loc[idx]
                 st.session_state["open_prueba_id"] = selected_data['id_prueba']
                 st.session_state["selected_evaluation_id"] = selected_data['id_evaluado']
                 st.session_state['from_ajustes'] = False
@@ -9,8 +9,10 @@ import streamlit as st
 from pathlib import Path
 import base64
 import json
+import logging
 import os
-from services.gcs import get_image_local_path, get_image_data_uri
+from services.gcs import get_image_data_uri, iter_prefetch
+from services.image_server import imagen_src, servidor_activo
 from components.loader import show_loader
 
 @st.cache_data(ttl=300, max_entries=256)
@@ -77,11 +79,13 @@ def get_pruebas_data(id: str):
         except Exception:
             return []
 
+        # La consulta une PruebaImagen (tamaño guardado al registrar la prueba;
+        # la tabla la crea la migración 004)
         df = fetch_df(GET_PRUEBAS_POR_EVALUADO, {"id_evaluado": id_int})
         if df is None or df.empty:
             return []
 
-        expected_cols = ['id_prueba', 'nombre_archivo', 'ruta_imagen', 'formato', 'fecha', 'resultados_json']
+        expected_cols = ['id_prueba', 'nombre_archivo', 'ruta_imagen', 'formato', 'fecha', 'resultados_json', 'ancho', 'alto']
         for c in expected_cols:
             if c not in df.columns:
                 df[c] = ''
@@ -110,6 +114,57 @@ def get_pruebas_data(id: str):
         pruebas = []
     return pruebas
 
+def _dimension(v):
+    """Entero positivo o None (NULL/NaN en pruebas sin PruebaImagen)."""
+    try:
+        v = int(v)
+    except (TypeError, ValueError):
+        return None
+    return v if v > 0 else None
+
+
+def _gcs_uri_de(ruta):
+    """Normaliza una ruta_imagen a `gs://...`; None si es una ruta local."""
+    ruta_norm = (str(ruta) if ruta is not None else '').replace('\\', '/')
+    if ruta_norm.startswith('gs:'):
+        return 'gs://' + ruta_norm.split(':', 1)[1].lstrip('/')
+    return None
+
+
+def _fuentes_imagen(prueba: dict, img_path, completa: bool):
+    """Tamaño natural y `src` (visor, miniatura, zoom) de la imagen local de una prueba.
+
+    El tamaño guardado en PruebaImagen sólo evita abrir la imagen para medirla;
+    las versiones reducidas se arman siempre. Son copias cacheadas por hash de
+    contenido: miniatura para el carrusel y tamaños visor/zoom. Con el servidor
+    de imágenes activo son URLs cacheables por el navegador (el zoom se carga
+    sólo al abrir el modal). Sin servidor cada rerun incrusta los data URIs,
+    así que sólo con `completa` (la prueba activa) viajan visor y zoom; las
+    demás se muestran con su miniatura, que ya va incluida para el carrusel.
+
+    Devuelve `(ancho, alto, data_uri, thumb_uri, zoom_uri)`.
+    """
+    nw, nh = _dimension(prueba.get('ancho')), _dimension(prueba.get('alto'))
+    if not (nw and nh):
+        try:
+            with _PILImage.open(img_path) as _tmpim:
+                nw, nh = _tmpim.size
+        except Exception:
+            nw, nh = None, None
+    if nw and nh:
+        prueba['_natural_w'] = nw
+        prueba['_natural_h'] = nh
+
+    thumb_uri = imagen_src(img_path, 'thumb')
+    zoom_uri = None
+    if completa:
+        data_uri = imagen_src(img_path, 'viewer')
+        zoom_uri = imagen_src(img_path, 'zoom')
+    else:
+        data_uri = thumb_uri
+    return nw, nh, data_uri, thumb_uri, zoom_uri
+
+
 def encode_image_to_base64(image_path):
     """Convierte una imagen a base64 para incrustarla en HTML"""
     try:
@@ -239,6 +294,8 @@ def individual(id_evaluado: str = None):
     fecha = current_prueba.get("fecha", "N/A")
     
     images_data = []
+    zoom_data = []
+    natural_sizes = []
     fechas_data = []
     ids_prueba = []
     resultados_data = []
@@ -268,46 +325,38 @@ def individual(id_evaluado: str = None):
     except Exception:
         metadata_map = {}
     
+    # Descargar en paralelo todas las imágenes de GCS del expediente; los
+    # resultados llegan en orden, así que cada prueba se procesa en cuanto
+    # su imagen está lista mientras las siguientes siguen descargando.
+    gcs_uris = [_gcs_uri_de(p.get('ruta_imagen', '')) for p in expediente]
+    prefetch = iter_prefetch(gcs_uris)
+    prefetch_ms = []
+    usar_urls = servidor_activo()
+
     for idx, prueba in enumerate(expediente):
         # images/resultados processing per prueba
         img_rel = prueba.get('ruta_imagen', '')
         img_rel_str = str(img_rel) if img_rel is not None else ''
-        img_rel_norm = img_rel_str.replace('\\', '/').replace('\\\\', '/')
-
-        is_gs = False
-        gcs_uri = None
-        if img_rel_norm.startswith('gs://'):
-            is_gs = True
-            gcs_uri = img_rel_norm
-        elif img_rel_norm.startswith('gs:/'):
-            is_gs = True
-            gcs_uri = 'gs://' + img_rel_norm.split(':', 1)[1].lstrip('/')
-        elif img_rel_norm.startswith('gs:'):
-            is_gs = True
-            gcs_uri = 'gs://' + img_rel_norm.split(':', 1)[1].lstrip('/')
+
+        gcs_uri, local_path, fetch_ms = next(prefetch)
+        is_gs = gcs_uri is not None
+        if is_gs:
+            prueba['_fetch_ms'] = round(fetch_ms, 1)
+            prefetch_ms.append(fetch_ms)
 
         nw, nh = None, None
         b64 = None
         data_uri = None
         src_to_use = None
+        thumb_uri = None
+        zoom_uri = None
 
         try:
+            img_path = None
             if is_gs and gcs_uri:
                 # Prefer a downloaded local file so we can read natural size
-                local_path = get_image_local_path(gcs_uri)
                 if local_path and os.path.exists(local_path):
-                    try:
-                        img_path = Path(local_path)
-                        b64 = encode_image_to_base64(str(img_path))
-                        try:
-                            with _PILImage.open(img_path) as _tmpim:
-                                nw, nh = _tmpim.size
-                                prueba['_natural_w'] = nw
-                                prueba['_natural_h'] = nh
-                        except Exception:
-                            nw, nh = None, None
-                    except Exception:
-                        b64 = None
+                    img_path = Path(local_path)
                 else:
                     # Try building a data URI directly from GCS
                     data_uri = get_image_data_uri(gcs_uri)
@@ -316,19 +365,23 @@ def individual(id_evaluado: str = None):
             else:
                 # Local or relative path: construct path relative to this file
                 img_rel_clean = img_rel_str.lstrip('/').lstrip('\\')
-                img_path = (Path(__file__).parent / img_rel_clean).resolve()
-                if os.path.isfile(img_path):
-                    try:
-                        b64 = encode_image_to_base64(str(img_path))
-                        try:
-                            with _PILImage.open(img_path) as _tmpim:
-                                nw, nh = _tmpim.size
-                                prueba['_natural_w'] = nw
-                                prueba['_natural_h'] = nh
-                        except Exception:
-                            nw, nh = None, None
-                    except Exception:
-                        b64 = None
+                candidate = (Path(__file__).parent / img_rel_clean).resolve()
+                if os.path.isfile(candidate):
+                    img_path = candidate
+
+            if img_path is not None:
+                nw, nh, data_uri, thumb_uri, zoom_uri = _fuentes_imagen(
+                    prueba, img_path, idx == current_index or usar_urls
+                )
+                if data_uri:
+                    src_to_use = data_uri
+                else:
+                    b64 = encode_image_to_base64(str(img_path))
+            else:
+                nw, nh = _dimension(prueba.get('ancho')), _dimension(prueba.get('alto'))
+                if nw and nh:
+                    prueba['_natural_w'] = nw
+                    prueba['_natural_h'] = nh
 
             # Build final source to append
             if b64:
@@ -340,10 +393,14 @@ def individual(id_evaluado: str = None):
                 src_to_use = gcs_uri if (is_gs and gcs_uri) else img_rel_str
 
             prueba['_data_uri'] = src_to_use
+            prueba['_thumb_uri'] = thumb_uri or src_to_use
             images_data.append(src_to_use)
         except Exception:
             prueba['_data_uri'] = img_rel_str
+            prueba['_thumb_uri'] = img_rel_str
             images_data.append(img_rel_str)
+        zoom_data.append(zoom_uri)
+        natural_sizes.append([nw, nh] if nw and nh else None)
 
         fechas_data.append(prueba.get('fecha', 'N/A'))
         ids_prueba.append(prueba.get('id_prueba'))
@@ -417,6 +474,12 @@ def individual(id_evaluado: str = None):
         else:
             resultados_data.append([])
 
+    if prefetch_ms:
+        logging.info(
+            "individual: %d imagen(es) precargadas, latencias ms=%s (máx %.0f)",
+            len(prefetch_ms), [round(ms) for ms in prefetch_ms], max(prefetch_ms),
+        )
+
 
     imagen_actual = current_prueba.get('_data_uri', current_prueba.get('ruta_imagen'))
 
@@ -425,10 +488,10 @@ def individual(id_evaluado: str = None):
     carousel_items_html = ""
     for i, prueba in enumerate(expediente):
         active = "active" if i == current_index else ""
-        img_src = prueba.get('_data_uri', prueba.get('ruta_imagen'))
+        img_src = prueba.get('_thumb_uri', prueba.get('_data_uri', prueba.get('ruta_imagen')))
         carousel_items_html += f"""
         <div class="carousel-item {active}" onclick="selectImage({i})">
-            <img src="{img_src}" alt="Prueba {i+1}" onerror="this.src='data:image/svg+xml,%3Csvg xmlns=%22http://www.w3.org/2000/svg%22 width=%22120%22 height=%22120%22%3E%3Crect fill=%22%23ddd%22 width=%22120%22 height=%22120%22/%3E%3Ctext x=%2250%25%22 y=%2250%25%22 text-anchor=%22middle%22 dy=%22.3em%22 fill=%22%23999%22%3E{i+1}%3C/text%3E%3C/svg%3E'">
+            <img src="{img_src}" loading="lazy" alt="Prueba {i+1}" onerror="this.src='data:image/svg+xml,%3Csvg xmlns=%22http://www.w3.org/2000/svg%22 width=%22120%22 height=%22120%22%3E%3Crect fill=%22%23ddd%22 width=%22120%22 height=%22120%22/%3E%3Ctext x=%2250%25%22 y=%2250%25%22 text-anchor=%22middle%22 dy=%22.3em%22 fill=%22%23999%22%3E{i+1}%3C/text%3E%3C/svg%3E'">
             <div class="carousel-item-number">{i+1}</div>
         </div>
         """
@@ -1189,6 +1252,10 @@ def individual(id_evaluado: str = None):
     <script>
         let currentIndex = {current_index};
         const images = {json.dumps(images_data)};
+        // Zoom: URL por prueba con el servidor de imágenes; si no, sólo la activa
+        const zoomImages = {json.dumps(zoom_data)};
+        // Tamaño original de cada imagen: las cajas vienen en esos píxeles
+        const naturalSizes = {json.dumps(natural_sizes)};
         const fechas = {json.dumps(fechas_data)};
         const idsPrueba = {json.dumps(ids_prueba)};
         const resultadosData = {json.dumps(resultados_data)};
@@ -1270,9 +1337,11 @@ def individual(id_evaluado: str = None):
             const dispWidth = img.clientWidth;
             const dispHeight = img.clientHeight;
 
-            // internal resolution = natural image pixels
-            bboxCanvas.width = img.naturalWidth || Math.round(dispWidth);
-            bboxCanvas.height = img.naturalHeight || Math.round(dispHeight);
+            // internal resolution = original image pixels (the displayed
+            // image may be a reduced copy)
+            const origSize = naturalSizes[currentIndex] || [img.naturalWidth, img.naturalHeight];
+            bboxCanvas.width = origSize[0] || Math.round(dispWidth);
+            bboxCanvas.height = origSize[1] || Math.round(dispHeight);
 
             // CSS size: match displayed image size (pre-scale)
             bboxCanvas.style.width = dispWidth + 'px';
@@ -1294,8 +1363,8 @@ def individual(id_evaluado: str = None):
                 
                 const bboxPixels = convertBboxToPixels(
                     [resultado.x_min, resultado.y_min, resultado.x_max, resultado.y_max],
-                    img.naturalWidth,
-                    img.naturalHeight,
+                    bboxCanvas.width,
+                    bboxCanvas.height,
                     null,
                     null
                 );
@@ -1621,7 +1690,7 @@ def individual(id_evaluado: str = None):
         
         function expandImage() {{
             const mainImage = document.getElementById('mainImage');
-            openImageModal(mainImage.src);
+            openImageModal(zoomImages[currentIndex] || mainImage.src);
         }}
         
         function updateImage(index) {{
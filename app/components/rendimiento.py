@@ -0,0 +1,104 @@
+import streamlit as st
+import pandas as pd
+
+from services.db import pool_stats, statement_cache_info, fanout_stats
+from services.gcs import gcs_cache_stats
+from services.cache_inferencia import cache_inferencia_stats
+from services.inferencia import inferencia_stats
+from services.estadisticas import invalidar_estadisticas
+from services.resumen_diario import reconstruir_resumen_diario
+from services.migraciones import aplicar_migraciones, migraciones_pendientes
+
+
+def rendimiento():
+    """Panel de administración con métricas internas (pool de conexiones, caché de imágenes)."""
+    stats = pool_stats()
+
+    st.markdown("#### Pool de conexiones")
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("Abiertas", stats["open"], help=f"Mín. {stats['min_size']} · Máx. {stats['max_size']} + {stats['max_overflow']} overflow")
+    c2.metric("En uso", stats["in_use"])
+    c3.metric("Ociosas", stats["idle"])
+    c4.metric("Espera prom. (ms)", f"{stats['wait_ms']['avg']:.1f}", help=f"Máx. {stats['wait_ms']['max']:.1f} ms en {stats['wait_ms']['count']} préstamos")
+
+    contadores = {k: v for k, v in stats.items() if isinstance(v, int) and k not in ("open", "in_use", "idle", "min_size", "max_size", "max_overflow")}
+    col_a, col_b = st.columns(2)
+    with col_a:
+        st.caption("Contadores")
+        st.dataframe(
+            pd.DataFrame({"Métrica": list(contadores.keys()), "Valor": list(contadores.values())}),
+            hide_index=True,
+            use_container_width=True,
+        )
+    with col_b:
+        st.caption("Tiempo de espera por préstamo")
+        buckets = stats["wait_ms"]["buckets"]
+        st.bar_chart(pd.DataFrame({"Préstamos": list(buckets.values())}, index=list(buckets.keys())))
+
+    cache = statement_cache_info()
+    st.caption(
+        f"Caché de sentencias SQL: {cache['hits']} aciertos · {cache['misses']} fallos · "
+        f"{cache['size']}/{cache['max_size']} entradas"
+    )
+
+    fan = fanout_stats()
+    if fan["fanouts"]:
+        ultimo = " · ".join(f"{k} {v:.0f}" for k, v in fan["last"].items())
+        st.caption(
+            f"Consultas en paralelo: {fan['fanouts']} lotes · {fan['queries']} consultas · "
+            f"{fan['wall_ms']:.0f} ms reales vs {fan['sum_ms']:.0f} ms en serie · último (ms): {ultimo}"
+        )
+
+    gcs = gcs_cache_stats()
+    st.markdown("#### Caché de imágenes (GCS)")
+    g1, g2, g3, g4 = st.columns(4)
+    g1.metric("Aciertos", f"{gcs['hit_ratio'] * 100:.0f}%", help=f"{gcs['hits']} aciertos · {gcs['revalidated']} revalidados · {gcs['misses']} fallos")
+    g2.metric("Archivos", gcs["files"])
+    g3.metric("En disco (MB)", f"{gcs['bytes'] / 1e6:.1f}", help=f"Presupuesto {gcs['max_bytes'] / 1e6:.0f} MB")
+    g4.metric("Desalojos", gcs["evictions"])
+    if gcs["prefetched"]:
+        st.caption(
+            f"Precarga en paralelo: {gcs['prefetched']} imágenes · "
+            f"{gcs['prefetch_ms_total'] / gcs['prefetched']:.0f} ms prom. · {gcs['prefetch_ms_max']} ms máx."
+        )
+
+    trabajos = inferencia_stats()
+    st.caption(
+        f"Cola de inferencia: {trabajos['pendiente']} pendientes · {trabajos['ejecutando']} en curso · "
+        f"{trabajos['listo']} listos · {trabajos['error']} con error"
+    )
+    cache_inf = cache_inferencia_stats()
+    st.caption(
+        f"Caché de inferencia: {cache_inf['hits']} aciertos · {cache_inf['misses']} fallos · "
+        f"{cache_inf['entries']} entradas · {cache_inf['bytes'] / 1e6:.1f}/{cache_inf['max_bytes'] / 1e6:.0f} MB"
+    )
+
+    try:
+        pendientes = migraciones_pendientes()
+    except Exception as e:
+        pendientes = None
+        st.caption(f"Migraciones de esquema: no se pudo consultar ({e})")
+    if pendientes is not None:
+        st.caption(
+            "Migraciones de esquema: "
+            + (", ".join(f"{v:03d} {n}" for v, n in pendientes) + " pendientes" if pendientes else "al día")
+        )
+    if pendientes and st.button(":material/database: Aplicar migraciones", key="rendimiento_migraciones",
+                                help="Crea los índices y tablas pendientes; puede tardar en tablas grandes"):
+        try:
+            hechas = aplicar_migraciones()
+            st.success(f"Migraciones aplicadas: {', '.join(f'{v:03d}' for v, _ in hechas) or 'ninguna'}")
+        except Exception as e:
+            st.error(f":material/error: No se pudieron aplicar las migraciones: {e}")
+
+    if st.button(":material/construction: Reconstruir resumen diario", key="rendimiento_resumen_diario",
+                 help="Recalcula EvaluacionDiaria (tablero de estadísticas) desde Prueba y Evaluado"):
+        try:
+            r = reconstruir_resumen_diario()
+            invalidar_estadisticas()
+            st.success(f"Resumen diario reconstruido: {r['filas']} filas · {r['pruebas']} pruebas")
+        except Exception as e:
+            st.error(f":material/error: No se pudo reconstruir el resumen diario: {e}")
+
+    if st.button(":material/refresh: Actualizar", key="rendimiento_refresh"):
+        st.rerun()
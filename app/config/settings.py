@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parents[1]
@@ -12,3 +13,38 @@ MAX_IMAGE_MB = 10
 
 GCS_BUCKET = "bucket-pbll"
 GCS_PRUEBAS_PREFIX = "pruebas"
+
+
+# ==================== AJUSTES (st.secrets / entorno) ====================
+# Lectura única de ajustes para todos los servicios: primero st.secrets y, si
+# la clave no está (o está vacía), la variable de entorno del mismo nombre.
+
+def get_setting(key: str, default=None):
+    """Valor de `key` en st.secrets o en el entorno; `default` si no existe."""
+    try:
+        import streamlit as st
+        val = st.secrets.get(key)
+        if val not in (None, ""):
+            return val
+    except Exception:
+        pass
+    return os.environ.get(key, default)
+
+
+def get_float_setting(key: str, default: float) -> float:
+    try:
+        val = get_setting(key)
+        return float(val) if val not in (None, "") else default
+    except (TypeError, ValueError):
+        return default
+
+
+def get_int_setting(key: str, default: int) -> int:
+    return int(get_float_setting(key, default))
+
+
+def get_bool_setting(key: str, default: bool = False) -> bool:
+    val = get_setting(key)
+    if val in (None, ""):
+        return default
+    return str(val).strip().lower() in ("1", "true", "yes", "si", "sí")
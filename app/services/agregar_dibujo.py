@@ -7,9 +7,8 @@ import pandas as pd
 
 from config.settings import TEMP_DIR, ORIGINALS_DIR
 from services.image_preprocess import estandarizar_imagen
-from services.indicadores import simular_resultado
-from services.db import fetch_df
-from services.queries.q_registro import POST_PRUEBA, POST_RESULTADO
+from services.inferencia import enviar_inferencia, estado_inferencia, resultado_inferencia
+from services.pruebas import construir_resultados, guardar_prueba_con_resultados, metadata_imagen_archivada
 from components.bounding_boxes import imagen_bboxes
 from services.exportar import render_export_popover
 try:
@@ -120,16 +119,21 @@ def agregar_dibujo(info_obj):
         if st.session_state.get("agregar_uploaded_file") is not None:
             filename = st.session_state["agregar_uploaded_file"].name
             
-            prev_uploaded = st.session_state.get('uploaded_file', None)
-            try:
-                st.session_state['uploaded_file'] = st.session_state.get('agregar_uploaded_file')
-            except Exception:
-                pass
-
             id_evaluado = info_obj.get('id_evaluado')
             if st.session_state.get("agregar_indicadores") is None:
                 try:
-                    raw_indicadores = simular_resultado(id_evaluado, show_overlay=True)
+                    # Encola la inferencia una sola vez por archivo; los reruns sólo consultan el estado
+                    archivo = st.session_state["agregar_uploaded_file"]
+                    clave_archivo = getattr(archivo, "file_id", None) or archivo.name
+                    trabajo = st.session_state.get('_agregar_inferencia') or {}
+                    if trabajo.get('archivo') != clave_archivo or estado_inferencia(trabajo.get('id')) is None:
+                        trabajo = {'archivo': clave_archivo, 'id': enviar_inferencia(id_evaluado, archivo=archivo)}
+                        st.session_state['_agregar_inferencia'] = trabajo
+                    # Al terminar el sondeo hay un rerun de la app: se vuelve a abrir el diálogo
+                    raw_indicadores = resultado_inferencia(
+                        trabajo['id'], show_overlay=True,
+                        al_terminar=lambda: st.session_state.update(_agregar_dialog_opened=False),
+                    )
                     # Store raw result (same idea as cargarImagen)
                     try:
                         st.session_state['agregar_raw_indicadores'] = raw_indicadores
@@ -177,18 +181,6 @@ def agregar_dibujo(info_obj):
             else:
                 indicadores = st.session_state.get("agregar_indicadores", [])
 
-            # restore previous uploaded_file (if any)
-            try:
-                if prev_uploaded is not None:
-                    st.session_state['uploaded_file'] = prev_uploaded
-                else:
-                    try:
-                        del st.session_state['uploaded_file']
-                    except Exception:
-                        pass
-            except Exception:
-                pass
-
             col1, col2 = st.columns([1, 2])
 
             with col1:
@@ -398,6 +390,7 @@ def agregar_dibujo(info_obj):
                 st.session_state["agregar_step"] = 1
                 st.session_state["agregar_uploaded_file"] = None
                 st.session_state["agregar_indicadores"] = None
+                st.session_state.pop('_agregar_inferencia', None)
                 st.session_state['add_drawing'] = False
                 st.session_state['_agregar_dialog_open_requested'] = False
                 st.rerun()
@@ -485,54 +478,17 @@ def agregar_dibujo(info_obj):
                             "fecha": fecha_actual
                         }
                         params_prueba = _normalize_params(params_prueba)
-                        sql_prueba = POST_PRUEBA
-                        df_prueba = fetch_df(sql_prueba, params_prueba)
-                        if df_prueba is None or df_prueba.empty:
-                            raise Exception("No se obtuvo id_prueba al insertar la prueba")
-                        try:
-                            id_prueba = int(df_prueba.iloc[0]["id_prueba"])
-                        except Exception:
-                            id_prueba = df_prueba.iloc[0].get("id_prueba")
 
-                        # Insertar resultados
+                        # Prueba + resultados en un solo lote atómico
                         indicadores = st.session_state.get("agregar_indicadores", [])
-                        try:
-                            img_for_norm = Image.open(st.session_state["agregar_uploaded_file"])  # Usar el archivo subido
-                            img_w, img_h = img_for_norm.size
-                        except Exception:
-                            img_w, img_h = None, None
-
-                        sql_resultado = POST_RESULTADO
-                        for ind in indicadores:
-                            iid = ind.get("id_indicador") or ind.get("id")
-                            x_min = float(ind.get("x_min", 0))
-                            x_max = float(ind.get("x_max", 0))
-                            y_min = float(ind.get("y_min", 0))
-                            y_max = float(ind.get("y_max", 0))
-                            confianza = float(ind.get("confianza", 0.0))
-
-                            if img_w and img_h and img_w > 0 and img_h > 0:
-                                x_min_norm = x_min / img_w
-                                y_min_norm = y_min / img_h
-                                w_norm = (x_max - x_min) / img_w
-                                h_norm = (y_max - y_min) / img_h
-                            else:
-                                x_min_norm = x_min
-                                y_min_norm = y_min
-                                w_norm = (x_max - x_min)
-                                h_norm = (y_max - y_min)
-
-                            params_result = {
-                                "id_prueba": id_prueba,
-                                "id_indicador": iid,
-                                "x_min": x_min_norm,
-                                "y_min": y_min_norm,
-                                "x_max": w_norm,
-                                "y_max": h_norm,
-                                "confianza": confianza
-                            }
-                            params_result = _normalize_params(params_result)
-                            fetch_df(sql_resultado, params_result)
+                        # Metadata de la imagen archivada (tamaño, orientación, hash) leída una sola vez;
+                        # se guarda con la prueba para que las vistas no tengan que abrirla
+                        imagen_meta = metadata_imagen_archivada(
+                            ruta_imagen, st.session_state["agregar_uploaded_file"],
+                            st.session_state.get('last_ruta_gcs'), st.session_state.get('last_preview_local'),
+                        )
+                        resultados = construir_resultados(indicadores, imagen_meta["ancho"], imagen_meta["alto"])
+                        id_prueba = guardar_prueba_con_resultados(params_prueba, resultados, imagen_meta)
 
                         try:
                             import importlib
@@ -567,6 +523,7 @@ def agregar_dibujo(info_obj):
                         st.session_state["agregar_step"] = 1
                         st.session_state["agregar_uploaded_file"] = None
                         st.session_state["agregar_indicadores"] = None
+                        st.session_state.pop('_agregar_inferencia', None)
                         # Clear raw indicators and mirrored indicadores (same as cargarImagen cleanup)
                         if 'agregar_raw_indicadores' in st.session_state:
                             try:
@@ -0,0 +1,309 @@
+import logging
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from config.settings import get_int_setting
+from services.db import fetch_df, fetch_df_many
+from services.estadisticas import clave_filtros
+from services.queries.q_estadisticas import (
+    ANALITICA_ESTADO_SQL, ANALITICA_PRUEBAS_SQL, ANALITICA_PARES_SQL,
+    ANALITICA_EVALUADOS_SQL, ANALITICA_CATALOGOS_SQL,
+)
+
+# Matriz de incidencia prueba x indicador en memoria (formato CSR con arrays de
+# NumPy: `indptr` por prueba e `indices` de columna por indicador detectado).
+# Se refresca como mucho cada ANALITICA_REFRESH_S: si sólo hay pruebas nuevas
+# se agregan al final; si desapareció alguna (bajas) se recarga entera. Los
+# atributos de cohorte (sexo, grupo) se leen siempre vigentes de Evaluado.
+ANALITICA_REFRESH_S = get_int_setting("ANALITICA_REFRESH_S", 60)
+# Filas densas por bloque al multiplicar (memoria acotada: bloque x indicadores)
+ANALITICA_BLOQUE_FILAS = get_int_setting("ANALITICA_BLOQUE_FILAS", 50000)
+
+_LOCK = threading.Lock()
+
+
+class _Incidencia:
+    """Pruebas (filas) e indicadores detectados (columnas), sólo presencia."""
+
+    def __init__(self):
+        self.id_prueba = np.zeros(0, dtype=np.int64)
+        self.id_evaluado = np.zeros(0, dtype=np.int64)
+        self.dia = np.zeros(0, dtype="datetime64[D]")
+        self.indptr = np.zeros(1, dtype=np.int64)
+        self.indices = np.zeros(0, dtype=np.int32)
+        self.columnas = []          # id_indicador de cada columna
+        self._columna = {}          # id_indicador -> columna
+        self.sexo = np.zeros(0, dtype=object)
+        self.id_grupo = np.zeros(0, dtype=np.float64)   # NaN = sin grupo
+        self.nombres = {}           # id_indicador -> nombre
+        self.grupos = {}            # id_grupo -> nombre
+        self.hasta_id = 0
+        self.version = 0
+        self.revisado = 0.0
+        self._firma_cohortes = None
+
+    def copia(self) -> "_Incidencia":
+        """Copia para actualizar sin afectar a quien esté leyendo la vigente
+        (los arrays se reemplazan, no se modifican en su lugar)."""
+        otra = _Incidencia.__new__(_Incidencia)
+        otra.__dict__.update(self.__dict__)
+        otra.columnas = list(self.columnas)
+        otra._columna = dict(self._columna)
+        return otra
+
+    @property
+    def n(self) -> int:
+        return len(self.id_prueba)
+
+    def agregar(self, pruebas: pd.DataFrame, pares: pd.DataFrame):
+        """Agrega pruebas nuevas (id mayor al último cargado) y sus pares."""
+        if pruebas is None or pruebas.empty:
+            return
+        ids = pruebas["id_prueba"].to_numpy(dtype=np.int64)
+        cuenta = np.zeros(len(ids), dtype=np.int64)
+        nuevos_indices = np.zeros(0, dtype=np.int32)
+        if pares is not None and not pares.empty:
+            for iid in pd.unique(pares["id_indicador"]):
+                if int(iid) not in self._columna:
+                    self._columna[int(iid)] = len(self.columnas)
+                    self.columnas.append(int(iid))
+            fila = np.searchsorted(ids, pares["id_prueba"].to_numpy(dtype=np.int64))
+            valido = (fila < len(ids)) & (ids[np.minimum(fila, len(ids) - 1)] == pares["id_prueba"].to_numpy(dtype=np.int64))
+            columnas = pares["id_indicador"].map(self._columna).to_numpy(dtype=np.int32)
+            fila, columnas = fila[valido], columnas[valido]
+            orden = np.lexsort((columnas, fila))
+            fila, nuevos_indices = fila[orden], columnas[orden]
+            cuenta = np.bincount(fila, minlength=len(ids))
+        self.indptr = np.concatenate([self.indptr, self.indptr[-1] + np.cumsum(cuenta)])
+        self.indices = np.concatenate([self.indices, nuevos_indices])
+        self.id_prueba = np.concatenate([self.id_prueba, ids])
+        self.id_evaluado = np.concatenate([self.id_evaluado, pruebas["id_evaluado"].to_numpy(dtype=np.int64)])
+        self.dia = np.concatenate([self.dia, pd.to_datetime(pruebas["dia"]).to_numpy().astype("datetime64[D]")])
+        self.hasta_id = int(ids.max())
+
+    def asignar_cohortes(self, evaluados: pd.DataFrame) -> bool:
+        """Alinea sexo y grupo vigentes a cada fila. Devuelve True si cambiaron."""
+        evaluados = evaluados if evaluados is not None else pd.DataFrame(columns=["id_evaluado", "sexo", "id_grupo"])
+        firma = (self.n, int(pd.util.hash_pandas_object(evaluados, index=False).sum()) if not evaluados.empty else 0)
+        if firma == self._firma_cohortes:
+            return False
+        por_id = evaluados.set_index("id_evaluado")
+        self.sexo = por_id["sexo"].reindex(self.id_evaluado).to_numpy(dtype=object)
+        self.id_grupo = pd.to_numeric(por_id["id_grupo"], errors="coerce").reindex(self.id_evaluado).to_numpy(dtype=np.float64)
+        self._firma_cohortes = firma
+        return True
+
+    def mascara(self, clave: tuple) -> np.ndarray:
+        """Filas que cumplen los filtros normalizados del tablero."""
+        id_evaluado, sexo, id_grupo, fecha_inicio, fecha_fin = clave
+        m = np.ones(self.n, dtype=bool)
+        if id_evaluado is not None:
+            m &= self.id_evaluado == id_evaluado
+        if sexo is not None:
+            m &= self.sexo == sexo
+        if id_grupo is not None:
+            m &= self.id_grupo == float(id_grupo)
+        if fecha_inicio is not None:
+            m &= self.dia >= np.datetime64(fecha_inicio, "D")
+        if fecha_fin is not None:
+            m &= self.dia <= np.datetime64(fecha_fin, "D")
+        return m
+
+    def posiciones(self, filas: np.ndarray):
+        """(fila relativa, posición en `indices`) de cada par de las filas dadas."""
+        inicio = self.indptr[filas]
+        largo = self.indptr[filas + 1] - inicio
+        total = int(largo.sum())
+        fila_rel = np.repeat(np.arange(len(filas)), largo)
+        desplazamiento = np.repeat(inicio - np.concatenate([[0], np.cumsum(largo)[:-1]]), largo)
+        return fila_rel, desplazamiento + np.arange(total)
+
+    def densa(self, filas: np.ndarray) -> np.ndarray:
+        """Bloque denso float32 (filas x indicadores) de 0/1."""
+        x = np.zeros((len(filas), len(self.columnas)), dtype=np.float32)
+        fila_rel, pos = self.posiciones(filas)
+        x[fila_rel, self.indices[pos]] = 1.0
+        return x
+
+
+_MATRIZ = _Incidencia()
+
+
+def _recargar() -> _Incidencia:
+    nueva = _Incidencia()
+    nueva.version = _MATRIZ.version + 1
+    return nueva
+
+
+def refrescar(forzar: bool = False) -> _Incidencia:
+    """Pone al día la matriz (como mucho cada ANALITICA_REFRESH_S) y la devuelve."""
+    global _MATRIZ
+    with _LOCK:
+        m = _MATRIZ
+        if not forzar and m.revisado and time.monotonic() - m.revisado < ANALITICA_REFRESH_S:
+            return m
+        estado = fetch_df(ANALITICA_ESTADO_SQL, {"hasta_id": m.hasta_id})
+        previas = int(estado.iloc[0]["previas"] or 0) if not estado.empty else 0
+        max_id = int(estado.iloc[0]["max_id"] or 0) if not estado.empty else 0
+        if previas != m.n:
+            # Bajas (o altas confirmadas con id menor al ya cargado): recargar
+            m = _recargar()
+        else:
+            m = m.copia()
+
+        consultas = {"evaluados": ANALITICA_EVALUADOS_SQL, "catalogos": ANALITICA_CATALOGOS_SQL}
+        if max_id > m.hasta_id:
+            tramo = {"desde_id": m.hasta_id, "hasta_id": max_id}
+            consultas["pruebas"] = (ANALITICA_PRUEBAS_SQL, tramo)
+            consultas["pares"] = (ANALITICA_PARES_SQL, tramo)
+        dfs, tiempos = fetch_df_many(consultas)
+
+        cambio = m.n != _MATRIZ.n or m.hasta_id != _MATRIZ.hasta_id
+        if "pruebas" in dfs and not dfs["pruebas"].empty:
+            m.agregar(dfs["pruebas"], dfs.get("pares"))
+            cambio = True
+        if m.asignar_cohortes(dfs["evaluados"]):
+            cambio = True
+        catalogos = dfs["catalogos"]
+        if not catalogos.empty:
+            es_ind = catalogos["tipo"] == "indicador"
+            m.nombres = dict(zip(catalogos.loc[es_ind, "id"].astype(int), catalogos.loc[es_ind, "nombre"]))
+            m.grupos = dict(zip(catalogos.loc[~es_ind, "id"].astype(int), catalogos.loc[~es_ind, "nombre"]))
+        if cambio:
+            m.version += 1
+            logging.info(f"analitica_indicadores: {m.n} pruebas, {len(m.indices)} pares, {len(m.columnas)} indicadores ({tiempos})")
+        m.revisado = time.monotonic()
+        _MATRIZ = m
+        return m
+
+
+# ==================== CÁLCULOS (vectorizados) ====================
+
+def coocurrencia(m: _Incidencia, filas: np.ndarray) -> np.ndarray:
+    """Matriz indicadores x indicadores con el número de pruebas en que
+    aparecen juntos (la diagonal es el soporte de cada uno)."""
+    k = len(m.columnas)
+    c = np.zeros((k, k), dtype=np.int64)
+    for i in range(0, len(filas), ANALITICA_BLOQUE_FILAS):
+        x = m.densa(filas[i:i + ANALITICA_BLOQUE_FILAS])
+        # float32 es exacto para conteos por bloque (< 2**24)
+        c += np.rint(x.T @ x).astype(np.int64)
+    return c
+
+
+def prevalencia_por_cohorte(m: _Incidencia, filas: np.ndarray, etiquetas: np.ndarray):
+    """Pruebas por cohorte y pruebas con cada indicador por cohorte.
+
+    Devuelve `(cohortes, n_por_cohorte, conteos)` con `conteos` de forma
+    cohortes x indicadores.
+    """
+    cohortes, codigo = np.unique(etiquetas, return_inverse=True)
+    conteos = np.zeros((len(cohortes), len(m.columnas)), dtype=np.int64)
+    fila_rel, pos = m.posiciones(filas)
+    np.add.at(conteos, (codigo[fila_rel], m.indices[pos]), 1)
+    return cohortes, np.bincount(codigo, minlength=len(cohortes)), conteos
+
+
+def asociaciones(c: np.ndarray, n: int, top_k: int = 20, min_pruebas: int = 5) -> pd.DataFrame:
+    """Pares de indicadores con mayor lift (co-ocurrencias observadas /
+    esperadas si fueran independientes), con al menos `min_pruebas` juntos."""
+    soporte = np.diag(c).astype(np.float64)
+    a, b = np.triu_indices(len(soporte), k=1)
+    juntos = c[a, b]
+    ok = (juntos >= max(1, min_pruebas)) & (soporte[a] > 0) & (soporte[b] > 0)
+    a, b, juntos = a[ok], b[ok], juntos[ok]
+    lift = juntos * float(n) / (soporte[a] * soporte[b])
+    orden = np.lexsort((-juntos, -lift))[:top_k]
+    return pd.DataFrame({
+        "a": a[orden],
+        "b": b[orden],
+        "pruebas": juntos[orden],
+        "soporte": juntos[orden] / float(n) if n else 0.0,
+        "confianza_ab": juntos[orden] / soporte[a[orden]],
+        "confianza_ba": juntos[orden] / soporte[b[orden]],
+        "lift": lift[orden],
+    })
+
+
+# ==================== RESULTADOS PARA EL TABLERO ====================
+
+@st.cache_data(ttl=600, max_entries=64, show_spinner=False)
+def _analitica_cacheada(clave: tuple, version: int, cohorte: str, top_k: int, min_pruebas: int) -> dict:
+    # `version` sólo forma parte de la clave del caché: cambia al refrescar la matriz
+    m = _MATRIZ
+    filas = np.flatnonzero(m.mascara(clave))
+    n = len(filas)
+    ids = np.asarray(m.columnas, dtype=np.int64)
+    nombres = [m.nombres.get(int(i), str(i)) for i in ids]
+    vacio = {"n_pruebas": n, "prevalencia": pd.DataFrame(), "coocurrencia": pd.DataFrame(),
+             "asociaciones": pd.DataFrame(), "por_cohorte": pd.DataFrame()}
+    if n == 0 or len(ids) == 0:
+        return vacio
+
+    c = coocurrencia(m, filas)
+    soporte = np.diag(c)
+    prevalencia = pd.DataFrame({
+        "id_indicador": ids, "indicador": nombres, "pruebas": soporte, "prevalencia": soporte / n,
+    }).sort_values(["pruebas", "indicador"], ascending=[False, True], ignore_index=True)
+
+    total = soporte.astype(np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        lift = np.where(np.outer(total, total) > 0, c * float(n) / np.outer(total, total), np.nan)
+    a, b = np.meshgrid(np.arange(len(ids)), np.arange(len(ids)), indexing="ij")
+    cooc = pd.DataFrame({
+        "indicador_a": np.asarray(nombres, dtype=object)[a.ravel()],
+        "indicador_b": np.asarray(nombres, dtype=object)[b.ravel()],
+        "pruebas": c.ravel(),
+        "lift": lift.ravel(),
+    })
+
+    pares = asociaciones(c, n, top_k=top_k, min_pruebas=min_pruebas)
+    if not pares.empty:
+        pares.insert(0, "indicador_a", [nombres[i] for i in pares.pop("a")])
+        pares.insert(1, "indicador_b", [nombres[i] for i in pares.pop("b")])
+
+    if cohorte == "grupo":
+        etiquetas = np.array(
+            [m.grupos.get(int(g), f"Grupo {int(g)}") if not np.isnan(g) else "Sin grupo" for g in m.id_grupo[filas]],
+            dtype=object,
+        )
+    else:
+        etiquetas = np.array(
+            [s if isinstance(s, str) and s else "No especificado" for s in m.sexo[filas]], dtype=object
+        )
+    cohortes, n_coh, conteos = prevalencia_por_cohorte(m, filas, etiquetas)
+    por_cohorte = pd.DataFrame({
+        "cohorte": np.repeat(cohortes, len(ids)),
+        "pruebas_cohorte": np.repeat(n_coh, len(ids)),
+        "indicador": np.tile(np.asarray(nombres, dtype=object), len(cohortes)),
+        "pruebas": conteos.ravel(),
+    })
+    por_cohorte["prevalencia"] = por_cohorte["pruebas"] / por_cohorte["pruebas_cohorte"]
+
+    return {"n_pruebas": n, "prevalencia": prevalencia, "coocurrencia": cooc,
+            "asociaciones": pares, "por_cohorte": por_cohorte}
+
+
+def analitica_indicadores(filtros: dict | None = None, cohorte: str = "sexo",
+                          top_k: int = 20, min_pruebas: int = 5) -> dict:
+    """Prevalencia, co-ocurrencia, lift y prevalencia por cohorte ('sexo' o
+    'grupo') de los indicadores en las pruebas que cumplen los filtros.
+
+    Devuelve `n_pruebas` y DataFrames `prevalencia` (id_indicador, indicador,
+    pruebas, prevalencia), `coocurrencia` (indicador_a, indicador_b, pruebas,
+    lift), `asociaciones` (top-k pares por lift con soporte y confianzas) y
+    `por_cohorte` (cohorte, pruebas_cohorte, indicador, pruebas, prevalencia).
+    Cacheado por filtros y versión de la matriz.
+    """
+    m = refrescar()
+    return _analitica_cacheada(clave_filtros(filtros), m.version, cohorte, int(top_k), int(min_pruebas))
+
+
+def invalidar_analitica():
+    """Fuerza a revisar la base en la próxima consulta (tras bajas o altas)."""
+    with _LOCK:
+        _MATRIZ.revisado = 0.0
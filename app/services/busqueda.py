@@ -0,0 +1,55 @@
+import threading
+import weakref
+
+import pandas as pd
+
+# Separador entre columnas: evita coincidencias que crucen de una columna a otra
+_SEP = "\x1f"
+
+# id(DataFrame) -> (weakref al DataFrame, {columnas: Serie de búsqueda}).
+# La entrada desaparece junto con el DataFrame, así que al invalidar el cache
+# (p. ej. `del st.session_state['usuarios_df']`) también se descarta su columna.
+_INDICES = {}
+_LOCK = threading.Lock()
+
+
+def _olvidar(key):
+    with _LOCK:
+        _INDICES.pop(key, None)
+
+
+def columna_busqueda(df: pd.DataFrame, columnas) -> pd.Series:
+    """Columna precalculada en minúsculas con las `columnas` concatenadas.
+
+    Se calcula una vez por DataFrame cacheado y se reutiliza en cada rerun.
+    """
+    columnas = tuple(c for c in columnas if c in df.columns)
+    key = id(df)
+    with _LOCK:
+        entry = _INDICES.get(key)
+        if entry is None or entry[0]() is not df:
+            entry = (weakref.ref(df, lambda _r, key=key: _olvidar(key)), {})
+            _INDICES[key] = entry
+        serie = entry[1].get(columnas)
+    if serie is not None:
+        return serie
+
+    if columnas:
+        partes = [df[c].fillna("").astype(str) for c in columnas]
+        serie = partes[0].str.cat(partes[1:], sep=_SEP).str.lower()
+    else:
+        serie = pd.Series("", index=df.index, dtype=object)
+    with _LOCK:
+        entry[1][columnas] = serie
+    return serie
+
+
+def mascara_busqueda(df: pd.DataFrame, texto: str, columnas) -> pd.Series:
+    """Máscara booleana (mismo índice que `df`) de las filas que contienen `texto`.
+
+    Un solo `str.contains` vectorizado, sin regex y sin distinguir mayúsculas.
+    """
+    texto = str(texto or "").strip().lower()
+    if not texto:
+        return pd.Series(True, index=df.index)
+    return columna_busqueda(df, columnas).str.contains(texto, regex=False)
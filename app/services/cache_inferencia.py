@@ -0,0 +1,175 @@
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from config.settings import get_setting, get_int_setting
+from services.indicadores import INFERENCE_ENDPOINT
+
+# Caché local de resultados del modelo, por contenido de la imagen y versión del
+# modelo: volver atrás en el asistente o subir de nuevo el mismo dibujo no vuelve
+# a llamar a /predict ni a descargar la vista previa. SQLite en disco, con TTL y
+# presupuesto en bytes (desalojo LRU por último uso).
+INFERENCE_CACHE_PATH = str(get_setting("INFERENCE_CACHE_PATH", "") or os.path.join(tempfile.gettempdir(), "pef_inferencia_cache.sqlite3"))
+INFERENCE_CACHE_TTL_S = get_int_setting("INFERENCE_CACHE_TTL_S", 7 * 24 * 3600)
+INFERENCE_CACHE_MAX_BYTES = get_int_setting("INFERENCE_CACHE_MAX_BYTES", 128 * 1024 * 1024)
+# Cambiarla invalida todo lo cacheado (p. ej. al desplegar un modelo nuevo);
+# por defecto se usa la URL del endpoint.
+INFERENCE_MODEL_VERSION = str(get_setting("INFERENCE_MODEL_VERSION", "") or INFERENCE_ENDPOINT)
+
+_CREAR_SQL = """
+CREATE TABLE IF NOT EXISTS resultado (
+    clave      TEXT PRIMARY KEY,
+    resultados TEXT NOT NULL,
+    ruta_gcs   TEXT,
+    preview    BLOB,
+    bytes      INTEGER NOT NULL,
+    creado     REAL NOT NULL,
+    usado      REAL NOT NULL
+)
+"""
+
+_STATS = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+_LOCK = threading.Lock()
+_INICIADO = False
+
+
+def _conectar() -> sqlite3.Connection:
+    global _INICIADO
+    conn = sqlite3.connect(INFERENCE_CACHE_PATH, timeout=10)
+    if not _INICIADO:
+        with _LOCK:
+            if not _INICIADO:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(_CREAR_SQL)
+                conn.execute("CREATE INDEX IF NOT EXISTS ix_resultado_usado ON resultado(usado)")
+                conn.commit()
+                _INICIADO = True
+    return conn
+
+
+def _bump(key: str, n: int = 1):
+    with _LOCK:
+        _STATS[key] += n
+
+
+def clave_cache(sha256: str, id_evaluado, variante: str = "") -> str:
+    """Clave de caché: contenido + evaluado + versión del modelo (+ `variante`
+    del preprocesado, que cambia lo que ve el modelo).
+
+    El evaluado forma parte de la clave porque el endpoint guarda la imagen
+    bajo `pruebas/{id_evaluado}/` y devuelve esa ruta.
+    """
+    return f"{sha256}:{id_evaluado}:{INFERENCE_MODEL_VERSION}:{variante}"
+
+
+def obtener(clave: str, ruta_preview: str | None = None):
+    """Resultado cacheado `{'resultados', 'ruta_gcs', 'preview_local'}` o None.
+
+    Si hay vista previa guardada se escribe en `ruta_preview`.
+    """
+    try:
+        conn = _conectar()
+        try:
+            fila = conn.execute(
+                "SELECT resultados, ruta_gcs, preview, creado FROM resultado WHERE clave = ?", (clave,)
+            ).fetchone()
+            if fila is None or fila[3] < time.time() - INFERENCE_CACHE_TTL_S:
+                _bump("misses")
+                return None
+            conn.execute("UPDATE resultado SET usado = ? WHERE clave = ?", (time.time(), clave))
+            conn.commit()
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        logging.warning(f"cache_inferencia: lectura fallida: {e}")
+        return None
+
+    resultados, ruta_gcs, preview, _ = fila
+    preview_local = None
+    if preview is not None and ruta_preview:
+        try:
+            tmp = f"{ruta_preview}.tmp-{os.getpid()}-{threading.get_ident()}"
+            with open(tmp, "wb") as fh:
+                fh.write(preview)
+            os.replace(tmp, ruta_preview)
+            preview_local = ruta_preview
+        except OSError as e:
+            logging.warning(f"cache_inferencia: no se pudo escribir la vista previa: {e}")
+    _bump("hits")
+    return {"resultados": json.loads(resultados), "ruta_gcs": ruta_gcs, "preview_local": preview_local}
+
+
+def guardar(clave: str, resultado: dict):
+    """Guarda el resultado de una inferencia (y su vista previa) y aplica el presupuesto."""
+    preview = None
+    ruta = resultado.get("preview_local")
+    if ruta:
+        try:
+            with open(ruta, "rb") as fh:
+                preview = fh.read()
+        except OSError:
+            preview = None
+    try:
+        resultados = json.dumps(resultado.get("resultados") or [], default=lambda v: v.item() if hasattr(v, "item") else str(v))
+    except (TypeError, ValueError) as e:
+        logging.warning(f"cache_inferencia: resultado no serializable: {e}")
+        return
+    ahora = time.time()
+    tamano = len(resultados) + len(preview or b"")
+    try:
+        conn = _conectar()
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO resultado (clave, resultados, ruta_gcs, preview, bytes, creado, usado)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (clave, resultados, resultado.get("ruta_gcs"), preview, tamano, ahora, ahora),
+            )
+            conn.commit()
+            _bump("stores")
+            _desalojar(conn)
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        logging.warning(f"cache_inferencia: escritura fallida: {e}")
+
+
+def _desalojar(conn: sqlite3.Connection):
+    """Borra lo vencido y, si se excede el presupuesto, lo menos usado hasta el 90%."""
+    borrados = conn.execute(
+        "DELETE FROM resultado WHERE creado < ?", (time.time() - INFERENCE_CACHE_TTL_S,)
+    ).rowcount
+    total = conn.execute("SELECT COALESCE(SUM(bytes), 0) FROM resultado").fetchone()[0]
+    if total > INFERENCE_CACHE_MAX_BYTES:
+        objetivo = int(INFERENCE_CACHE_MAX_BYTES * 0.9)
+        for clave, tamano in conn.execute("SELECT clave, bytes FROM resultado ORDER BY usado").fetchall():
+            if total <= objetivo:
+                break
+            conn.execute("DELETE FROM resultado WHERE clave = ?", (clave,))
+            total -= tamano
+            borrados += 1
+    conn.commit()
+    if borrados:
+        _bump("evictions", borrados)
+
+
+def cache_inferencia_stats() -> dict:
+    """Contadores del proceso más entradas y bytes actuales."""
+    with _LOCK:
+        stats = dict(_STATS)
+    stats["entries"], stats["bytes"] = 0, 0
+    try:
+        conn = _conectar()
+        try:
+            stats["entries"], stats["bytes"] = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM resultado"
+            ).fetchone()
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        pass
+    stats["max_bytes"] = INFERENCE_CACHE_MAX_BYTES
+    return stats
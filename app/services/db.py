@@ -1,37 +1,170 @@
 import streamlit as st
 import pandas as pd
 import pymssql
+import functools
 import os
 import queue
+import re
 import threading
 import time
+from contextlib import contextmanager
 from typing import Optional
 
-# Lightweight connection pool to reduce latency when opening many DB connections.
-# Pool size is configurable via st.secrets['DB_POOL_SIZE'] or env DB_POOL_SIZE.
+from config.settings import get_setting, get_float_setting, get_int_setting, get_bool_setting
+
+# Connection pool acotado para reducir la latencia de abrir conexiones.
+# Tamaños configurables vía st.secrets / variables de entorno:
+#   DB_POOL_MIN_SIZE      conexiones que se mantienen abiertas (y se precalientan)
+#   DB_POOL_SIZE          máximo de conexiones persistentes en el pool
+#   DB_POOL_MAX_OVERFLOW  conexiones extra temporales bajo carga (se cierran al devolverse)
+#   DB_POOL_TIMEOUT       segundos de espera por una conexión antes de fallar
+#   DB_POOL_RECYCLE_S     vida máxima de una conexión antes de reciclarla
+#   DB_POOL_WARMUP        abrir DB_POOL_MIN_SIZE conexiones al iniciar (1/0)
 _POOL: Optional[queue.Queue] = None
 _POOL_LOCK = threading.Lock()
 
+# Metadatos de las conexiones del pool (id(conn) -> timestamps). Las conexiones
+# de pymssql no aceptan atributos propios, así que se llevan aparte. Cada
+# entrada guarda también la conexión: mientras esté registrada su id no puede
+# reutilizarse, y se compara la identidad al leerla. Sólo se registran las
+# conexiones del pool y se olvidan al cerrarlas (`_close_quietly`).
+_CONN_META: dict = {}
+_META_LOCK = threading.Lock()
+
+# Conexiones abiertas que pertenecen al pool (ociosas + prestadas).
+_OPEN_COUNT = 0
+_COUNT_LOCK = threading.Lock()
+
+# Se notifica cada vez que se libera capacidad: una conexión vuelve a la cola
+# o se cierra una del pool (baja _OPEN_COUNT). Quien espera en
+# `borrow_connection` despierta y reintenta la cola y `_try_open_pooled`.
+# Orden de locks: _CAPACITY antes que _COUNT_LOCK; nunca al revés.
+_CAPACITY = threading.Condition()
+
+# Contadores del pool, legibles con `pool_stats()`.
+_STATS = {
+    "hits": 0,                  # conexión tomada del pool
+    "misses": 0,                # pool vacío -> conexión nueva
+    "ephemeral": 0,             # conexión de overflow cerrada al devolverla
+    "overflow": 0,              # conexiones abiertas por encima de DB_POOL_SIZE
+    "timeouts": 0,              # esperas que agotaron DB_POOL_TIMEOUT
+    "recycled": 0,              # conexiones cerradas por superar DB_POOL_RECYCLE_S
+    "validations": 0,           # SELECT 1 ejecutados (borrow o reaper)
+    "validation_failures": 0,   # conexiones muertas detectadas al validar
+    "retries": 0,               # reintentos transparentes por socket muerto
+    "reaped": 0,                # conexiones descartadas por el reaper
+}
+_STATS_LOCK = threading.Lock()
+
+# Histograma del tiempo de espera por préstamo (límites superiores en ms).
+WAIT_BUCKETS_MS = (1, 5, 10, 50, 100, 250, 500, 1000, 5000)
+_WAIT_COUNTS = [0] * (len(WAIT_BUCKETS_MS) + 1)
+_WAIT_TOTAL = {"count": 0, "sum_ms": 0.0, "max_ms": 0.0}
+
+_REAPER: Optional[threading.Thread] = None
+
+
+class PoolTimeout(TimeoutError):
+    """No se obtuvo conexión del pool dentro de DB_POOL_TIMEOUT."""
+
+
+# Una conexión usada hace menos de esto se entrega sin SELECT 1.
+VALIDATE_AFTER_S = get_float_setting("DB_VALIDATE_AFTER_S", 30.0)
+# Cada cuánto el reaper revisa las conexiones ociosas del pool.
+REAPER_INTERVAL_S = get_float_setting("DB_REAPER_INTERVAL_S", 30.0)
+
+POOL_MIN_SIZE = max(0, get_int_setting("DB_POOL_MIN_SIZE", 1))
+POOL_MAX_SIZE = max(1, get_int_setting("DB_POOL_SIZE", 5))
+POOL_MAX_OVERFLOW = max(0, get_int_setting("DB_POOL_MAX_OVERFLOW", 5))
+POOL_TIMEOUT_S = get_float_setting("DB_POOL_TIMEOUT", 10.0)
+POOL_RECYCLE_S = get_float_setting("DB_POOL_RECYCLE_S", 1800.0)
+POOL_WARMUP = get_bool_setting("DB_POOL_WARMUP", True)
+
+
+def _bump(stat: str, n: int = 1):
+    with _STATS_LOCK:
+        _STATS[stat] = _STATS.get(stat, 0) + n
+
+
+def _record_wait(seconds: float):
+    ms = seconds * 1000.0
+    idx = len(WAIT_BUCKETS_MS)
+    for i, limit in enumerate(WAIT_BUCKETS_MS):
+        if ms <= limit:
+            idx = i
+            break
+    with _STATS_LOCK:
+        _WAIT_COUNTS[idx] += 1
+        _WAIT_TOTAL["count"] += 1
+        _WAIT_TOTAL["sum_ms"] += ms
+        if ms > _WAIT_TOTAL["max_ms"]:
+            _WAIT_TOTAL["max_ms"] = ms
+
+
+def _register(conn):
+    """Da de alta una conexión recién abierta para el pool."""
+    now = time.monotonic()
+    with _META_LOCK:
+        _CONN_META[id(conn)] = {
+            "conn": conn, "pooled": True, "created": now, "last_used": now, "last_validated": now,
+        }
+
 
-def _get_secret(key: str, default: Optional[str] = None) -> Optional[str]:
+def _entry(conn) -> Optional[dict]:
+    # Llamar con _META_LOCK tomado
+    meta = _CONN_META.get(id(conn))
+    return meta if meta is not None and meta["conn"] is conn else None
+
+
+def _touch(conn, validated: bool = False):
+    now = time.monotonic()
+    with _META_LOCK:
+        meta = _entry(conn)
+        if meta is None:
+            return
+        meta["last_used"] = now
+        if validated:
+            meta["last_validated"] = now
+
+
+def _meta(conn) -> dict:
+    with _META_LOCK:
+        return dict(_entry(conn) or {})
+
+
+def _forget(conn) -> dict:
+    with _META_LOCK:
+        if _entry(conn) is None:
+            return {}
+        return _CONN_META.pop(id(conn))
+
+
+def _notify_capacity():
+    with _CAPACITY:
+        _CAPACITY.notify()
+
+
+def _close_quietly(conn):
+    global _OPEN_COUNT
+    meta = _forget(conn)
+    if meta.get("pooled"):
+        with _COUNT_LOCK:
+            _OPEN_COUNT = max(0, _OPEN_COUNT - 1)
+        _notify_capacity()
     try:
-        if hasattr(st, "secrets"):
-            val = st.secrets.get(key)
-            if val:
-                return val
+        conn.close()
     except Exception:
         pass
-    return os.environ.get(key, default)
 
 
 def _make_connection():
-    server = _get_secret("DB_HOST") or "34.55.82.47"
-    port = int(_get_secret("DB_PORT") or os.environ.get("DB_PORT") or 1433)
-    user = _get_secret("DB_USER") or "streamlit_user"
-    password = _get_secret("DB_PASS") or "pbll_pwd"
-    database = _get_secret("DB_NAME") or "PBLL"
+    server = get_setting("DB_HOST") or "34.55.82.47"
+    port = int(get_setting("DB_PORT") or 1433)
+    user = get_setting("DB_USER") or "streamlit_user"
+    password = get_setting("DB_PASS") or "pbll_pwd"
+    database = get_setting("DB_NAME") or "PBLL"
 
-    return pymssql.connect(
+    conn = pymssql.connect(
         server=server,
         port=port,
         user=user,
@@ -40,143 +173,907 @@ def _make_connection():
         login_timeout=10,
         timeout=30,
     )
+    return conn
+
+
+def _try_open_pooled(limit: int):
+    """Abre una conexión del pool si hay cupo por debajo de `limit`; si no, None."""
+    global _OPEN_COUNT
+    with _COUNT_LOCK:
+        if _OPEN_COUNT >= limit:
+            return None
+        _OPEN_COUNT += 1
+        overflow = _OPEN_COUNT > POOL_MAX_SIZE
+    try:
+        conn = _make_connection()
+    except Exception:
+        with _COUNT_LOCK:
+            _OPEN_COUNT = max(0, _OPEN_COUNT - 1)
+        _notify_capacity()
+        raise
+    _register(conn)
+    if overflow:
+        _bump("overflow")
+    return conn
+
+
+def _has_capacity(limit: int) -> bool:
+    with _COUNT_LOCK:
+        return _OPEN_COUNT < limit
+
+
+def _expired(conn) -> bool:
+    if POOL_RECYCLE_S <= 0:
+        return False
+    return (time.monotonic() - _meta(conn).get("created", 0.0)) >= POOL_RECYCLE_S
+
+
+def _validate(conn) -> bool:
+    """Ejecuta SELECT 1 sobre la conexión; True si sigue viva."""
+    _bump("validations")
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT 1")
+        cur.fetchall()
+        cur.close()
+        _touch(conn, validated=True)
+        return True
+    except Exception:
+        _bump("validation_failures")
+        return False
+
+
+# Errores de DB-Library que indican socket/sesión muerta:
+#   20004 lectura del servidor fallida     20006 escritura al servidor fallida
+#   20017 EOF inesperado del servidor      20047 DBPROCESS muerto o deshabilitado
+# No incluye 20003 ("Adaptive Server connection timed out"): es el timeout de
+# consulta, y reintentarlo duplicaría la latencia y la sentencia lenta.
+_DISCONNECT_CODES = {20004, 20006, 20017, 20047}
+_DISCONNECT_CODES_RE = re.compile(r"\b(" + "|".join(str(c) for c in sorted(_DISCONNECT_CODES)) + r")\b")
+_DISCONNECT_MARKERS = (
+    "dbprocess is dead", "not connected", "write to the server failed",
+    "read from the server failed", "unexpected eof from the server", "broken pipe",
+    "connection reset by peer",
+)
+
+
+def _is_disconnect(exc: Exception) -> bool:
+    """¿El error indica un socket/sesión muerta y no un error de SQL o un timeout?"""
+    if isinstance(exc, (pymssql.InterfaceError,)):
+        return True
+    if isinstance(exc, pymssql.OperationalError):
+        args = getattr(exc, "args", ())
+        if args and isinstance(args[0], int) and args[0] in _DISCONNECT_CODES:
+            return True
+        msg = str(exc).lower()
+        return bool(_DISCONNECT_CODES_RE.search(msg)) or any(m in msg for m in _DISCONNECT_MARKERS)
+    return False
 
 
 def get_connection():
-    """Backwards-compatible: crea una conexión nueva.
+    """Backwards-compatible: crea una conexión nueva, fuera del pool.
 
+    No se registra en el pool: quien la pide la cierra con `conn.close()`.
     Preferir `borrow_connection()` para reusar conexiones del pool.
     """
     return _make_connection()
 
 
-def init_pool(size: int = None):
-    """Inicializa el pool global (idempotente)."""
-    global _POOL
+def init_pool(size: int = None, warm_up: Optional[bool] = None):
+    """Inicializa el pool global (idempotente).
+
+    `size` sobrescribe DB_POOL_SIZE. Con `warm_up` (por defecto DB_POOL_WARMUP)
+    se abren DB_POOL_MIN_SIZE conexiones de antemano para evitar el arranque en frío.
+    Se llama al iniciar la app (app.py); `borrow_connection` lo hace si aún no.
+    """
+    global _POOL, POOL_MAX_SIZE
     with _POOL_LOCK:
         if _POOL is not None:
             return
+        if size:
+            POOL_MAX_SIZE = max(1, int(size))
+        # La cola nunca guarda overflow: al devolverse se cierra.
+        _POOL = queue.Queue(maxsize=POOL_MAX_SIZE)
+    if POOL_WARMUP if warm_up is None else warm_up:
+        _fill_to_min()
+    _start_reaper()
+
+
+def _fill_to_min():
+    """Abre conexiones hasta tener DB_POOL_MIN_SIZE abiertas (ociosas + prestadas).
+
+    Las nuevas quedan ociosas en el pool; nunca se pasa de DB_POOL_SIZE.
+    """
+    pool = _POOL
+    if pool is None:
+        return
+    target = min(POOL_MIN_SIZE, POOL_MAX_SIZE)
+    while True:
         try:
-            cfg_size = None
-            try:
-                cfg_size = int(_get_secret("DB_POOL_SIZE") or os.environ.get("DB_POOL_SIZE"))
-            except Exception:
-                cfg_size = None
-            pool_size = size or cfg_size or 5
-            q = queue.Queue(maxsize=pool_size)
-            # pre-populate one connection to reduce cold-start latency
-            try:
-                q.put(_make_connection(), block=False)
-            except Exception:
-                pass
-            _POOL = q
+            # None cuando ya hay `target` abiertas
+            conn = _try_open_pooled(target)
         except Exception:
-            _POOL = None
-def borrow_connection(timeout: float = 2.0):
-    """Toma una conexión del pool, o crea una nueva si el pool está vacío."""
-    global _POOL
-    if _POOL is None:
-        init_pool()
+            return
+        if conn is None:
+            return
+        try:
+            pool.put(conn, block=False)
+        except queue.Full:
+            _close_quietly(conn)
+            return
+        _notify_capacity()
 
-    try:
-        conn = _POOL.get(block=True, timeout=timeout)
-    except Exception:
-        # pool vacío o timeout -> crear conexión efímera
-        return _make_connection()
 
-    # health check
-    try:
-        cur = conn.cursor()
-        cur.execute("SELECT 1")
-        cur.fetchall()
-        cur.close()
-        return conn
-    except Exception:
+def _reap_idle():
+    """Valida o recicla las conexiones ociosas del pool y repone el mínimo.
+
+    Sólo revisa las que hay en la cola en este momento; las que están
+    prestadas se validan solas al volver a usarse.
+    """
+    pool = _POOL
+    if pool is None:
+        return
+    now = time.monotonic()
+    for _ in range(pool.qsize()):
+        try:
+            conn = pool.get(block=False)
+        except queue.Empty:
+            break
+        if _expired(conn):
+            _bump("recycled")
+            _close_quietly(conn)
+            continue
+        idle = now - _meta(conn).get("last_used", 0.0)
+        if idle >= VALIDATE_AFTER_S and not _validate(conn):
+            _bump("reaped")
+            _close_quietly(conn)
+            continue
+        try:
+            pool.put(conn, block=False)
+        except queue.Full:
+            _close_quietly(conn)
+            continue
+        _notify_capacity()
+    _fill_to_min()
+
+
+def _reaper_loop():
+    while True:
+        time.sleep(REAPER_INTERVAL_S)
         try:
-            conn.close()
+            _reap_idle()
         except Exception:
             pass
-        return _make_connection()
+
+
+def _start_reaper():
+    global _REAPER
+    with _POOL_LOCK:
+        if _REAPER is not None and _REAPER.is_alive():
+            return
+        if REAPER_INTERVAL_S <= 0:
+            return
+        _REAPER = threading.Thread(target=_reaper_loop, name="db-pool-reaper", daemon=True)
+        _REAPER.start()
+
+
+def borrow_connection(timeout: Optional[float] = None, validate: bool = False):
+    """Toma una conexión del pool.
+
+    Orden: conexión ociosa -> nueva si hay cupo (DB_POOL_SIZE + DB_POOL_MAX_OVERFLOW)
+    -> esperar hasta `timeout` (DB_POOL_TIMEOUT) a que otra se devuelva. Si se
+    agota la espera lanza `PoolTimeout` en lugar de abrir conexiones sin límite.
+
+    No hace `SELECT 1` si la conexión se usó hace menos de `VALIDATE_AFTER_S`
+    (las ociosas las valida el reaper en segundo plano). Con `validate=True`
+    se fuerza la comprobación, útil cuando no se puede reintentar (transacciones).
+    """
+    if _POOL is None:
+        init_pool()
+    if timeout is None:
+        timeout = POOL_TIMEOUT_S
+
+    started = time.monotonic()
+    deadline = started + max(0.0, timeout)
+    while True:
+        conn = None
+        try:
+            conn = _POOL.get(block=False)
+            _bump("hits")
+        except queue.Empty:
+            conn = _try_open_pooled(POOL_MAX_SIZE + POOL_MAX_OVERFLOW)
+            if conn is not None:
+                _bump("misses")
+                _record_wait(time.monotonic() - started)
+                return conn
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                _bump("timeouts")
+                _record_wait(time.monotonic() - started)
+                raise PoolTimeout(
+                    f"No hay conexiones libres en el pool tras {timeout:.1f}s "
+                    f"(máx. {POOL_MAX_SIZE} + {POOL_MAX_OVERFLOW} overflow)"
+                )
+            # Espera a que se libere capacidad (devolución o cierre) y vuelve
+            # a probar la cola y el cupo. El estado se revisa con _CAPACITY
+            # tomado, así que un aviso entre la revisión y el wait no se pierde.
+            with _CAPACITY:
+                if _POOL.empty() and not _has_capacity(POOL_MAX_SIZE + POOL_MAX_OVERFLOW):
+                    _CAPACITY.wait(remaining)
+            continue
+
+        if _expired(conn):
+            _bump("recycled")
+            _close_quietly(conn)
+            continue
+
+        recently_used = (time.monotonic() - _meta(conn).get("last_used", 0.0)) < VALIDATE_AFTER_S
+        if (recently_used and not validate) or _validate(conn):
+            _touch(conn)
+            _record_wait(time.monotonic() - started)
+            return conn
+        _close_quietly(conn)
+
+
+def discard_connection(conn):
+    """Cierra una conexión rota sin devolverla al pool."""
+    if conn is not None:
+        _close_quietly(conn)
 
 
 def return_connection(conn):
-    """Devuelve la conexión al pool o la cierra si el pool está lleno."""
-    global _POOL
+    """Devuelve la conexión al pool, o la cierra si es de overflow o ya caducó."""
     if conn is None:
         return
-    if _POOL is None:
-        try:
-            conn.close()
-        except Exception:
-            pass
+    if _POOL is None or not _meta(conn).get("pooled"):
+        _close_quietly(conn)
+        return
+    if _expired(conn):
+        _bump("recycled")
+        _close_quietly(conn)
         return
 
+    with _COUNT_LOCK:
+        is_overflow = _OPEN_COUNT > POOL_MAX_SIZE
+    if is_overflow:
+        _bump("ephemeral")
+        _close_quietly(conn)
+        return
+
+    _touch(conn)
     try:
         _POOL.put(conn, block=False)
-    except Exception:
+    except queue.Full:
+        _bump("ephemeral")
+        _close_quietly(conn)
+        return
+    _notify_capacity()
+
+
+def pool_stats() -> dict:
+    """Instantánea de contadores, tamaños e histograma de espera del pool.
+
+    Pensado para la página de administración (Ajustes > Rendimiento).
+    """
+    with _STATS_LOCK:
+        stats = dict(_STATS)
+        counts = list(_WAIT_COUNTS)
+        total = dict(_WAIT_TOTAL)
+    with _COUNT_LOCK:
+        open_count = _OPEN_COUNT
+    idle = _POOL.qsize() if _POOL is not None else 0
+    stats.update({
+        "open": open_count,
+        "idle": idle,
+        "in_use": max(0, open_count - idle),
+        "min_size": POOL_MIN_SIZE,
+        "max_size": POOL_MAX_SIZE,
+        "max_overflow": POOL_MAX_OVERFLOW,
+        "recycle_s": POOL_RECYCLE_S,
+    })
+    labels = [f"<={b}ms" for b in WAIT_BUCKETS_MS] + [f">{WAIT_BUCKETS_MS[-1]}ms"]
+    stats["wait_ms"] = {
+        "buckets": dict(zip(labels, counts)),
+        "count": total["count"],
+        "avg": (total["sum_ms"] / total["count"]) if total["count"] else 0.0,
+        "max": total["max_ms"],
+    }
+    return stats
+
+
+# Placeholders @nombre (no @@globales). Las variables que el propio lote declara
+# con DECLARE (@ids_table, @nueva_prueba...) no son parámetros y se respetan.
+_PARAM_RE = re.compile(r"(?<!@)@([A-Za-z0-9_]+)")
+_DECLARE_RE = re.compile(r"\bDECLARE\s+@([A-Za-z0-9_]+)", re.IGNORECASE)
+
+STATEMENT_CACHE_SIZE = get_int_setting("DB_STATEMENT_CACHE_SIZE", 256)
+
+
+class MissingParameterError(KeyError):
+    """Se pidió un parámetro @nombre que no viene en el dict de parámetros."""
+
+
+@functools.lru_cache(maxsize=STATEMENT_CACHE_SIZE)
+def _compile(sql: str):
+    """Traduce un SQL con @nombre a `(sql_posicional, nombres)` (memoizado por texto).
+
+    Los textos de `services/queries/*` son constantes, así que el escaneo y la
+    reescritura se hacen una sola vez por proceso y no en cada llamada.
+    """
+    declared = {n.lower() for n in _DECLARE_RE.findall(sql)}
+    names = []
+
+    def repl(m):
+        name = m.group(1)
+        if name.lower() in declared:
+            return m.group(0)
+        names.append(name)
+        return "%s"
+
+    # '%' literales (p. ej. LIKE 'a%') deben escaparse para pymssql
+    sql_exec = _PARAM_RE.sub(repl, sql.replace("%", "%%"))
+    if not names:
+        return sql, ()
+    return sql_exec, tuple(names)
+
+
+def statement_cache_info() -> dict:
+    """Aciertos/fallos del caché de sentencias compiladas."""
+    info = _compile.cache_info()
+    return {"hits": info.hits, "misses": info.misses, "size": info.currsize, "max_size": info.maxsize}
+
+
+def _to_positional(sql: str, params):
+    """Convierte parámetros @nombre a placeholders posicionales de pymssql.
+
+    Devuelve `(sql_exec, values)` listo para `cursor.execute`. Si `params` no es
+    un dict (tupla posicional) o el SQL no tiene placeholders, se devuelve tal cual.
+    Lanza `MissingParameterError` si falta algún parámetro en lugar de enviar NULL.
+    """
+    if not params or not isinstance(params, dict):
+        return sql, params
+    sql_exec, names = _compile(sql)
+    if not names:
+        return sql, params
+    missing = [n for n in dict.fromkeys(names) if n not in params]
+    if missing:
+        raise MissingParameterError(
+            "Faltan parámetros para la consulta: " + ", ".join(f"@{n}" for n in missing)
+        )
+    values = tuple(params[n] for n in names)
+    return sql_exec, values
+
+
+class _StaleConnection(Exception):
+    """La conexión prestada estaba muerta antes de que la sentencia se ejecutara."""
+
+
+def _execute(cursor, sql_exec: str, values=None):
+    """`cursor.execute` con parámetros ya convertidos; marca los sockets muertos."""
+    try:
+        if values:
+            cursor.execute(sql_exec, values)
+        else:
+            cursor.execute(sql_exec)
+    except Exception as e:
+        if _is_disconnect(e):
+            raise _StaleConnection(str(e)) from e
+        raise
+
+
+def _with_connection(work):
+    """Ejecuta `work(conn)` con una conexión del pool.
+
+    Si la conexión resulta estar muerta al ejecutar (la validación se omite
+    para conexiones usadas hace poco), se descarta y se reintenta una vez con
+    una conexión validada. Como el fallo ocurre antes del commit, el reintento
+    no duplica escrituras.
+    """
+    for attempt in (0, 1):
+        conn = borrow_connection(validate=attempt > 0)
         try:
-            conn.close()
+            result = work(conn)
+        except _StaleConnection as e:
+            discard_connection(conn)
+            if attempt:
+                raise e.__cause__ or e
+            _bump("retries")
+            continue
+        except Exception as e:
+            if _is_disconnect(e):
+                discard_connection(conn)
+                raise
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            return_connection(conn)
+            raise
+        return_connection(conn)
+        return result
+
+
+# Filas por `fetchmany` en el modo por bloques (listados completos y exportes).
+FETCH_CHUNK_ROWS = max(1, get_int_setting("DB_FETCH_CHUNK_ROWS", 5000))
+
+
+def _resolve_dtype_backend(dtype_backend: Optional[str]) -> Optional[str]:
+    """'arrow' usa pyarrow si está instalado (si no, tipos nullable de NumPy)."""
+    if dtype_backend in ("arrow", "pyarrow"):
+        try:
+            import pyarrow  # noqa: F401
+            return "pyarrow"
         except Exception:
-            pass
+            return "numpy_nullable"
+    return dtype_backend
+
+
+def _block_frame(chunk, ncols: int):
+    """Convierte un bloque de `fetchmany` en un DataFrame con columnas tipadas.
+
+    Claves posicionales: las consultas pueden repetir nombres de columna.
+    """
+    return pd.DataFrame.from_records(chunk, columns=range(ncols), nrows=len(chunk))
+
+
+def _finish_frame(blocks, columns, dtype_backend: Optional[str] = None):
+    if not blocks:
+        df = pd.DataFrame(columns=range(len(columns)))
+    elif len(blocks) == 1:
+        df = blocks[0]
+    else:
+        df = pd.concat(blocks, ignore_index=True)
+    df.columns = columns
+    backend = _resolve_dtype_backend(dtype_backend)
+    if backend:
+        df = df.convert_dtypes(dtype_backend=backend)
+    return df
+
+
+def _fetch_blocks(cursor, chunk_rows: int):
+    """Lee el result set con `fetchmany` y devuelve un DataFrame tipado por bloque.
+
+    Cada bloque de tuplas se convierte y se suelta antes de pedir el siguiente,
+    así que nunca se tiene a la vez la lista completa de filas y su copia.
+    """
+    ncols = len(cursor.description)
+    blocks = []
+    while True:
+        chunk = cursor.fetchmany(chunk_rows)
+        if not chunk:
+            return blocks
+        blocks.append(_block_frame(chunk, ncols))
+        del chunk
 
 
-def fetch_df(sql: str, params: dict | None = None):
+def fetch_df(sql: str, params: dict | None = None, chunk_rows: int | None = None,
+             dtype_backend: str | None = None):
     """Ejecuta una consulta SQL Server y devuelve un DataFrame.
 
     Usa conexiones del pool cuando sea posible para reducir latencia.
+    Con `chunk_rows` el resultado se lee con `fetchmany` en bloques de ese
+    tamaño, cada uno convertido a columnas tipadas al llegar (recomendado para
+    resultados de tabla completa). `dtype_backend` ('numpy_nullable' o
+    'arrow') convierte las columnas a tipos nullable.
     """
 
-    import re
+    sql_exec, values = _to_positional(sql, params) if params else (sql, None)
+
+    def work(conn):
+        cursor = conn.cursor()
+        try:
+            _execute(cursor, sql_exec, values)
+
+            if cursor.description:
+                columns = [c[0] for c in cursor.description]
+                if chunk_rows:
+                    df = _finish_frame(_fetch_blocks(cursor, chunk_rows), columns, dtype_backend)
+                else:
+                    rows = cursor.fetchall()
+                    df = pd.DataFrame(rows, columns=columns)
+                    backend = _resolve_dtype_backend(dtype_backend)
+                    if backend:
+                        df = df.convert_dtypes(dtype_backend=backend)
+
+                try:
+                    sql_start = sql.lstrip().split(None, 1)[0].lower()
+                except Exception:
+                    sql_start = ""
+                if sql_start not in ("select",):
+                    try:
+                        conn.commit()
+                    except Exception:
+                        pass
+                return df
+
+            conn.commit()
+            return pd.DataFrame()
+        finally:
+            try:
+                cursor.close()
+            except Exception:
+                pass
+
+    return _with_connection(work)
+
+
+def iter_df(sql: str, params: dict | None = None, chunk_rows: int | None = None,
+            dtype_backend: str | None = None):
+    """Generador de DataFrames de hasta `chunk_rows` filas para SELECT muy grandes.
+
+    Sólo hay en memoria un bloque a la vez. La conexión queda prestada mientras
+    se consume el generador: consumirlo completo o cerrarlo (`.close()`,
+    `contextlib.closing`) para que vuelva al pool. Si se abandona con filas sin
+    leer se descarta en lugar de devolverse, porque no es reutilizable.
+    """
+    chunk_rows = max(1, int(chunk_rows or FETCH_CHUNK_ROWS))
+    sql_exec, values = _to_positional(sql, params) if params else (sql, None)
 
     conn = None
     cursor = None
+    exhausted = False
     try:
-        conn = borrow_connection()
-        cursor = conn.cursor()
+        for attempt in (0, 1):
+            conn = borrow_connection(validate=attempt > 0)
+            cursor = conn.cursor()
+            try:
+                _execute(cursor, sql_exec, values)
+                break
+            except _StaleConnection as e:
+                # Aún no se ha entregado nada: se puede reintentar una vez
+                discard_connection(conn)
+                conn = cursor = None
+                if attempt:
+                    raise e.__cause__ or e
+                _bump("retries")
 
-        if params:
-            # Convert named @params to positional %s placeholders preserving order
-            if isinstance(params, dict):
-                names = re.findall(r"@([A-Za-z0-9_]+)", sql)
-                if names:
-                    values = tuple(params.get(n) for n in names)
-                    sql_exec = re.sub(r"@([A-Za-z0-9_]+)", "%s", sql)
-                    cursor.execute(sql_exec, values)
-                else:
-                    cursor.execute(sql, params)
+        if not cursor.description:
+            exhausted = True
+            return
+        columns = [c[0] for c in cursor.description]
+        while True:
+            chunk = cursor.fetchmany(chunk_rows)
+            if not chunk:
+                exhausted = True
+                return
+            block = _block_frame(chunk, len(columns))
+            del chunk
+            yield _finish_frame([block], columns, dtype_backend)
+    finally:
+        if cursor is not None:
+            try:
+                cursor.close()
+            except Exception:
+                pass
+        if conn is not None:
+            if exhausted:
+                return_connection(conn)
             else:
-                cursor.execute(sql, params)
+                discard_connection(conn)
+
+
+def execute_many(sql: str, params_seq) -> int:
+    """Ejecuta la misma sentencia DML para cada juego de parámetros.
+
+    Todas las filas se envían en un solo lote, con una sola conexión del pool y
+    un único commit: si alguna falla se hace rollback y no queda nada a medias.
+    Devuelve el número de juegos de parámetros ejecutados.
+    """
+    with transaction() as uow:
+        return uow.execute_many(sql, params_seq)
+
+
+def execute_batch(sql: str, params=None):
+    """Ejecuta un lote de varias sentencias en un solo viaje y una transacción.
+
+    Pensado para lotes generados (p. ej. INSERT de cabecera + detalle) que
+    terminan con un SELECT. Devuelve el primer result set como DataFrame
+    (vacío si el lote no produce filas). Ante cualquier error hace rollback.
+    """
+
+    sql_exec, values = _to_positional(sql, params) if params else (sql, None)
+
+    def work(conn):
+        cursor = conn.cursor()
+        try:
+            _execute(cursor, sql_exec, values)
+            df = pd.DataFrame()
+            if cursor.description:
+                columns = [c[0] for c in cursor.description]
+                df = pd.DataFrame(cursor.fetchall(), columns=columns)
+            conn.commit()
+            return df
+        finally:
+            try:
+                cursor.close()
+            except Exception:
+                pass
+
+    return _with_connection(work)
+
+
+def fetch_dfs(sql: str, params=None) -> list:
+    """Ejecuta un lote con varios SELECT en un solo viaje y devuelve un
+    DataFrame por cada result set, en orden.
+
+    Las sentencias que no devuelven filas (SET, SELECT INTO, DROP) no
+    aportan DataFrames.
+    """
+
+    sql_exec, values = _to_positional(sql, params) if params else (sql, None)
+
+    def work(conn):
+        cursor = conn.cursor()
+        try:
+            _execute(cursor, sql_exec, values)
+            dfs = []
+            while True:
+                if cursor.description:
+                    columns = [c[0] for c in cursor.description]
+                    dfs.append(pd.DataFrame(cursor.fetchall(), columns=columns))
+                if not cursor.nextset():
+                    break
+            conn.commit()
+            return dfs
+        finally:
+            try:
+                cursor.close()
+            except Exception:
+                pass
+
+    return _with_connection(work)
+
+
+# Consultas independientes en paralelo, cada una con su conexión del pool: la
+# latencia es la de la más lenta y no la suma. Los hilos nunca superan lo que
+# el pool puede prestar (DB_POOL_SIZE + DB_POOL_MAX_OVERFLOW).
+FANOUT_WORKERS = max(1, min(get_int_setting("DB_FANOUT_WORKERS", 4), POOL_MAX_SIZE + POOL_MAX_OVERFLOW))
+
+_FANOUT_EXECUTOR = None
+_FANOUT_LOCK = threading.Lock()
+_FANOUT_STATS = {"fanouts": 0, "queries": 0, "sum_ms": 0.0, "wall_ms": 0.0, "last": {}}
+
+
+def _fanout_executor():
+    global _FANOUT_EXECUTOR
+    if _FANOUT_EXECUTOR is None:
+        with _FANOUT_LOCK:
+            if _FANOUT_EXECUTOR is None:
+                from concurrent.futures import ThreadPoolExecutor
+                _FANOUT_EXECUTOR = ThreadPoolExecutor(max_workers=FANOUT_WORKERS, thread_name_prefix="db-fanout")
+    return _FANOUT_EXECUTOR
+
+
+def fetch_df_many(consultas: dict):
+    """Ejecuta consultas independientes en paralelo y devuelve todos los DataFrames.
+
+    `consultas` es `{nombre: sql}` o `{nombre: (sql, params)}`. Devuelve
+    `(dfs, tiempos_ms)`, ambos indexados por nombre. Espera a todas aunque
+    alguna falle y luego relanza el primer error. No llamar desde una consulta
+    que ya corre en este mismo fan-out (los hilos son compartidos).
+    """
+    if not consultas:
+        return {}, {}
+
+    def correr(item):
+        sql, params = item if isinstance(item, tuple) else (item, None)
+        inicio = time.perf_counter()
+        df = fetch_df(sql, params)
+        return df, (time.perf_counter() - inicio) * 1000.0
+
+    inicio = time.perf_counter()
+    if len(consultas) == 1:
+        nombre, item = next(iter(consultas.items()))
+        futuros = None
+        df, ms = correr(item)
+        resultados = {nombre: (df, ms)}
+    else:
+        executor = _fanout_executor()
+        futuros = {nombre: executor.submit(correr, item) for nombre, item in consultas.items()}
+        resultados, error = {}, None
+        for nombre, futuro in futuros.items():
+            try:
+                resultados[nombre] = futuro.result()
+            except Exception as e:
+                error = error or e
+        if error is not None:
+            raise error
+    wall_ms = (time.perf_counter() - inicio) * 1000.0
+
+    dfs = {n: r[0] for n, r in resultados.items()}
+    tiempos = {n: round(r[1], 1) for n, r in resultados.items()}
+    with _STATS_LOCK:
+        _FANOUT_STATS["fanouts"] += 1
+        _FANOUT_STATS["queries"] += len(tiempos)
+        _FANOUT_STATS["sum_ms"] += sum(tiempos.values())
+        _FANOUT_STATS["wall_ms"] += wall_ms
+        _FANOUT_STATS["last"] = dict(tiempos, total=round(wall_ms, 1))
+    return dfs, tiempos
+
+
+def fanout_stats() -> dict:
+    """Fan-outs ejecutados, suma de tiempos por consulta vs. tiempo real y los
+    tiempos del último (ms)."""
+    with _STATS_LOCK:
+        stats = dict(_FANOUT_STATS)
+        stats["last"] = dict(_FANOUT_STATS["last"])
+    stats["workers"] = FANOUT_WORKERS
+    return stats
+
+
+class UnitOfWork:
+    """Agrupa varias sentencias sobre una misma conexión y una transacción.
+
+    Las sentencias de escritura registradas con `execute` se acumulan y se
+    envían juntas en un solo lote (un viaje a la base) al hacer `flush`, antes
+    de cualquier lectura con `fetch_df` y al confirmar la transacción.
+    El primer lote de la unidad activa SET XACT_ABORT ON: cualquier error de
+    una sentencia aborta el lote y revierte la transacción completa, en vez
+    de seguir con las siguientes y confirmar un resultado parcial. Al terminar
+    se desactiva de nuevo, antes de devolver la conexión al pool.
+    No se instancia directamente: usar `with transaction() as uow:`.
+    """
+
+    def __init__(self, conn):
+        self._conn = conn
+        self._pending_sql = []
+        self._pending_values = []
+        self._pending_has_params = False
+        self._xact_abort = False
+
+    def _prefijo(self) -> str:
+        """SET XACT_ABORT ON para el primer envío (sin viaje extra)."""
+        if self._xact_abort:
+            return ""
+        self._xact_abort = True
+        return "SET XACT_ABORT ON;\n"
+
+    def execute(self, sql: str, params=None):
+        """Encola una sentencia DML (INSERT/UPDATE/DELETE) para el próximo lote."""
+        sql_exec, values = _to_positional(sql, params) if params else (sql, None)
+        if isinstance(values, dict):
+            # Sin @nombres en el SQL no hay dónde ponerlos: encolar el dict como
+            # un valor más desalinearía los parámetros del resto del lote.
+            raise ValueError(
+                "La sentencia no tiene parámetros @nombre pero se pasaron: "
+                + ", ".join(f"@{n}" for n in values)
+            )
+        if values:
+            self._pending_values.extend(values if isinstance(values, (tuple, list)) else [values])
+            self._pending_has_params = True
+            self._pending_sql.append((sql_exec, True))
         else:
-            cursor.execute(sql)
+            self._pending_sql.append((sql_exec, False))
 
-        if cursor.description:
-            columns = [c[0] for c in cursor.description]
-            rows = cursor.fetchall()
-            df = pd.DataFrame(rows, columns=columns)
+    def execute_many(self, sql: str, params_seq) -> int:
+        """Encola la misma sentencia una vez por cada juego de parámetros."""
+        count = 0
+        for p in params_seq or []:
+            self.execute(sql, p)
+            count += 1
+        return count
 
+    def flush(self):
+        """Envía las sentencias pendientes como un único lote (sin confirmar)."""
+        if not self._pending_sql:
+            return
+        parts = []
+        for sql_exec, has_params in self._pending_sql:
+            stmt = sql_exec.strip().rstrip(";")
+            # En un lote con parámetros pymssql interpreta '%': escapar los
+            # literales de las sentencias que no traen parámetros propios.
+            if self._pending_has_params and not has_params:
+                stmt = stmt.replace("%", "%%")
+            parts.append(stmt)
+        batch = self._prefijo() + ";\n".join(parts) + ";"
+        values = tuple(self._pending_values)
+        self._pending_sql = []
+        self._pending_values = []
+        self._pending_has_params = False
+
+        cursor = self._conn.cursor()
+        try:
+            if values:
+                cursor.execute(batch, values)
+            else:
+                cursor.execute(batch)
+        finally:
             try:
-                sql_start = sql.lstrip().split(None, 1)[0].lower()
+                cursor.close()
             except Exception:
-                sql_start = ""
-            if sql_start not in ("select",):
-                try:
-                    conn.commit()
-                except Exception:
-                    pass
-            return df
+                pass
 
-        conn.commit()
-        return pd.DataFrame()
+    def fetch_df(self, sql: str, params=None):
+        """Ejecuta una consulta dentro de la transacción y devuelve un DataFrame.
 
-    except Exception:
-        raise
+        Primero vacía las escrituras pendientes para que la lectura las vea.
+        """
+        self.flush()
+        cursor = self._conn.cursor()
+        try:
+            if params:
+                sql_exec, values = _to_positional(sql, params)
+                cursor.execute(self._prefijo() + sql_exec, values)
+            else:
+                cursor.execute(self._prefijo() + sql)
+            if cursor.description:
+                columns = [c[0] for c in cursor.description]
+                return pd.DataFrame(cursor.fetchall(), columns=columns)
+            return pd.DataFrame()
+        finally:
+            try:
+                cursor.close()
+            except Exception:
+                pass
 
-    finally:
+    def commit(self):
+        self.flush()
+        self._conn.commit()
+
+    def _restaurar_sesion(self):
+        """Deja XACT_ABORT como estaba antes de devolver la conexión al pool.
+
+        SET XACT_ABORT es de sesión, no de transacción: sin esto seguiría
+        activo para quien tome la conexión después (p. ej. `fetch_df`).
+        """
+        if not self._xact_abort:
+            return
+        cursor = self._conn.cursor()
         try:
-            if cursor is not None:
+            cursor.execute("SET XACT_ABORT OFF")
+        finally:
+            try:
                 cursor.close()
-        except Exception:
-            pass
+            except Exception:
+                pass
+        self._xact_abort = False
+
+    def rollback(self):
+        self._pending_sql = []
+        self._pending_values = []
+        self._pending_has_params = False
+        self._conn.rollback()
+
+
+@contextmanager
+def transaction():
+    """Context manager de unidad de trabajo sobre una conexión del pool.
+
+    Uso::
+
+        with transaction() as uow:
+            uow.execute(UPDATE_EVALUADOS_A_INDIVIDUALES, {"id_grupo": 1})
+            uow.execute(DELETE_GRUPO, {"id_grupo": 1})
+
+    Al salir sin errores se envía el lote pendiente y se hace un único commit;
+    si ocurre una excepción se hace rollback y se propaga. También ante
+    BaseException (st.stop/st.rerun, KeyboardInterrupt): la conexión nunca
+    vuelve al pool con una transacción abierta.
+    """
+    # Sin reintento posible a mitad de transacción: validar siempre al tomarla
+    conn = borrow_connection(validate=True)
+    uow = UnitOfWork(conn)
+    try:
+        yield uow
+        uow.commit()
+    except BaseException as e:
+        if isinstance(e, Exception) and _is_disconnect(e):
+            discard_connection(conn)
+            conn = None
+        else:
+            try:
+                uow.rollback()
+            except Exception:
+                pass
+        raise
+    finally:
+        if conn is not None:
+            try:
+                uow._restaurar_sesion()
+            except Exception:
+                # Sin poder restaurar la sesión no vuelve al pool
+                discard_connection(conn)
+                conn = None
         try:
             if conn is not None:
                 return_connection(conn)
@@ -0,0 +1,189 @@
+import datetime
+
+import pandas as pd
+import streamlit as st
+
+from services.db import fetch_dfs, fetch_df_many
+from services.listados import _where
+from services.queries.q_estadisticas import (
+    ESTADISTICAS_RESUMEN_SQL, ESTADISTICAS_KPIS_DIARIO_SQL,
+    ESTADISTICAS_POR_ANIO_DIARIO_SQL, ESTADISTICAS_POR_MES_DIARIO_SQL,
+)
+from services.resumen_diario import resumen_diario_disponible
+
+
+def clave_filtros(filtros: dict | None) -> tuple:
+    """Normaliza los filtros del tablero en una tupla hashable
+    (id_evaluado, sexo, id_grupo, fecha_inicio, fecha_fin); los vacíos quedan en None.
+    """
+    filtros = filtros or {}
+
+    def _entero(v):
+        try:
+            return int(v) if v is not None and str(v).strip() != "" else None
+        except (TypeError, ValueError):
+            return None
+
+    def _fecha(v):
+        if v is None or v == "":
+            return None
+        if isinstance(v, datetime.datetime):
+            return v.date()
+        if isinstance(v, datetime.date):
+            return v
+        try:
+            return pd.to_datetime(v).date()
+        except Exception:
+            return None
+
+    sexo = str(filtros.get("sexo")).strip() if filtros.get("sexo") else None
+    return (
+        _entero(filtros.get("id_evaluado")),
+        sexo or None,
+        _entero(filtros.get("id_grupo")),
+        _fecha(filtros.get("fecha_inicio")),
+        _fecha(filtros.get("fecha_fin")),
+    )
+
+
+def _predicados(clave: tuple) -> dict:
+    """Predicados de los filtros activos, por tabla, y sus parámetros.
+
+    Las fechas quedan como rangos semiabiertos sobre la columna (nunca
+    `YEAR(col) = ...`) para que SQL Server pueda buscar por índice.
+    """
+    id_evaluado, sexo, id_grupo, fecha_inicio, fecha_fin = clave
+    pred = {"evaluado": [], "resumen": [], "rango": [], "rango_resumen": [], "rango_p2": [], "params": {}}
+    params = pred["params"]
+    if id_evaluado is not None:
+        pred["evaluado"].append("e.id_evaluado = @id_evaluado")
+        params["id_evaluado"] = id_evaluado
+    if sexo is not None:
+        pred["evaluado"].append("e.sexo = @sexo")
+        pred["resumen"].append("r.sexo = @sexo")
+        params["sexo"] = sexo
+    if id_grupo is not None:
+        pred["evaluado"].append("e.id_grupo = @id_grupo")
+        pred["resumen"].append("r.id_grupo = @id_grupo")
+        params["id_grupo"] = id_grupo
+
+    desde, hasta = [], []
+    if fecha_inicio is not None:
+        desde.append("@fecha_inicio")
+        params["fecha_inicio"] = fecha_inicio
+    if fecha_fin is not None:
+        # Rango semiabierto: incluye todo el día 'hasta'
+        hasta.append("@fecha_fin_excl")
+        params["fecha_fin_excl"] = fecha_fin + datetime.timedelta(days=1)
+    for columna, destino in (("p.fecha", "rango"), ("r.dia", "rango_resumen"), ("p2.fecha", "rango_p2")):
+        pred[destino].extend(f"{columna} >= {v}" for v in desde)
+        pred[destino].extend(f"{columna} < {v}" for v in hasta)
+    return pred
+
+
+def _evaluado_en_rango(pred: dict, existe_en_rango: str) -> list:
+    """Filtros de Evaluado y, con fechas, sólo evaluados con pruebas en el rango o sin pruebas."""
+    conds = list(pred["evaluado"])
+    if pred["rango"]:
+        conds.append(
+            f"(EXISTS ({existe_en_rango})"
+            " OR NOT EXISTS (SELECT 1 FROM dbo.Prueba p2 WHERE p2.id_evaluado = e.id_evaluado))"
+        )
+    return conds
+
+
+def _resumen_sql(clave: tuple):
+    """SQL y parámetros del resumen (un lote) con sólo los predicados de los
+    filtros activos, leyendo Prueba."""
+    pred = _predicados(clave)
+    existe = "SELECT 1 FROM #kpi_pruebas k WHERE k.id_evaluado = e.id_evaluado AND k.en_rango = 1"
+    sql = (
+        ESTADISTICAS_RESUMEN_SQL
+        .replace("{where_evaluado_fechas}", _where(_evaluado_en_rango(pred, existe)))
+        .replace("{where_evaluado}", _where(pred["evaluado"]))
+        .replace("{en_rango}", " AND ".join(pred["rango"]) if pred["rango"] else "1 = 1")
+    )
+    return sql, pred["params"]
+
+
+def _resumen_diario_consultas(clave: tuple) -> dict:
+    """Las tres consultas independientes del resumen sobre EvaluacionDiaria,
+    `{nombre: (sql, params)}`, para ejecutarlas en paralelo."""
+    pred = _predicados(clave)
+    en_rango = " AND ".join(["p2.id_evaluado = e.id_evaluado"] + pred["rango_p2"])
+    reemplazos = {
+        "{where_resumen_rango}": _where(pred["resumen"] + pred["rango_resumen"]),
+        "{where_resumen}": _where(pred["resumen"]),
+        "{where_evaluado_fechas}": _where(_evaluado_en_rango(pred, f"SELECT 1 FROM dbo.Prueba p2 WHERE {en_rango}")),
+        "{where_evaluado}": _where(pred["evaluado"]),
+    }
+    consultas = {}
+    for nombre, plantilla in (("kpis", ESTADISTICAS_KPIS_DIARIO_SQL),
+                              ("por_anio", ESTADISTICAS_POR_ANIO_DIARIO_SQL),
+                              ("por_mes", ESTADISTICAS_POR_MES_DIARIO_SQL)):
+        sql = plantilla
+        for marca, valor in reemplazos.items():
+            sql = sql.replace(marca, valor)
+        consultas[nombre] = (sql, pred["params"] or None)
+    return consultas
+
+
+@st.cache_data(ttl=120, max_entries=64, show_spinner=False)
+def _resumen_cacheado(clave: tuple) -> dict:
+    tiempos_ms = {}
+    if clave[0] is None and resumen_diario_disponible():
+        # Sin filtro por evaluado: tres consultas al resumen diario en paralelo
+        dfs, tiempos_ms = fetch_df_many(_resumen_diario_consultas(clave))
+        kpis, por_anio, por_mes = dfs["kpis"], dfs["por_anio"], dfs["por_mes"]
+    else:
+        sql, params = _resumen_sql(clave)
+        dfs = fetch_dfs(sql, params or None)
+        while len(dfs) < 3:
+            dfs.append(pd.DataFrame())
+        kpis, por_anio, por_mes = dfs[:3]
+
+    fila = kpis.iloc[0] if not kpis.empty else {}
+    total = int(fila.get("total_evaluaciones", 0) or 0)
+    con_prueba = int(fila.get("evaluados_con_prueba", 0) or 0)
+    cantidad = int(fila.get("cantidad_evaluados", 0) or 0)
+    base_filtro = int(fila.get("evaluados_filtro", 0) or 0)
+    filtros_activos = any(v is not None for v in clave)
+    # Sin filtros el promedio es por evaluado con pruebas; con filtros, por
+    # evaluado que cumple los filtros (como las consultas por separado de antes).
+    divisor = base_filtro if filtros_activos else con_prueba
+    return {
+        "evaluaciones_totales": total,
+        "cantidad_evaluados": cantidad,
+        "promedio_evaluaciones": round(total / divisor, 2) if divisor else 0.0,
+        "por_anio": por_anio,
+        "por_mes": por_mes,
+        "tiempos_ms": tiempos_ms,
+    }
+
+
+def resumen_estadisticas(filtros: dict | None = None) -> dict:
+    """KPIs y series del tablero (una consulta, cacheada por filtros normalizados).
+
+    Sin filtro por evaluado las sumas y series salen del resumen diario
+    EvaluacionDiaria; con él, de Prueba (son pocas filas).
+
+    Devuelve `evaluaciones_totales`, `cantidad_evaluados`,
+    `promedio_evaluaciones`, `por_anio` (anio, cantidad) y `por_mes`
+    (anio, mes_num, cantidad) de todos los años, más `tiempos_ms` por
+    consulta cuando se usó el resumen diario.
+    """
+    return _resumen_cacheado(clave_filtros(filtros))
+
+
+def invalidar_estadisticas():
+    """Descarta los resúmenes cacheados (tras registrar o eliminar pruebas, o
+    cambiar evaluados o grupos)."""
+    try:
+        _resumen_cacheado.clear()
+    except Exception:
+        pass
+    try:
+        from services.analitica_indicadores import invalidar_analitica
+        invalidar_analitica()
+    except Exception:
+        pass
@@ -11,8 +11,8 @@ except Exception:
 import datetime
 import json
 import os
-import mimetypes
-from services.gcs import get_image_data_uri
+from services.gcs import get_image_local_path
+from services.image_server import imagen_src
 
 
 # Cached loader for indicador names used during export
@@ -203,25 +203,27 @@ def render_export_popover(info_evaluado=None, indicadores=None):
                 ruta = dem.get('ruta_imagen') or dem.get('ruta') or dem.get('image') or dem.get('imagen')
                 if ruta:
                     data_url = None
+                    local = None
                     try:
                         if isinstance(ruta, str) and ruta.strip().lower().startswith('gs://'):
-                            data_url = get_image_data_uri(ruta)
+                            local = get_image_local_path(ruta)
+                        elif os.path.exists(ruta):
+                            local = ruta
                     except Exception:
-                        data_url = None
+                        local = None
 
-                    if not data_url:
+                    if local:
+                        # Imagen original (calidad completa en el PDF). Con el
+                        # servidor de imágenes es una URL que el JS descarga al exportar.
                         try:
-                            if os.path.exists(ruta):
-                                with open(ruta, 'rb') as f:
-                                    b = f.read()
-                                b64 = base64.b64encode(b).decode('utf-8')
-                                mime = mimetypes.guess_type(ruta)[0] or 'image/jpeg'
-                                data_url = f"data:{mime};base64,{b64}"
+                            data_url = imagen_src(local)
                         except Exception:
                             data_url = None
 
-                    if data_url:
+                    if data_url and data_url.startswith('data:'):
                         prueba_info['demograficos']['image_base64'] = data_url
+                    elif data_url:
+                        prueba_info['demograficos']['image_url'] = data_url
             except Exception:
                 pass
 
@@ -248,6 +250,27 @@ def render_export_popover(info_evaluado=None, indicadores=None):
                 }});
             }}
 
+            // Convierte las imágenes servidas por URL a data URI (jsPDF necesita los bytes)
+            async function cargarImagenesRemotas(pruebas) {{
+                await Promise.all(pruebas.map(async (prueba) => {{
+                    const dem = prueba.demograficos || {{}};
+                    if (dem.image_base64 || !dem.image_url) return;
+                    try {{
+                        const resp = await fetch(dem.image_url);
+                        if (!resp.ok) return;
+                        const blob = await resp.blob();
+                        dem.image_base64 = await new Promise((resolve, reject) => {{
+                            const reader = new FileReader();
+                            reader.onload = () => resolve(reader.result);
+                            reader.onerror = reject;
+                            reader.readAsDataURL(blob);
+                        }});
+                    }} catch (e) {{
+                        console.error('Error cargando imagen', dem.image_url, e);
+                    }}
+                }}));
+            }}
+
             // Cargar librerías PDF
             Promise.all([
                 loadScript('https://cdnjs.cloudflare.com/ajax/libs/jspdf/2.5.1/jspdf.umd.min.js'),
@@ -579,7 +602,7 @@ def render_export_popover(info_evaluado=None, indicadores=None):
                     <span style="font-size: 16px; font-weight: 600;">Exportar PDF</span>
                 `;
                 
-                pdfBtn.onclick = function() {{
+                pdfBtn.onclick = async function() {{
                     try {{
                         const selectedColumns = Array.from(columnCheckboxes)
                             .filter(cb => cb.checked)
@@ -606,6 +629,8 @@ def render_export_popover(info_evaluado=None, indicadores=None):
                         const accentColor = [255, 228, 81];
                         const headerBg = [236, 240, 241];
                         
+                        await cargarImagenesRemotas(pruebasData);
+
                         // Procesar cada prueba
                         pruebasData.forEach((prueba, index) => {{
                             if (index > 0) {{
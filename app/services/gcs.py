@@ -4,73 +4,350 @@ import mimetypes
 import os
 import base64
 import json
+import hashlib
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from google.api_core import exceptions as gcs_exceptions
 from google.cloud import storage
 from google.oauth2 import service_account
 import re
 
-# Inicializar cliente GCS con credenciales de Streamlit secrets
+from config.settings import get_setting, get_int_setting
+
+try:
+    import fcntl
+except ImportError:  # Windows: el lock sólo coordina hilos del mismo proceso
+    fcntl = None
+
+# Cliente GCS único por proceso, compartido por services.gcs e indicadores.
+# Las credenciales de la cuenta de servicio guardan el token de acceso y el
+# transporte del cliente lo renueva antes de que venza, así que no hace falta
+# pedir uno nuevo por operación.
 _gcs_client = None
+_gcs_client_lock = threading.Lock()
 
-def get_gcs_client():
-    """Obtiene un cliente de GCS autenticado usando GCP_SA_KEY_JSON de secrets"""
-    global _gcs_client
-    
-    if _gcs_client is not None:
-        return _gcs_client
-    
+
+def _escape_private_key(match):
+    # Escapa saltos de línea reales dentro de private_key para que json.loads lo acepte
+    return match.group(1) + match.group(2).replace('\n', '\\n') + match.group(3)
+
+
+def _parse_sa_json(sa_json):
+    """dict de la cuenta de servicio a partir de un JSON (o dict) de secrets/entorno."""
+    if hasattr(sa_json, 'keys'):
+        sa_info = dict(sa_json)
+    else:
+        try:
+            sa_info = json.loads(sa_json)
+        except json.JSONDecodeError:
+            fixed = re.sub(r'("private_key"\s*:\s*")([\s\S]*?)(")', _escape_private_key, sa_json, flags=re.MULTILINE)
+            sa_info = json.loads(fixed)
+    pk = sa_info.get('private_key')
+    if isinstance(pk, str) and '\\n' in pk:
+        sa_info['private_key'] = pk.replace('\\n', '\n')
+    return sa_info
+
+
+def _service_account_info():
+    """(origen, info) de la primera cuenta de servicio disponible, o (None, None).
+
+    Orden: st.secrets['GCP_SA_KEY_JSON'], variable de entorno GCP_SA_KEY_JSON y
+    cualquier sección de secrets con forma de cuenta de servicio.
+    """
     try:
-        # Primero intentar desde Streamlit secrets
         if hasattr(st, 'secrets') and 'GCP_SA_KEY_JSON' in st.secrets:
-            sa_json = st.secrets['GCP_SA_KEY_JSON']
-            # Try to load JSON normally, but accept malformed multiline private_key
-            try:
-                sa_info = json.loads(sa_json)
-            except json.JSONDecodeError:
-                try:
-                    # Escape real newlines inside the private_key value so json.loads can parse it
-                    def _escape_private_key(match):
-                        prefix = match.group(1)
-                        key_body = match.group(2)
-                        suffix = match.group(3)
-                        return prefix + key_body.replace('\n', '\\n') + suffix
-
-                    fixed = re.sub(r'("private_key"\s*:\s*")([\s\S]*?)(")', _escape_private_key, sa_json, flags=re.MULTILINE)
-                    sa_info = json.loads(fixed)
-                except Exception:
-                    raise
-            credentials = service_account.Credentials.from_service_account_info(sa_info)
-            _gcs_client = storage.Client(credentials=credentials)
-            logging.info("GCS client initialized from st.secrets['GCP_SA_KEY_JSON']")
-            return _gcs_client
+            return "st.secrets['GCP_SA_KEY_JSON']", _parse_sa_json(st.secrets['GCP_SA_KEY_JSON'])
     except Exception as e:
         logging.warning(f"Failed to get GCS credentials from st.secrets: {e}")
-    
     try:
-        # Fallback: intentar desde variable de entorno
         env_json = os.environ.get('GCP_SA_KEY_JSON')
         if env_json:
+            return "GCP_SA_KEY_JSON environment variable", _parse_sa_json(env_json)
+    except Exception as e:
+        logging.warning(f"Failed to get GCS credentials from environment: {e}")
+    try:
+        for k, v in st.secrets.items():
+            if hasattr(v, 'get') and (v.get('type') == 'service_account' or 'private_key' in v):
+                return f"st.secrets['{k}']", _parse_sa_json(v)
+    except Exception:
+        pass
+    return None, None
+
+
+def _build_gcs_client():
+    origen, sa_info = _service_account_info()
+    if sa_info is not None:
+        credentials = service_account.Credentials.from_service_account_info(sa_info)
+        try:
+            # Un único refresh al crear el cliente: detecta claves inválidas
+            # pronto y deja el token cacheado para las primeras descargas.
+            from google.auth.transport.requests import Request
+            credentials.refresh(Request())
+        except Exception as e:
+            logging.warning(
+                "Service account credential refresh failed for private_key_id=%s: %s",
+                sa_info.get('private_key_id'), e,
+            )
+        client = storage.Client(credentials=credentials, project=sa_info.get('project_id'))
+        logging.info(f"GCS client initialized from {origen}")
+        return client
+    # Sin cuenta de servicio: credenciales por defecto del entorno (ADC)
+    client = storage.Client()
+    logging.info("GCS client initialized from application default credentials")
+    return client
+
+
+def get_gcs_client():
+    """Cliente de GCS autenticado, creado una sola vez por proceso (thread-safe).
+
+    Devuelve None si no hay credenciales utilizables.
+    """
+    global _gcs_client
+    if _gcs_client is not None:
+        return _gcs_client
+    with _gcs_client_lock:
+        if _gcs_client is None:
+            try:
+                _gcs_client = _build_gcs_client()
+            except Exception as e:
+                logging.error(f"No usable GCP credentials found: {e}")
+                return None
+    return _gcs_client
+
+
+# ==================== CACHE EN DISCO ====================
+# Cache compartido por todos los procesos del host:
+# - <sha256(contenido)><ext>   bytes del objeto (direccionado por contenido)
+# - <md5(uri)>.json            uri -> generation/etag/archivo de contenido
+# Escrituras atómicas (temporal + os.replace), presupuesto en bytes con
+# desalojo LRU por mtime y un lock de archivo para coordinar el desalojo.
+
+GCS_CACHE_DIR = str(get_setting('GCS_CACHE_DIR', '') or os.path.join(tempfile.gettempdir(), 'gcs_cache'))
+# Presupuesto de disco (bytes); al excederlo se desalojan los menos usados
+GCS_CACHE_MAX_BYTES = get_int_setting('GCS_CACHE_MAX_BYTES', 512 * 1024 * 1024)
+# Tras este tiempo una entrada se revalida con una descarga condicional por generation
+GCS_CACHE_REVALIDATE_S = get_int_setting('GCS_CACHE_REVALIDATE_S', 3600)
+# Descargas simultáneas al precargar las imágenes de un expediente
+GCS_PREFETCH_WORKERS = get_int_setting('GCS_PREFETCH_WORKERS', 8)
+
+_CACHE_STATS = {
+    "hits": 0,
+    "misses": 0,
+    "revalidated": 0,
+    "refreshed": 0,
+    "not_found": 0,
+    "errors": 0,
+    "evictions": 0,
+    "bytes_downloaded": 0,
+    "prefetched": 0,
+    "prefetch_ms_total": 0,
+    "prefetch_ms_max": 0,
+}
+_STATS_LOCK = threading.Lock()
+_PROCESS_LOCK = threading.RLock()
+
+
+def _bump(key: str, n: int = 1):
+    with _STATS_LOCK:
+        _CACHE_STATS[key] += n
+
+
+@contextmanager
+def _cache_lock():
+    """Lock exclusivo entre procesos (flock); sin fcntl sólo protege el proceso."""
+    os.makedirs(GCS_CACHE_DIR, exist_ok=True)
+    with _PROCESS_LOCK:
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(GCS_CACHE_DIR, '.lock'), 'a') as fh:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+def _parse_gcs_uri(gcs_uri: str):
+    """Normaliza `gs://bucket/path` y devuelve (uri, bucket, blob_path) o None."""
+    uri = str(gcs_uri).strip()
+    if uri.startswith('gs:/') and not uri.startswith('gs://'):
+        uri = 'gs://' + uri.split(':', 1)[1].lstrip('/')
+    parts = uri.replace('gs://', '', 1).split('/', 1)
+    if len(parts) != 2 or not parts[0] or not parts[1]:
+        return None
+    blob_path = parts[1]
+    while '//' in blob_path:
+        blob_path = blob_path.replace('//', '/')
+    return f"gs://{parts[0]}/{blob_path}", parts[0], blob_path
+
+
+def _meta_path(uri: str) -> str:
+    return os.path.join(GCS_CACHE_DIR, hashlib.md5(uri.encode()).hexdigest() + '.json')
+
+
+def _read_meta(uri: str):
+    try:
+        with open(_meta_path(uri), 'r', encoding='utf-8') as fh:
+            return json.load(fh)
+    except Exception:
+        return None
+
+
+def _atomic_write_json(path: str, data: dict):
+    fd, tmp = tempfile.mkstemp(dir=GCS_CACHE_DIR, prefix='.tmp-', suffix='.json')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as fh:
+            json.dump(data, fh)
+        os.replace(tmp, path)
+    except Exception:
+        _remove_quietly(tmp)
+        raise
+
+
+def _remove_quietly(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _sha256_file(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(1024 * 1024), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _touch(path: str):
+    """Marca la entrada como usada recientemente (el LRU ordena por mtime)."""
+    try:
+        os.utime(path, None)
+    except OSError:
+        pass
+
+
+def _claim(path: str) -> bool:
+    """Marca `path` como recién usado con el lock del cache tomado.
+
+    Un desalojo concurrente o ya lo borró (False: tratarlo como fallo de cache)
+    o lo verá como el más reciente y lo dejará para el final.
+    """
+    with _cache_lock():
+        if not os.path.exists(path):
+            return False
+        _touch(path)
+        return True
+
+
+def _store_download(uri: str, blob, tmp_path: str, ext: str) -> str:
+    """Mueve la descarga a su nombre por contenido y publica la metadata."""
+    digest = _sha256_file(tmp_path)
+    local_path = os.path.join(GCS_CACHE_DIR, f"{digest}{ext}")
+    size = os.path.getsize(tmp_path)
+    with _cache_lock():
+        if os.path.exists(local_path):
+            # Mismo contenido ya cacheado (otra URI u otro proceso)
+            _remove_quietly(tmp_path)
+            _touch(local_path)
+        else:
+            os.replace(tmp_path, local_path)
+    _atomic_write_json(_meta_path(uri), {
+        "uri": uri,
+        "file": os.path.basename(local_path),
+        "sha256": digest,
+        "size": size,
+        "generation": getattr(blob, 'generation', None),
+        "etag": getattr(blob, 'etag', None),
+        "validated": time.time(),
+    })
+    _bump("bytes_downloaded", size)
+    return local_path
+
+
+def evict_gcs_cache(max_bytes: int = None, keep=()) -> int:
+    """Desaloja archivos (menos usados primero) hasta quedar bajo el presupuesto.
+
+    Nunca borra las rutas de `keep` (p. ej. la que se acaba de descargar y
+    aún no se entregó). Devuelve el número de archivos eliminados.
+    """
+    keep = {os.path.abspath(k) for k in keep if k}
+    budget = GCS_CACHE_MAX_BYTES if max_bytes is None else int(max_bytes)
+    if not os.path.isdir(GCS_CACHE_DIR):
+        return 0
+    removed = 0
+    with _cache_lock():
+        entries, total = [], 0
+        for entry in os.scandir(GCS_CACHE_DIR):
+            if not entry.is_file() or entry.name.startswith('.') or entry.name.endswith('.json'):
+                continue
+            if os.path.abspath(entry.path) in keep:
+                continue
             try:
-                sa_info = json.loads(env_json)
-            except json.JSONDecodeError:
+                info = entry.stat()
+            except OSError:
+                continue
+            entries.append((info.st_mtime, info.st_size, entry.path))
+            total += info.st_size
+        if total <= budget:
+            return 0
+        # Bajar a ~90% del presupuesto para no desalojar en cada descarga
+        target = int(budget * 0.9)
+        evicted = set()
+        for _mtime, size, path in sorted(entries):
+            if total <= target:
+                break
+            _remove_quietly(path)
+            evicted.add(os.path.basename(path))
+            total -= size
+            removed += 1
+        # Metadata que apuntaba a contenido desalojado
+        for entry in os.scandir(GCS_CACHE_DIR):
+            if entry.name.endswith('.json') and not entry.name.startswith('.'):
                 try:
-                    fixed = re.sub(r'("private_key"\s*:\s*")([\s\S]*?)(")', lambda m: m.group(1) + m.group(2).replace('\n', '\\n') + m.group(3), env_json, flags=re.MULTILINE)
-                    sa_info = json.loads(fixed)
+                    with open(entry.path, 'r', encoding='utf-8') as fh:
+                        if json.load(fh).get('file') in evicted:
+                            _remove_quietly(entry.path)
                 except Exception:
-                    raise
-            credentials = service_account.Credentials.from_service_account_info(sa_info)
-            _gcs_client = storage.Client(credentials=credentials)
-            logging.info("GCS client initialized from GCP_SA_KEY_JSON environment variable")
-            return _gcs_client
-    except Exception as e:
-        logging.warning(f"Failed to get GCS credentials from environment: {e}")
-    
-    # Si todo falla, retornar None
-    logging.error("No GCP service account credentials found")
-    return None
+                    continue
+    if removed:
+        _bump("evictions", removed)
+        logging.info(f"GCS cache: evicted {removed} file(s)")
+    return removed
+
+
+def gcs_cache_stats() -> dict:
+    """Contadores del proceso y ocupación actual del cache en disco."""
+    with _STATS_LOCK:
+        stats = dict(_CACHE_STATS)
+    files, used = 0, 0
+    try:
+        for entry in os.scandir(GCS_CACHE_DIR):
+            if entry.is_file() and not entry.name.startswith('.') and not entry.name.endswith('.json'):
+                files += 1
+                used += entry.stat().st_size
+    except OSError:
+        pass
+    lookups = stats["hits"] + stats["revalidated"] + stats["misses"] + stats["refreshed"]
+    stats.update({
+        "files": files,
+        "bytes": used,
+        "max_bytes": GCS_CACHE_MAX_BYTES,
+        "hit_ratio": ((stats["hits"] + stats["revalidated"]) / lookups) if lookups else 0.0,
+    })
+    return stats
 
 
 def download_gcs_uri_to_tmp(gcs_uri: str) -> str:
-    """Descarga un archivo desde GCS a un archivo temporal y retorna la ruta local.
+    """Descarga un archivo desde GCS al cache en disco y retorna la ruta local.
+    
+    Un acierto reciente no toca la red; uno viejo se revalida con una descarga
+    condicional (`if_generation_not_match`), que no transfiere bytes si el
+    objeto no cambió. Un objeto inexistente se detecta en la propia descarga.
     
     Args:
         gcs_uri: URI en formato gs://bucket-name/path/to/file
@@ -78,69 +355,129 @@ def download_gcs_uri_to_tmp(gcs_uri: str) -> str:
     Returns:
         Ruta local del archivo descargado, o None si falla
     """
-    if not isinstance(gcs_uri, str) or not gcs_uri.startswith('gs://'):
+    if not isinstance(gcs_uri, str) or not gcs_uri.startswith('gs:/'):
         logging.error(f"Invalid GCS URI: {gcs_uri}")
         return None
-    
+
+    parsed = _parse_gcs_uri(gcs_uri)
+    if parsed is None:
+        logging.error(f"Invalid GCS URI format: {gcs_uri}")
+        return None
+    uri, bucket_name, blob_path = parsed
+    ext = os.path.splitext(blob_path)[1] or '.tmp'
+
+    try:
+        os.makedirs(GCS_CACHE_DIR, exist_ok=True)
+    except OSError as e:
+        logging.error(f"GCS cache dir unavailable: {e}")
+        return None
+
+    meta = _read_meta(uri)
+    cached_path = os.path.join(GCS_CACHE_DIR, meta["file"]) if meta and meta.get("file") else None
+    if cached_path and not os.path.exists(cached_path):
+        cached_path = None  # desalojado
+    if cached_path and time.time() - float(meta.get("validated") or 0) < GCS_CACHE_REVALIDATE_S:
+        if _claim(cached_path):
+            _bump("hits")
+            logging.debug(f"Using cached file: {cached_path}")
+            return cached_path
+        cached_path = None  # desalojado mientras tanto: se descarga de nuevo
+
     client = get_gcs_client()
     if client is None:
+        if cached_path and _claim(cached_path):
+            # Sin credenciales: servir la copia local aunque no se pueda revalidar
+            _bump("hits")
+            return cached_path
         logging.error("GCS client not available")
         return None
-    
+
+    blob = client.bucket(bucket_name).blob(blob_path)
+    fd, tmp_path = tempfile.mkstemp(dir=GCS_CACHE_DIR, prefix='.tmp-', suffix=ext)
+    os.close(fd)
     try:
-        # Normalizar URI
-        uri = str(gcs_uri).strip()
-        if uri.startswith('gs:/') and not uri.startswith('gs://'):
-            uri = 'gs://' + uri.split(':', 1)[1].lstrip('/')
-        
-        # Extraer bucket y blob path
-        parts = uri.replace('gs://', '').split('/', 1)
-        if len(parts) != 2:
-            logging.error(f"Invalid GCS URI format: {uri}")
-            return None
-        
-        bucket_name = parts[0]
-        blob_path = parts[1]
-        
-        # Limpiar path
-        while '//' in blob_path:
-            blob_path = blob_path.replace('//', '/')
-        
-        # Obtener el blob
-        bucket = client.bucket(bucket_name)
-        blob = bucket.blob(blob_path)
-        
-        # Verificar existencia
-        if not blob.exists():
-            logging.error(f"Blob does not exist: {uri}")
-            return None
-        
-        # Crear directorio temporal
-        import tempfile
-        import hashlib
-        
-        tmp_dir = os.path.join(tempfile.gettempdir(), 'gcs_cache')
-        os.makedirs(tmp_dir, exist_ok=True)
-        
-        # Generar nombre único
-        file_hash = hashlib.md5(uri.encode()).hexdigest()
-        ext = os.path.splitext(blob_path)[1] or '.tmp'
-        local_path = os.path.join(tmp_dir, f"{file_hash}{ext}")
-        
-        # Cache: si ya existe, retornarlo
-        if os.path.exists(local_path):
-            logging.debug(f"Using cached file: {local_path}")
-            return local_path
-        
-        # Descargar
-        blob.download_to_filename(local_path)
+        if cached_path and meta.get("generation"):
+            try:
+                blob.download_to_filename(tmp_path, if_generation_not_match=int(meta["generation"]))
+                _bump("refreshed")
+            except gcs_exceptions.NotModified:
+                if _claim(cached_path):
+                    _remove_quietly(tmp_path)
+                    meta["validated"] = time.time()
+                    _atomic_write_json(_meta_path(uri), meta)
+                    _bump("revalidated")
+                    return cached_path
+                # Desalojado durante la revalidación: descarga completa
+                blob.download_to_filename(tmp_path)
+                _bump("misses")
+        else:
+            blob.download_to_filename(tmp_path)
+            _bump("misses")
+        local_path = _store_download(uri, blob, tmp_path, ext)
         logging.info(f"Downloaded {uri} to {local_path}")
-        return local_path
-        
+    except gcs_exceptions.NotFound:
+        _remove_quietly(tmp_path)
+        _remove_quietly(_meta_path(uri))
+        _bump("not_found")
+        logging.error(f"Blob does not exist: {uri}")
+        return None
     except Exception as e:
+        _remove_quietly(tmp_path)
+        _bump("errors")
         logging.error(f"Failed to download {gcs_uri}: {e}")
         return None
 
+    if GCS_CACHE_MAX_BYTES > 0:
+        try:
+            evict_gcs_cache(keep=(local_path,))
+        except Exception as e:
+            logging.warning(f"GCS cache eviction failed: {e}")
+    return local_path
+
+
+def _fetch_timed(gcs_uri: str):
+    t0 = time.perf_counter()
+    try:
+        local = get_image_local_path(gcs_uri)
+    except Exception:
+        local = None
+    elapsed_ms = (time.perf_counter() - t0) * 1000.0
+    with _STATS_LOCK:
+        _CACHE_STATS["prefetched"] += 1
+        _CACHE_STATS["prefetch_ms_total"] += int(elapsed_ms)
+        _CACHE_STATS["prefetch_ms_max"] = max(_CACHE_STATS["prefetch_ms_max"], int(elapsed_ms))
+    return gcs_uri, local, elapsed_ms
+
+
+def iter_prefetch(gcs_uris, max_workers: int = None):
+    """Descarga varias URIs en paralelo y las devuelve en el orden recibido.
+
+    Produce `(uri, ruta_local | None, latencia_ms)` por cada elemento en cuanto
+    está listo el siguiente en orden, así el llamador puede ir procesando
+    mientras siguen las descargas. Los elementos que no son `gs://` (p. ej.
+    None o rutas locales) se devuelven tal cual con ruta None y latencia 0.
+    """
+    uris = list(gcs_uris)
+    pendientes = [u for u in uris if isinstance(u, str) and u.startswith('gs:/')]
+    if not pendientes:
+        for u in uris:
+            yield u, None, 0.0
+        return
+
+    # Inicializar el cliente en este hilo (lee st.secrets) antes de repartir el trabajo
+    get_gcs_client()
+    workers = max(1, min(int(max_workers or GCS_PREFETCH_WORKERS), len(pendientes)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='gcs-prefetch') as pool:
+        futures = [
+            pool.submit(_fetch_timed, u) if (isinstance(u, str) and u.startswith('gs:/')) else None
+            for u in uris
+        ]
+        for u, fut in zip(uris, futures):
+            if fut is None:
+                yield u, None, 0.0
+            else:
+                yield fut.result()
+
 
 def get_image_local_path(gcs_uri: str) -> str:
     """Download a gs:// URI to a temp file and return the local path.
@@ -178,13 +515,25 @@ def get_image_data_uri(gcs_uri: str) -> str:
     Downloads the blob to a temp file and converts it.
     Returns None on failure.
     """
-    local = get_image_local_path(gcs_uri)
-    if not local or not os.path.exists(local):
+    data = None
+    for _ in range(2):
+        local = get_image_local_path(gcs_uri)
+        if not local:
+            return None
+        try:
+            with open(local, 'rb') as f:
+                data = f.read()
+            break
+        except FileNotFoundError:
+            # Desalojado entre la descarga y la lectura: es un fallo de cache
+            continue
+        except OSError:
+            logging.exception('Failed to build data URI for %s', gcs_uri)
+            return None
+    if data is None:
         return None
     try:
         mime = mimetypes.guess_type(local)[0] or 'image/jpeg'
-        with open(local, 'rb') as f:
-            data = f.read()
         b64 = base64.b64encode(data).decode('ascii')
         return f"data:{mime};base64,{b64}"
     except Exception:
@@ -194,13 +543,14 @@ def get_image_data_uri(gcs_uri: str) -> str:
 
 def clear_gcs_cache():
     """Limpia el cache de archivos descargados de GCS"""
-    import tempfile
-    import shutil
-    
-    tmp_dir = os.path.join(tempfile.gettempdir(), 'gcs_cache')
-    if os.path.exists(tmp_dir):
-        try:
-            shutil.rmtree(tmp_dir)
-            logging.info("GCS cache cleared")
-        except Exception as e:
-            logging.error(f"Failed to clear GCS cache: {e}")
\ No newline at end of file
+    if not os.path.isdir(GCS_CACHE_DIR):
+        return
+    try:
+        with _cache_lock():
+            for entry in os.scandir(GCS_CACHE_DIR):
+                # Los '.tmp-*' son descargas en curso de otros procesos
+                if entry.is_file() and not entry.name.startswith('.'):
+                    _remove_quietly(entry.path)
+        logging.info("GCS cache cleared")
+    except Exception as e:
+        logging.error(f"Failed to clear GCS cache: {e}")
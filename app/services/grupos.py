@@ -2,10 +2,14 @@ import streamlit as st
 import pandas as pd
 import time
 from pathlib import Path
-from services.db import fetch_df
+from services.db import fetch_df, transaction
+from services.busqueda import mascara_busqueda
+from services.estadisticas import invalidar_estadisticas
+from services.resumen_diario import dias_de_grupos, actualizar_resumen_diario
 from services.queries.q_grupos import (
     GET_GRUPOS, CREATE_GRUPO, CREATE_SUBGRUPO, 
-    UPDATE_GRUPO, DELETE_SUBGRUPOS, DELETE_GRUPO, UPDATE_EVALUADOS_A_INDIVIDUALES
+    UPDATE_GRUPO, DELETE_SUBGRUPOS, DELETE_GRUPO, UPDATE_EVALUADOS_A_INDIVIDUALES,
+    GET_GRUPO_DUPLICADO
 )
 
 
@@ -19,6 +23,17 @@ def load_grupos_cache():
 def load_municipios_cache():
     return fetch_df('SELECT id_municipio, nombre FROM Municipio')
 
+def guardar_grupo(sql, params, nombre, id_grupo=None) -> bool:
+    """Verifica que el nombre no exista (excluyendo `id_grupo`) y ejecuta
+    `sql` en la misma transacción. Devuelve False si el nombre ya está en uso."""
+    with transaction() as uow:
+        dup = uow.fetch_df(GET_GRUPO_DUPLICADO, {"nombre": nombre, "id_grupo": id_grupo})
+        if dup is not None and not dup.empty:
+            return False
+        uow.execute(sql, params)
+    return True
+
+
 def grupos():
     # Cargar CSS
     _css_grupos = Path(__file__).parent.parent / 'assets' / 'grupos.css'
@@ -93,10 +108,8 @@ def grupos():
 
     # Aplicar búsqueda
     if buscar:
-        mask = df_display[['Nombre', 'Municipio', 'Dirección']].apply(
-            lambda row: row.astype(str).str.contains(buscar, case=False).any(), axis=1
-        )
-        df_display = df_display[mask]
+        mask = mascara_busqueda(st.session_state.grupos_df, buscar, ['Nombre', 'Municipio', 'Dirección'])
+        df_display = df_display[mask.loc[grupos_principales.index].to_numpy()]
     
     # ========== PAGINACIÓN (grupos) ==========
     ROWS_PER_PAGE = 9
@@ -216,17 +229,14 @@ def mostrar_dialogo_crear_grupo(municipios_list, municipios_dict):
                     nombre_clean = nombre.strip()
                 except Exception:
                     nombre_clean = nombre
-                dup = fetch_df("SELECT TOP 1 id_grupo FROM Grupo WHERE LOWER(nombre) = LOWER(@nombre)", {"nombre": nombre_clean})
-                if dup is not None and not dup.empty:
-                    st.error(f"Ya existe un grupo con el nombre '{nombre_clean}'. Elige otro nombre.")
-                    return
-
                 id_municipio = municipios_dict.get(municipio)
-                fetch_df(CREATE_GRUPO, {
+                if not guardar_grupo(CREATE_GRUPO, {
                     'id_municipio': id_municipio,
                     'nombre': nombre,
                     'direccion': direccion
-                })
+                }, nombre_clean):
+                    st.error(f"Ya existe un grupo con el nombre '{nombre_clean}'. Elige otro nombre.")
+                    return
                 label = f":material/check: Grupo '{nombre}'"
                 st.success(f"{label} creado exitosamente")
                 time.sleep(1)
@@ -264,22 +274,16 @@ def mostrar_dialogo_editar_grupo(grupo, municipios_list, municipios_dict):
                     current_id = int(grupo['ID'])
                 except Exception:
                     current_id = None
-                if current_id is not None:
-                    dup = fetch_df("SELECT TOP 1 id_grupo FROM Grupo WHERE LOWER(nombre) = LOWER(@nombre) AND id_grupo <> @id_grupo", {"nombre": nombre_clean, "id_grupo": current_id})
-                else:
-                    dup = fetch_df("SELECT TOP 1 id_grupo FROM Grupo WHERE LOWER(nombre) = LOWER(@nombre)", {"nombre": nombre_clean})
-                if dup is not None and not dup.empty:
-                    st.error(f"Ya existe otro grupo con el nombre '{nombre_clean}'. Elige otro nombre.")
-                    return
-
                 id_municipio = municipios_dict.get(municipio)
-                fetch_df(UPDATE_GRUPO, {
+                if not guardar_grupo(UPDATE_GRUPO, {
                     'nombre': nombre,
                     'direccion': direccion,
                     'id_municipio': id_municipio,
                     'parent_id': None,
                     'id_grupo': int(grupo['ID'])
-                })
+                }, nombre_clean, current_id):
+                    st.error(f"Ya existe otro grupo con el nombre '{nombre_clean}'. Elige otro nombre.")
+                    return
                 label = f":material/check: Grupo '{grupo['Nombre']}'"
                 st.success(f"{label} actualizado exitosamente")
                 time.sleep(1)
@@ -406,6 +410,19 @@ def eliminar_grupos_seleccionados(grupos_seleccionados):
     try:
         eliminados = []
 
+        # Todas las eliminaciones en una sola transacción (un lote, un commit)
+        with transaction() as uow:
+            ids_grupo = [int(i) for i in grupos_seleccionados['ID']]
+            # Una sola lectura antes de encolar: cada fetch_df vacía el lote
+            dias = dias_de_grupos(uow, ids_grupo)
+            for id_grupo in ids_grupo:
+                uow.execute(UPDATE_EVALUADOS_A_INDIVIDUALES, {'id_grupo': id_grupo})
+                uow.execute(DELETE_SUBGRUPOS, {'id_grupo': id_grupo})
+                uow.execute(DELETE_GRUPO, {'id_grupo': id_grupo})
+            # Sus evaluados pasan a "sin grupo" en el resumen diario
+            actualizar_resumen_diario(uow, dias)
+        invalidar_estadisticas()
+
         for idx, grupo in grupos_seleccionados.iterrows():
             id_grupo = int(grupo['ID'])
 
@@ -415,11 +432,6 @@ def eliminar_grupos_seleccionados(grupos_seleccionados):
             ]
             num_subgrupos = len(subgrupos)
 
-            # Eliminar en cascada
-            fetch_df(UPDATE_EVALUADOS_A_INDIVIDUALES, {'id_grupo': id_grupo})
-            fetch_df(DELETE_SUBGRUPOS, {'id_grupo': id_grupo})
-            fetch_df(DELETE_GRUPO, {'id_grupo': id_grupo})
-
             label = f":material/check: Grupo '{grupo['Nombre']}'"
             if num_subgrupos > 0:
                 eliminados.append(
@@ -593,18 +605,15 @@ def mostrar_dialogo_crear_subgrupo(id_grupo_padre, municipios_list, municipios_d
                     nombre_clean = nombre.strip()
                 except Exception:
                     nombre_clean = nombre
-                dup = fetch_df("SELECT TOP 1 id_grupo FROM Grupo WHERE LOWER(nombre) = LOWER(@nombre)", {"nombre": nombre_clean})
-                if dup is not None and not dup.empty:
-                    st.error(f"Ya existe un grupo/subgrupo con el nombre '{nombre_clean}'. Elige otro nombre.")
-                    return
-
                 id_municipio = municipios_dict.get(municipio)
-                fetch_df(CREATE_SUBGRUPO, {
+                if not guardar_grupo(CREATE_SUBGRUPO, {
                     'parent_id': id_grupo_padre,
                     'id_municipio': id_municipio,
                     'nombre': nombre,
                     'direccion': direccion
-                })
+                }, nombre_clean):
+                    st.error(f"Ya existe un grupo/subgrupo con el nombre '{nombre_clean}'. Elige otro nombre.")
+                    return
                 st.success(f"Subgrupo '{nombre}' creado exitosamente")
                 time.sleep(1)
                 try:
@@ -642,22 +651,16 @@ def mostrar_dialogo_editar_subgrupo(subgrupo, id_grupo_padre, municipios_list, m
                     current_id = int(subgrupo['ID'])
                 except Exception:
                     current_id = None
-                if current_id is not None:
-                    dup = fetch_df("SELECT TOP 1 id_grupo FROM Grupo WHERE LOWER(nombre) = LOWER(@nombre) AND id_grupo <> @id_grupo", {"nombre": nombre_clean, "id_grupo": current_id})
-                else:
-                    dup = fetch_df("SELECT TOP 1 id_grupo FROM Grupo WHERE LOWER(nombre) = LOWER(@nombre)", {"nombre": nombre_clean})
-                if dup is not None and not dup.empty:
-                    st.error(f"Ya existe otro grupo/subgrupo con el nombre '{nombre_clean}'. Elige otro nombre.")
-                    return
-
                 id_municipio = municipios_dict.get(municipio)
-                fetch_df(UPDATE_GRUPO, {
+                if not guardar_grupo(UPDATE_GRUPO, {
                     'nombre': nombre,
                     'direccion': direccion,
                     'id_municipio': id_municipio,
                     'parent_id': id_grupo_padre,
                     'id_grupo': int(subgrupo['ID'])
-                })
+                }, nombre_clean, current_id):
+                    st.error(f"Ya existe otro grupo/subgrupo con el nombre '{nombre_clean}'. Elige otro nombre.")
+                    return
                 label = f":material/check: Subgrupo '{nombre}'"
                 st.success(f"{label} actualizado exitosamente")
                 time.sleep(1)
@@ -676,13 +679,17 @@ def eliminar_subgrupos_seleccionados(subgrupos_seleccionados):
     try:
         eliminados = []
 
-        for idx, subgrupo in subgrupos_seleccionados.iterrows():
-            id_subgrupo = int(subgrupo['ID'])
-
-            # Eliminar subgrupo
-            fetch_df(UPDATE_EVALUADOS_A_INDIVIDUALES, {'id_grupo': id_subgrupo})
-            fetch_df(DELETE_GRUPO, {'id_grupo': id_subgrupo})
+        with transaction() as uow:
+            ids_subgrupo = [int(i) for i in subgrupos_seleccionados['ID']]
+            dias = dias_de_grupos(uow, ids_subgrupo)
+            for id_subgrupo in ids_subgrupo:
+                # Eliminar subgrupo
+                uow.execute(UPDATE_EVALUADOS_A_INDIVIDUALES, {'id_grupo': id_subgrupo})
+                uow.execute(DELETE_GRUPO, {'id_grupo': id_subgrupo})
+            actualizar_resumen_diario(uow, dias)
+        invalidar_estadisticas()
 
+        for idx, subgrupo in subgrupos_seleccionados.iterrows():
             eliminados.append(f":material/check: Subgrupo '{subgrupo['Nombre']}' eliminado. Evaluados ahora son individuales.")
 
         try:
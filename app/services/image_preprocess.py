@@ -2,15 +2,39 @@ from PIL import Image
 from pathlib import Path
 from config.settings import ORIGINALS_DIR
 
-def estandarizar_imagen(image: Image.Image, output_path) -> Path:
+try:
+    # HEIC/HEIF (fotos de iPhone) si está instalado pillow-heif
+    from pillow_heif import register_heif_opener
+    register_heif_opener()
+except Exception:
+    pass
+
+def estandarizar_imagen(image: Image.Image, output_path, lado_max: int = None, calidad: int = None) -> Path:
     """
     Guarda la imagen tal cual (sin forzar redimensionamiento a 512x512).
     Mantener la imagen original permite que las coordenadas de bounding
     boxes sigan siendo válidas.
+
+    Con `lado_max` se reduce (manteniendo la proporción) para que el lado
+    mayor no lo supere; con `calidad` se guarda como JPEG con esa calidad.
     """
     salida = Path(output_path)
     salida.parent.mkdir(parents=True, exist_ok=True)
 
+    if lado_max and max(image.size) > lado_max:
+        image = image.copy()
+        image.thumbnail((lado_max, lado_max), Image.LANCZOS)
+
+    if calidad:
+        exif = image.info.get('exif')
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        opciones = {'format': 'JPEG', 'quality': calidad, 'optimize': True}
+        if exif:
+            opciones['exif'] = exif
+        image.save(salida, **opciones)
+        return salida
+
     # Guardar la imagen sin cambiar su tamaño ni su proporción
     try:
         image.save(salida)
@@ -22,3 +46,57 @@ def estandarizar_imagen(image: Image.Image, output_path) -> Path:
             raise
 
     return salida
+
+
+def preparar_para_modelo(origen, destino, lado_max: int, calidad: int = 90) -> dict:
+    """
+    Copia de `origen` para enviar al modelo: JPEG (también desde HEIC) con el
+    lado mayor reducido a `lado_max`.
+
+    La orientación EXIF se conserva como etiqueta y no se aplica a los
+    píxeles: las cajas, el tamaño guardado en PruebaImagen y el visor trabajan
+    en píxeles de la imagen tal cual. Devuelve `{'ruta', 'escala_x',
+    'escala_y'}`, donde la escala es tamaño enviado / tamaño original; si la
+    imagen ya es JPEG/PNG y cabe, se usa el archivo original sin recodificar.
+    """
+    with Image.open(origen) as im:
+        ancho, alto = im.size
+        if max(ancho, alto) <= lado_max and im.format in ('JPEG', 'PNG'):
+            return {'ruta': str(origen), 'escala_x': 1.0, 'escala_y': 1.0}
+        im.load()
+        salida = estandarizar_imagen(im, destino, lado_max=lado_max, calidad=calidad)
+    with Image.open(salida) as enviada:
+        nuevo_ancho, nuevo_alto = enviada.size
+    return {
+        'ruta': str(salida),
+        'escala_x': nuevo_ancho / ancho,
+        'escala_y': nuevo_alto / alto,
+    }
+
+
+def preparar_para_archivo(origen, destino, calidad: int = 90) -> str:
+    """
+    Copia a tamaño completo que se archiva en GCS (Prueba.ruta_imagen) cuando
+    al modelo se le envió una copia reducida. JPEG/PNG se archivan tal cual;
+    otros formatos (HEIC) se recodifican a JPEG sin cambiar las dimensiones
+    para que el navegador pueda mostrarlos. Devuelve la ruta a subir.
+    """
+    with Image.open(origen) as im:
+        if im.format in ('JPEG', 'PNG'):
+            return str(origen)
+        im.load()
+        return str(estandarizar_imagen(im, destino, calidad=calidad))
+
+
+def escalar_caja(bbox, escala_x: float, escala_y: float) -> tuple:
+    """
+    Lleva una caja (x_min, y_min, x_max, y_max) de la copia enviada al modelo
+    a píxeles de la imagen original (`escala` = tamaño enviado / original).
+    Las coordenadas que falten quedan en 0.
+    """
+    escala_x, escala_y = (float(escala_x) or 1.0), (float(escala_y) or 1.0)
+    bbox = list(bbox or [])
+    caja = []
+    for i, escala in enumerate((escala_x, escala_y, escala_x, escala_y)):
+        caja.append(int(round(float(bbox[i]) / escala)) if len(bbox) > i else 0)
+    return tuple(caja)
@@ -0,0 +1,209 @@
+import base64
+import logging
+import mimetypes
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from config.settings import get_setting, get_int_setting, get_bool_setting
+from services.miniaturas import hash_contenido, miniatura_path, miniatura_data_uri
+
+# Servidor HTTP local para que los componentes referencien imágenes por URL
+# en lugar de incrustarlas en base64. Sólo sirve archivos registrados con
+# `url_imagen` (no expone el sistema de archivos) y las URLs dependen del
+# contenido (160 bits del SHA-256, no adivinables), así que el navegador
+# puede cachearlas sin revalidar. Son dibujos de pacientes: la caché es
+# `private` (nunca en proxies compartidos) y CORS sólo admite el origen de
+# la app.
+# Desactivado por defecto. Requiere IMAGE_SERVER_PUBLIC_URL: la URL con la
+# que el navegador llega al puerto (normalmente un proxy HTTPS en el mismo
+# dominio que la app); sin ella no se activa y se usan data URIs.
+IMAGE_SERVER_ENABLED = get_bool_setting("IMAGE_SERVER_ENABLED", False)
+IMAGE_SERVER_BIND = str(get_setting("IMAGE_SERVER_BIND", "127.0.0.1"))
+IMAGE_SERVER_PORT = get_int_setting("IMAGE_SERVER_PORT", 8599)
+IMAGE_SERVER_PUBLIC_URL = str(get_setting("IMAGE_SERVER_PUBLIC_URL", "") or "").rstrip("/")
+IMAGE_SERVER_MAX_AGE = get_int_setting("IMAGE_SERVER_MAX_AGE", 7 * 24 * 3600)
+# Orígenes de la app (coma-separados) a los que se permite leer las imágenes
+# con fetch (export a PDF). Vacío: el origen de IMAGE_SERVER_PUBLIC_URL.
+IMAGE_SERVER_ALLOWED_ORIGINS = str(get_setting("IMAGE_SERVER_ALLOWED_ORIGINS", "") or "")
+
+# token -> (ruta original, tamaño o None), en orden LRU: se desaloja la menos
+# usada en vez de vaciar todo (las páginas ya abiertas siguen funcionando).
+_RUTAS = OrderedDict()
+_RUTAS_MAX = get_int_setting("IMAGE_SERVER_MAX_ROUTES", 20000)
+_LOCK = threading.Lock()
+
+
+def _origen(url: str) -> str:
+    """'https://host:puerto' de una URL ('' si no tiene esquema y host)."""
+    partes = url.split("/")
+    if len(partes) < 3 or not partes[0].endswith(":") or not partes[2]:
+        return ""
+    return f"{partes[0]}//{partes[2]}".lower()
+
+
+def _origenes_permitidos() -> set:
+    configurados = {o.strip().rstrip("/").lower() for o in IMAGE_SERVER_ALLOWED_ORIGINS.split(",") if o.strip()}
+    return configurados or {o for o in (_origen(IMAGE_SERVER_PUBLIC_URL),) if o}
+
+
+_ORIGENES = _origenes_permitidos()
+_SERVER = None
+_FAILED = False
+
+
+class _ImageHandler(BaseHTTPRequestHandler):
+    server_version = "pbll-img/1.0"
+
+    def _resolver(self):
+        partes = self.path.split("?", 1)[0].strip("/").split("/")
+        if len(partes) != 2 or partes[0] != "img":
+            return None, None
+        token = partes[1]
+        with _LOCK:
+            ruta = _RUTAS.get(token)
+            if ruta is not None:
+                _RUTAS.move_to_end(token)
+        if ruta is None:
+            return token, None
+        original, tamano = ruta
+        try:
+            # La copia reducida pudo desalojarse del cache: se regenera
+            path = miniatura_path(original, tamano) if tamano else original
+        except Exception:
+            return token, None
+        if not os.path.isfile(path):
+            return token, None
+        return token, path
+
+    def _cabeceras(self, etag):
+        self.send_header("ETag", etag)
+        self.send_header("Cache-Control", f"private, max-age={IMAGE_SERVER_MAX_AGE}, immutable")
+        # El export a PDF descarga las imágenes con fetch desde la página de
+        # Streamlit: sólo se permite a los orígenes de la app
+        origen = (self.headers.get("Origin") or "").rstrip("/").lower()
+        if origen and origen in _ORIGENES:
+            self.send_header("Access-Control-Allow-Origin", origen)
+        self.send_header("Vary", "Origin")
+
+    def _servir(self, con_cuerpo: bool):
+        token, path = self._resolver()
+        if path is None:
+            self.send_error(404)
+            return
+        etag = f'"{os.path.splitext(token)[0]}"'
+        if etag in (self.headers.get("If-None-Match") or ""):
+            self.send_response(304)
+            self._cabeceras(etag)
+            self.end_headers()
+            return
+        try:
+            size = os.path.getsize(path)
+            fh = open(path, "rb")
+        except OSError:
+            self.send_error(404)
+            return
+        with fh:
+            self.send_response(200)
+            self._cabeceras(etag)
+            self.send_header("Content-Type", mimetypes.guess_type(path)[0] or "application/octet-stream")
+            self.send_header("Content-Length", str(size))
+            self.end_headers()
+            if con_cuerpo:
+                # Copia en bloques: la imagen no se carga entera en memoria
+                shutil.copyfileobj(fh, self.wfile, 64 * 1024)
+
+    def do_GET(self):
+        self._servir(True)
+
+    def do_HEAD(self):
+        self._servir(False)
+
+    def log_message(self, format, *args):
+        logging.debug("image_server: " + format, *args)
+
+
+def _asegurar_servidor() -> bool:
+    """Arranca el servidor una vez por proceso; False si está desactivado o falló."""
+    global _SERVER, _FAILED
+    if not IMAGE_SERVER_ENABLED or _FAILED:
+        return False
+    if not IMAGE_SERVER_PUBLIC_URL:
+        _FAILED = True
+        logging.warning("image_server: IMAGE_SERVER_ENABLED sin IMAGE_SERVER_PUBLIC_URL; se usan data URIs")
+        return False
+    if _SERVER is not None:
+        return True
+    with _LOCK:
+        if _SERVER is not None:
+            return True
+        try:
+            server = ThreadingHTTPServer((IMAGE_SERVER_BIND, IMAGE_SERVER_PORT), _ImageHandler)
+        except OSError as e:
+            _FAILED = True
+            logging.warning(f"image_server: no se pudo abrir {IMAGE_SERVER_BIND}:{IMAGE_SERVER_PORT}: {e}")
+            return False
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="image-server", daemon=True).start()
+        _SERVER = server
+        logging.info(f"image_server: sirviendo en {IMAGE_SERVER_BIND}:{IMAGE_SERVER_PORT}")
+    return True
+
+
+def servidor_activo() -> bool:
+    """True si las imágenes se pueden referenciar por URL en este proceso."""
+    return _asegurar_servidor()
+
+
+def url_imagen(path, original=None, tamano: str | None = None) -> str | None:
+    """URL corta (por hash de contenido) para `path`; None si no hay servidor.
+
+    Si `path` es la copia `tamano` de `original`, se registra el original para
+    poder regenerar la copia si se desaloja del cache. Los llamadores deben
+    recurrir a un data URI cuando devuelve None.
+    """
+    if not path or not _asegurar_servidor():
+        return None
+    try:
+        path = os.path.abspath(str(path))
+        token = hash_contenido(path)[:40] + (os.path.splitext(path)[1].lower() or ".bin")
+    except OSError:
+        return None
+    ruta = (os.path.abspath(str(original)), tamano) if original and tamano else (path, None)
+    with _LOCK:
+        _RUTAS[token] = ruta
+        _RUTAS.move_to_end(token)
+        while len(_RUTAS) > _RUTAS_MAX:
+            _RUTAS.popitem(last=False)
+    return f"{IMAGE_SERVER_PUBLIC_URL}/img/{token}"
+
+
+def imagen_src(path, tamano: str | None = None) -> str | None:
+    """`src` para una imagen local: URL del servidor si está activo, si no data URI.
+
+    Con `tamano` ('thumb', 'viewer', 'zoom') se usa la copia reducida cacheada.
+    """
+    if not path:
+        return None
+    reducida = bool(tamano)
+    try:
+        servido = miniatura_path(str(path), tamano) if tamano else str(path)
+    except Exception as e:
+        logging.warning(f"image_server: sin copia {tamano} de {path}: {e}")
+        servido, reducida = str(path), False
+    # miniatura_path devuelve el original si ya cabe en el tamaño pedido
+    reducida = reducida and os.path.abspath(servido) != os.path.abspath(str(path))
+    url = url_imagen(servido, path, tamano) if reducida else url_imagen(servido)
+    if url:
+        return url
+    if tamano:
+        return miniatura_data_uri(str(path), tamano)
+    try:
+        with open(servido, "rb") as fh:
+            data = fh.read()
+        mime = mimetypes.guess_type(servido)[0] or "image/jpeg"
+        return f"data:{mime};base64,{base64.b64encode(data).decode('ascii')}"
+    except OSError:
+        return None
@@ -1,9 +1,12 @@
 from services.queries.q_model import GET_INDICADORES, GET_INDICADORES_POR_IDS
 from services.db import fetch_df
+from config.settings import get_setting, get_float_setting, get_int_setting
+from services.image_preprocess import escalar_caja
 
-import json
+import io
 import os
 import tempfile
+import threading
 import logging
 from datetime import datetime
 from typing import List, Dict, Optional
@@ -11,17 +14,39 @@ from typing import List, Dict, Optional
 # external libs
 try:
     from google.cloud import storage
+    from services.gcs import get_gcs_client
 except Exception:
     storage = None
 
 try:
     import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
 except Exception:
     requests = None
 
+try:
+    from PIL import Image
+except Exception:
+    Image = None
+
 import streamlit as st
-import threading
-import time
+
+INFERENCE_ENDPOINT = str(get_setting("INFERENCE_ENDPOINT", "") or "https://pef-model-326047181104.us-central1.run.app/predict")
+# Timeouts (s) de conexión y de respuesta del modelo
+INFERENCE_CONNECT_TIMEOUT_S = get_float_setting("INFERENCE_CONNECT_TIMEOUT_S", 10.0)
+INFERENCE_READ_TIMEOUT_S = get_float_setting("INFERENCE_READ_TIMEOUT_S", 120.0)
+# Conexiones keep-alive que se mantienen abiertas hacia el endpoint
+INFERENCE_POOL_SIZE = get_int_setting("INFERENCE_POOL_SIZE", 4)
+# Reintentos del adaptador HTTP sólo para fallos al conectar (la petición no
+# llegó al modelo); los 5xx/429 y timeouts los reintenta la cola de inferencia.
+INFERENCE_CONNECT_RETRIES = get_int_setting("INFERENCE_CONNECT_RETRIES", 3)
+# Imágenes más pesadas se recodifican a JPEG (mismas dimensiones) antes de subirlas
+INFERENCE_MAX_UPLOAD_BYTES = get_int_setting("INFERENCE_MAX_UPLOAD_BYTES", 3 * 1024 * 1024)
+INFERENCE_UPLOAD_QUALITY = get_int_setting("INFERENCE_UPLOAD_QUALITY", 90)
+
+_SESSION = None
+_SESSION_LOCK = threading.Lock()
 
 
 # Cached loader for indicadores by ids_csv
@@ -30,103 +55,51 @@ def load_indicadores_por_ids(ids_csv: str):
     return fetch_df(GET_INDICADORES_POR_IDS, {"ids_csv": ids_csv})
 
 
-def _get_storage_client_from_secrets() -> 'storage.Client':
-    """Create a google.storage client from service-account JSON placed in:
-    - env `GCP_SA_KEY_JSON` (string JSON), or
-    - `st.secrets['GCP_SA_KEY_JSON']`, or
-    - any secret dict that looks like a service account.
-
-    Raises RuntimeError when no usable credentials found.
-    """
+def _cliente_gcs() -> 'storage.Client':
+    """Shared GCS client from services.gcs (credentials and token cached per process)."""
     if storage is None:
         raise RuntimeError("google-cloud-storage package not available")
+    client = get_gcs_client()
+    if client is None:
+        raise RuntimeError("No usable GCS credentials available")
+    return client
 
-    sa_json = os.environ.get('GCP_SA_KEY_JSON')
-    if not sa_json:
-        try:
-            if isinstance(st.secrets, dict) and 'GCP_SA_KEY_JSON' in st.secrets:
-                sa_json = st.secrets.get('GCP_SA_KEY_JSON')
-            else:
-                for k, v in st.secrets.items():
-                    if isinstance(v, dict) and (v.get('type') == 'service_account' or 'private_key' in v):
-                        sa_json = json.dumps(v)
-                        break
-        except Exception:
-            sa_json = None
 
-    parsed = None
-    if sa_json:
-        try:
-            if isinstance(sa_json, str):
-                parsed = json.loads(sa_json)
-            elif isinstance(sa_json, dict):
-                parsed = sa_json
-        except Exception:
-            try:
-                repaired = sa_json.replace('\\n', '\n')
-                parsed = json.loads(repaired)
-            except Exception:
-                parsed = None
-
-    if parsed is None:
-        raise RuntimeError("No GCP service account JSON found in 'GCP_SA_KEY_JSON' (env) or Streamlit secrets")
+def _descargar_blob(blob, destino: Optional[str] = None) -> str:
+    """Download `blob` into `destino` or, if None, a uniquely named temp file.
 
+    The bytes go to a private spool file first and are moved into place with
+    os.replace, so concurrent requests never read or overwrite each other's files.
+    """
+    ext = os.path.splitext(blob.name or '')[1]
+    directorio = os.path.dirname(destino) if destino else tempfile.gettempdir()
+    fd, spool = tempfile.mkstemp(dir=directorio or None, prefix='pef-', suffix=ext)
+    os.close(fd)
     try:
-        # Normalize private_key newlines if they were escaped (common when storing JSON in env/secrets)
-        try:
-            pk = parsed.get('private_key')
-            if isinstance(pk, str) and "\\n" in pk:
-                parsed = dict(parsed)
-                parsed['private_key'] = pk.replace('\\n', '\n')
-        except Exception:
-            # if normalization fails, continue and let from_service_account_info raise
-            pass
-
-        from google.oauth2 import service_account
-        creds = service_account.Credentials.from_service_account_info(parsed)
-
-        # Quick proactive refresh test to surface signature/invalid-key errors early.
+        blob.download_to_filename(spool)
+        if destino is None:
+            return spool
+        os.replace(spool, destino)
+        return destino
+    except Exception:
         try:
-            from google.auth.transport.requests import Request
-            try:
-                creds.refresh(Request())
-            except Exception as e:
-                # Log a non-verbose warning with the key id (do NOT log private_key)
-                logging.warning(
-                    "Service account credential refresh failed for private_key_id=%s: %s",
-                    parsed.get('private_key_id'), str(e)
-                )
-                # continue and allow client creation to proceed; failures will be
-                # handled by the caller or by the storage client creation below.
-        except Exception:
-            # If the transport package isn't available or refresh fails, we still proceed
-            # to create the storage client and let the caller observe runtime errors.
+            os.remove(spool)
+        except OSError:
             pass
-
-        client = storage.Client(credentials=creds, project=parsed.get('project_id'))
-        return client
-    except Exception as e:
-        # Warn but do not print a full traceback here; caller can handle failures.
-        logging.warning("Failed to create storage.Client from provided service account: %s", str(e))
         raise
 
 
-def find_and_download_latest_for_id(id_evaluado: int, bucket_name: str = 'bucket-pbll') -> str:
-    """List objects under `pruebas/{id_evaluado}/` and download the most recently-updated blob to /tmp.
+def find_and_download_latest_for_id(id_evaluado: int, bucket_name: str = 'bucket-pbll',
+                                    destino: Optional[str] = None) -> str:
+    """List objects under `pruebas/{id_evaluado}/` and download the most recently-updated blob.
 
-    Returns the local file path. Raises FileNotFoundError if no blobs found.
+    Saves to `destino` or a unique temp file. Returns the local file path.
+    Raises FileNotFoundError if no blobs found.
     """
     if storage is None:
         raise RuntimeError("google-cloud-storage package not available")
 
-    try:
-        client = _get_storage_client_from_secrets()
-    except Exception:
-        try:
-            client = storage.Client()
-        except Exception as e:
-            logging.warning("Unable to create default storage.Client() in find_and_download_latest_for_id: %s", str(e))
-            raise RuntimeError("No usable GCS credentials available") from e
+    client = _cliente_gcs()
 
     prefix = f"pruebas/{id_evaluado}/"
     blobs = list(client.list_blobs(bucket_name, prefix=prefix))
@@ -136,13 +109,11 @@ def find_and_download_latest_for_id(id_evaluado: int, bucket_name: str = 'bucket
     # choose the most recently-updated blob
     blobs_sorted = sorted(blobs, key=lambda b: b.updated or datetime.min, reverse=True)
     chosen = blobs_sorted[0]
-    local_path = os.path.join(tempfile.gettempdir(), os.path.basename(chosen.name))
-    chosen.download_to_filename(local_path)
-    return local_path
+    return _descargar_blob(chosen, destino)
 
 
-def download_gcs_uri_to_tmp(gcs_uri: str) -> str:
-    """Download a gs://bucket/path into /tmp and return local path."""
+def download_gcs_uri_to_tmp(gcs_uri: str, destino: Optional[str] = None) -> str:
+    """Download a gs://bucket/path into `destino` (or a unique temp file) and return the local path."""
     if not gcs_uri.startswith('gs://'):
         raise ValueError("gcs_uri must start with 'gs://'")
     if storage is None:
@@ -152,415 +123,391 @@ def download_gcs_uri_to_tmp(gcs_uri: str) -> str:
     bucket_name = parts[0]
     blob_path = parts[1] if len(parts) > 1 else ''
 
+    client = _cliente_gcs()
+
+    bucket = client.bucket(bucket_name)
+    blob = bucket.blob(blob_path)
+    return _descargar_blob(blob, destino)
+
+
+def _http_session() -> 'requests.Session':
+    """Sesión HTTP compartida por el proceso (pool keep-alive hacia el endpoint).
+
+    Evita pagar DNS + TCP + TLS en cada inferencia. `requests.Session` es
+    seguro para usar desde los hilos de la cola mientras no se cambie su
+    configuración después de crearla.
+    """
+    global _SESSION
+    if _SESSION is not None:
+        return _SESSION
+    with _SESSION_LOCK:
+        if _SESSION is None:
+            opciones = dict(
+                total=None, connect=INFERENCE_CONNECT_RETRIES, read=0, status=0, other=0,
+                backoff_factor=0.5, allowed_methods=None, raise_on_status=False,
+            )
+            try:
+                retry = Retry(backoff_jitter=0.5, **opciones)
+            except TypeError:  # urllib3 < 2 no tiene backoff_jitter
+                retry = Retry(**opciones)
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, INFERENCE_POOL_SIZE), max_retries=retry)
+            session = requests.Session()
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers.update({"Accept-Encoding": "gzip, deflate", "Connection": "keep-alive"})
+            _SESSION = session
+    return _SESSION
+
+
+def _imagen_para_subir(ruta: str, mime_type: str):
+    """Contenido a subir: el archivo tal cual o, si pesa más de
+    INFERENCE_MAX_UPLOAD_BYTES, una recodificación JPEG con las mismas
+    dimensiones (las cajas siguen en coordenadas de la imagen original).
+
+    Devuelve `(nombre, fileobj, mime)`; el llamador cierra el fileobj.
+    """
+    nombre = os.path.basename(ruta)
+    if Image is not None and os.path.getsize(ruta) > INFERENCE_MAX_UPLOAD_BYTES:
+        try:
+            with Image.open(ruta) as im:
+                exif = im.info.get("exif")
+                if im.mode not in ("RGB", "L"):
+                    im = im.convert("RGB")
+                buf = io.BytesIO()
+                opciones = {"format": "JPEG", "quality": INFERENCE_UPLOAD_QUALITY, "optimize": True}
+                if exif:
+                    # Conserva la orientación EXIF: el modelo ve la misma imagen
+                    opciones["exif"] = exif
+                im.save(buf, **opciones)
+            if buf.tell() < os.path.getsize(ruta):
+                buf.seek(0)
+                return os.path.splitext(nombre)[0] + ".jpg", buf, "image/jpeg"
+        except Exception as e:
+            logging.warning("No se pudo recodificar %s antes de subirla: %s", ruta, e)
+    return nombre, open(ruta, 'rb'), mime_type
+
+
+class InferenciaHTTPError(RuntimeError):
+    """Respuesta no exitosa del endpoint de inferencia (conserva el código HTTP)."""
+
+    def __init__(self, mensaje: str, status: int):
+        super().__init__(mensaje)
+        self.status = status
+
+
+def resolver_id_evaluado(image_name_or_id) -> Optional[int]:
+    """id_evaluado a partir del argumento ('12', '12_foto.jpg') o de la sesión."""
     try:
-        client = _get_storage_client_from_secrets()
+        return int(image_name_or_id)
     except Exception:
-        # Attempt ADC fallback but avoid noisy exceptions; surface a clear error
-        # if ADC is not configured.
+        pass
+    try:
+        return int(str(image_name_or_id).split('_')[0])
+    except Exception:
+        pass
+    try:
+        sid = st.session_state.get('id_evaluado')
+        if sid is not None:
+            return int(sid)
+    except Exception:
+        pass
+    return None
+
+
+def preparar_imagen_envio(image_name_or_id, id_evaluado: Optional[int], destino: str,
+                          archivo=None) -> Optional[tuple]:
+    """Deja en `destino` la imagen que se enviará al modelo.
+
+    Prioridad:
+      1. `archivo` o `st.session_state['uploaded_file']` (subida en la UI)
+      2. el blob más reciente bajo `pruebas/{id_evaluado}/`
+      3. `image_name_or_id` interpretado como ruta local
+
+    Devuelve `(ruta, used_uploaded)` o None si no hay imagen.
+    """
+    uploaded = archivo
+    if uploaded is None:
         try:
-            client = storage.Client()
-        except Exception as e:
-            logging.warning("Unable to create default storage.Client() in download_gcs_uri_to_tmp: %s", str(e))
-            raise RuntimeError("No usable GCS credentials available") from e
+            uploaded = st.session_state.get('uploaded_file')
+        except Exception:
+            uploaded = None
 
-    bucket = client.bucket(bucket_name)
-    blob = bucket.blob(blob_path)
-    local_path = os.path.join(tempfile.gettempdir(), os.path.basename(blob_path))
-    blob.download_to_filename(local_path)
-    return local_path
+    if uploaded is not None:
+        with open(destino, 'wb') as f:
+            f.write(uploaded.getbuffer())
+        return destino, True
 
+    if id_evaluado is not None:
+        try:
+            return find_and_download_latest_for_id(id_evaluado, destino=destino), False
+        except FileNotFoundError:
+            pass
 
-def simular_resultado(image_name_or_id, show_overlay: bool = False) -> List[Dict]:
-    """Call /predict on the Cloud Run model using a chosen local image.
+    if os.path.exists(str(image_name_or_id)):
+        return str(image_name_or_id), False
+    logging.warning(f"No source image found for id {id_evaluado}")
+    return None
 
-    Selection priority for the image sent to the model:
-      1. `st.session_state['uploaded_file']` if present (uploaded in UI)
-      2. newest blob under `pruebas/{id_evaluado}/` when `id_evaluado` is known
-      3. `image_name_or_id` interpreted as a local file path
 
-    After receiving the response, prefer `archivo.ruta_gcs` from the model metadata
-    to download an annotated preview image (saved to `/tmp/pef_img.jpg`).
-    Returns a list of indicadores enriched from the DB.
+def _subir_a_gcs(ruta_local: str, gcs_uri: str):
+    """Overwrite the blob at `gcs_uri` with the contents of `ruta_local`."""
+    if not gcs_uri.startswith('gs://'):
+        raise ValueError("gcs_uri must start with 'gs://'")
+    bucket_name, _, blob_path = gcs_uri[5:].partition('/')
+    import mimetypes
+    blob = _cliente_gcs().bucket(bucket_name).blob(blob_path)
+    blob.upload_from_filename(ruta_local, content_type=mimetypes.guess_type(ruta_local)[0] or 'image/jpeg')
+
+
+def ejecutar_inferencia(ruta_envio: str, id_evaluado: Optional[int], used_uploaded: bool = False,
+                        ruta_preview: Optional[str] = None, escala: tuple = (1.0, 1.0),
+                        ruta_archivo: Optional[str] = None) -> Dict:
+    """Call /predict on the Cloud Run model with `ruta_envio` and enrich the detections from the DB.
+
+    Prefers `archivo.ruta_gcs` from the model metadata to download an annotated
+    preview into `ruta_preview`. Does not touch `st.session_state`, so it can run
+    in a worker thread. `escala` is (sent / original) per axis when a reduced
+    copy was sent; in that case pass the full-size image as `ruta_archivo`: it
+    replaces the reduced copy the model archived at `ruta_gcs` (which becomes
+    Prueba.ruta_imagen) and boxes are mapped back to its pixels. If that upload
+    fails the boxes are left in the coordinates of the archived copy.
+    Returns `{'resultados', 'ruta_gcs', 'preview_local'}`.
     """
+    escala_x, escala_y = (float(escala[0]) or 1.0), (float(escala[1]) or 1.0)
     if requests is None:
         raise RuntimeError("The 'requests' package is required. Install with: pip install requests")
     if storage is None:
         raise RuntimeError("The 'google-cloud-storage' package is required. Install with: pip install google-cloud-storage")
-
-    id_evaluado: Optional[int] = None
+    if ruta_preview is None:
+        fd, ruta_preview = tempfile.mkstemp(prefix="pef-preview-", suffix=".jpg")
+        os.close(fd)
+
+    resultado = {"resultados": [], "ruta_gcs": None, "preview_local": None}
+    # call inference
+    endpoint = INFERENCE_ENDPOINT
+    params = {}
+    if id_evaluado is not None:
+        params['id_evaluado'] = int(id_evaluado)
+
+    import mimetypes
+    mime_type = mimetypes.guess_type(ruta_envio)[0] or 'application/octet-stream'
     try:
-        id_evaluado = int(image_name_or_id)
+        nombre, f, mime_type = _imagen_para_subir(ruta_envio, mime_type)
+        with f:
+            files = {"file": (nombre, f, mime_type)}
+            resp = _http_session().post(
+                endpoint, params=params, files=files,
+                timeout=(INFERENCE_CONNECT_TIMEOUT_S, INFERENCE_READ_TIMEOUT_S),
+            )
     except Exception:
-        try:
-            parts = str(image_name_or_id).split('_')
-            id_evaluado = int(parts[0])
-        except Exception:
-            id_evaluado = None
+        logging.exception("Error sending request to inference endpoint")
+        raise
 
-    if id_evaluado is None:
+    if not resp.ok:
+        body = None
         try:
-            sid = st.session_state.get('id_evaluado')
-            if sid is not None:
-                id_evaluado = int(sid)
+            body = resp.text
         except Exception:
-            id_evaluado = None
+            body = '<unable to read body>'
+        err_msg = f"Inference endpoint returned {resp.status_code}: {body}"
+        logging.error(err_msg)
+        raise InferenciaHTTPError(err_msg, resp.status_code)
 
-    if id_evaluado is None:
-        raise RuntimeError("El endpoint de inferencia requiere 'id_evaluado'. Establece 'st.session_state[\'id_evaluado\']' o pasa el id como argumento.")
-
-    tmp_dir = tempfile.gettempdir()
-    tmp_send = os.path.join(tmp_dir, "pef_img_send.jpg")
-    tmp_preview = os.path.join(tmp_dir, "pef_img.jpg")
-
-    # 1) uploaded file
-    uploaded = None
     try:
-        uploaded = st.session_state.get('uploaded_file')
+        data = resp.json()
     except Exception:
-        uploaded = None
+        logging.exception("Failed to parse JSON from inference response")
+        raise
 
-    used_uploaded = False
-    if uploaded is not None:
-        with open(tmp_send, 'wb') as f:
-            f.write(uploaded.getbuffer())
-        used_uploaded = True
+    if not data:
+        return resultado
+
+    principal = None
+    if isinstance(data, list):
+        for entry in data:
+            if isinstance(entry, dict) and (entry.get('detections') is not None or entry.get('archivo') is not None):
+                principal = entry
+                break
+        if principal is None:
+            for entry in data:
+                if isinstance(entry, dict):
+                    principal = entry
+                    break
+    elif isinstance(data, dict):
+        principal = data
+
+    if principal is None:
+        return resultado
+
+    # prefer archivo.ruta_gcs for preview if present
+    archivo = principal.get('archivo') or {}
+    ruta_gcs = archivo.get('ruta_gcs') if isinstance(archivo, dict) else None
+    print("ruta_gcs =", ruta_gcs)
+    archivado = False
+    if ruta_gcs and ruta_archivo:
+        try:
+            _subir_a_gcs(ruta_archivo, ruta_gcs)
+            archivado = True
+        except Exception as e:
+            logging.warning("Failed to archive the full-size image at %s: %s", ruta_gcs, str(e))
+            # ruta_gcs keeps the reduced copy: boxes stay in its pixels
+            escala_x = escala_y = 1.0
+    if ruta_gcs:
+        try:
+            if archivado:
+                with open(ruta_archivo, 'rb') as r, open(ruta_preview, 'wb') as w:
+                    w.write(r.read())
+            else:
+                download_gcs_uri_to_tmp(ruta_gcs, destino=ruta_preview)
+        except Exception as e:
+            # Log a compact warning without a full traceback to reduce noise
+            logging.warning("Failed to download preview from archivo.ruta_gcs: %s", str(e))
+        resultado['ruta_gcs'] = ruta_gcs
+        resultado['preview_local'] = ruta_preview
     else:
-        if id_evaluado is not None:
-            try:
-                downloaded = find_and_download_latest_for_id(id_evaluado)
+        try:
+            if used_uploaded:
+                with open(ruta_archivo or ruta_envio, 'rb') as r, open(ruta_preview, 'wb') as w:
+                    w.write(r.read())
+            elif id_evaluado is not None:
                 try:
-                    with open(downloaded, 'rb') as r, open(tmp_send, 'wb') as w:
-                        w.write(r.read())
+                    find_and_download_latest_for_id(id_evaluado, destino=ruta_preview)
                 except Exception:
-                    tmp_send = downloaded
-            except FileNotFoundError:
-                # 3) fallback: local path
-                if os.path.exists(str(image_name_or_id)):
-                    tmp_send = str(image_name_or_id)
-                else:
-                    logging.warning(f"No source image found for id {id_evaluado}")
-                    return []
-        else:
-            if os.path.exists(str(image_name_or_id)):
-                tmp_send = str(image_name_or_id)
-            else:
-                logging.warning("No uploaded file, no id_evaluado and image_name_or_id is not a local path")
-                return []
-
-
-    loading_messages = [
-        "Cargando imagen...",
-        "Analizando trazos del dibujo...",
-        "Detectando indicadores...",
-        "Interpretando elementos...",
-        "Generando análisis completo...",
-    ]
-
-    result_holder = {"done": False, "result": None, "error": None}
+                    pass
+        except Exception:
+            pass
 
-    def worker():
-        try:
-            # call inference
-            endpoint = "https://pef-model-326047181104.us-central1.run.app/predict"
-            params = {}
-            if id_evaluado is not None:
-                params['id_evaluado'] = int(id_evaluado)
-
-            import mimetypes
-            mime_type = mimetypes.guess_type(tmp_send)[0] or 'application/octet-stream'
+    detections = principal.get('detections', []) or []
+    indicadores_local: List[Dict] = []
+    for det in detections:
+        ids = det.get('indicator_ids') or det.get('indicator_id') or []
+        confianza = det.get('confidence_base') or det.get('confidence') or 0.0
+        bbox = det.get('bbox_original') or det.get('bbox') or det.get('bbox_xyxy') or [0, 0, 0, 0]
+        if not isinstance(ids, list):
             try:
-                with open(tmp_send, 'rb') as f:
-                    files = {"file": (os.path.basename(tmp_send), f, mime_type)}
-                    resp = requests.post(endpoint, params=params, files=files, timeout=120)
+                ids = [int(ids)]
             except Exception:
-                logging.exception("Error sending request to inference endpoint")
-                raise
+                ids = []
+        for id_ind in ids:
+            try:
+                x_min, y_min, x_max, y_max = escalar_caja(bbox, escala_x, escala_y)
+                indicadores_local.append({
+                    'id_indicador': int(id_ind),
+                    'confianza': float(confianza),
+                    'x_min': x_min,
+                    'y_min': y_min,
+                    'x_max': x_max,
+                    'y_max': y_max,
+                    'ruta_imagen': ruta_gcs,
+                })
+            except Exception:
+                continue
 
-            if not resp.ok:
-                body = None
-                try:
-                    body = resp.text
-                except Exception:
-                    body = '<unable to read body>'
-                err_msg = f"Inference endpoint returned {resp.status_code}: {body}"
-                logging.error(err_msg)
-                raise RuntimeError(err_msg)
+    if not indicadores_local:
+        return resultado
 
+    ids_list = [p['id_indicador'] for p in indicadores_local]
+    ids_csv = ','.join(str(i) for i in ids_list)
+    df = load_indicadores_por_ids(ids_csv)
+    id_map = {}
+    if df is not None and not df.empty:
+        for _, row in df.iterrows():
             try:
-                data = resp.json()
+                iid = int(row.get('id_indicador'))
             except Exception:
-                logging.exception("Failed to parse JSON from inference response")
-                raise
-
-            if not data:
-                result_holder['result'] = []
-                return
-
-            principal = None
-            if isinstance(data, list):
-                for entry in data:
-                    if isinstance(entry, dict) and (entry.get('detections') is not None or entry.get('archivo') is not None):
-                        principal = entry
-                        break
-                if principal is None:
-                    for entry in data:
-                        if isinstance(entry, dict):
-                            principal = entry
-                            break
-            elif isinstance(data, dict):
-                principal = data
-
-            if principal is None:
-                result_holder['result'] = []
-                return
-
-            # prefer archivo.ruta_gcs for preview if present
-            archivo = principal.get('archivo') or {}
-            ruta_gcs = archivo.get('ruta_gcs') if isinstance(archivo, dict) else None
-            print("ruta_gcs =", ruta_gcs)
-            if ruta_gcs:
-                try:
-                    preview_local = download_gcs_uri_to_tmp(ruta_gcs)
-                    try:
-                        with open(preview_local, 'rb') as r, open(tmp_preview, 'wb') as w:
-                            w.write(r.read())
-                    except Exception:
-                        try:
-                            os.replace(preview_local, tmp_preview)
-                        except Exception:
-                            pass
-                except Exception as e:
-                    # Log a compact warning without a full traceback to reduce noise
-                    logging.warning("Failed to download preview from archivo.ruta_gcs: %s", str(e))
-                try:
-                    st.session_state['last_ruta_gcs'] = ruta_gcs
-                    st.session_state['last_preview_local'] = tmp_preview
-                except Exception:
-                    pass
-            else:
-                try:
-                    if used_uploaded:
-                        with open(tmp_send, 'rb') as r, open(tmp_preview, 'wb') as w:
-                            w.write(r.read())
-                    elif id_evaluado is not None:
-                        try:
-                            preview_local = find_and_download_latest_for_id(id_evaluado)
-                            with open(preview_local, 'rb') as r, open(tmp_preview, 'wb') as w:
-                                w.write(r.read())
-                        except Exception:
-                            pass
-                except Exception:
-                    pass
-
-            detections = principal.get('detections', []) or []
-            indicadores_local: List[Dict] = []
-            for det in detections:
-                ids = det.get('indicator_ids') or det.get('indicator_id') or []
-                confianza = det.get('confidence_base') or det.get('confidence') or 0.0
-                bbox = det.get('bbox_original') or det.get('bbox') or det.get('bbox_xyxy') or [0, 0, 0, 0]
-                if not isinstance(ids, list):
-                    try:
-                        ids = [int(ids)]
-                    except Exception:
-                        ids = []
-                for id_ind in ids:
-                    try:
-                        indicadores_local.append({
-                            'id_indicador': int(id_ind),
-                            'confianza': float(confianza),
-                            'x_min': int(bbox[0]) if len(bbox) > 0 else 0,
-                            'y_min': int(bbox[1]) if len(bbox) > 1 else 0,
-                            'x_max': int(bbox[2]) if len(bbox) > 2 else 0,
-                            'y_max': int(bbox[3]) if len(bbox) > 3 else 0,
-                            'ruta_imagen': ruta_gcs,
-                        })
-                    except Exception:
-                        continue
-
-            if not indicadores_local:
-                result_holder['result'] = []
-                return
-
-            ids_list = [p['id_indicador'] for p in indicadores_local]
-            ids_csv = ','.join(str(i) for i in ids_list)
-            df = load_indicadores_por_ids(ids_csv)
-            id_map = {}
-            if df is not None and not df.empty:
-                for _, row in df.iterrows():
+                continue
+            try:
+                id_map[iid] = {
+                    'nombre': row.get('nombre', '') if 'nombre' in row.index else row.get('nombre', ''),
+                    'significado': row.get('significado', '') if 'significado' in row.index else row.get('significado', ''),
+                    'id_categoria': row.get('id_categoria') if 'id_categoria' in row.index else None,
+                    'categoria_nombre': row.get('categoria_nombre') if 'categoria_nombre' in row.index else None,
+                }
+            except Exception:
+                id_map[iid] = {
+                    'nombre': row.get('nombre', ''),
+                    'significado': row.get('significado', ''),
+                    'id_categoria': None,
+                    'categoria_nombre': None,
+                }
+
+    resultados_local: List[Dict] = []
+    for p in indicadores_local:
+        iid = p['id_indicador']
+        meta = id_map.get(iid, {}) if isinstance(id_map, dict) else {}
+        nombre = meta.get('nombre') if isinstance(meta, dict) else ''
+        significado = meta.get('significado') if isinstance(meta, dict) else ''
+        id_categoria = meta.get('id_categoria') if isinstance(meta, dict) else None
+        categoria_nombre = meta.get('categoria_nombre') if isinstance(meta, dict) else None
+        resultados_local.append({
+            'id_indicador': iid,
+            'nombre': nombre,
+            'significado': significado,
+            'confianza': p.get('confianza', 0.0),
+            'x_min': p.get('x_min', 0),
+            'x_max': p.get('x_max', 0),
+            'y_min': p.get('y_min', 0),
+            'y_max': p.get('y_max', 0),
+            'ruta_imagen': p.get('ruta_imagen', None),
+            'id_categoria': id_categoria,
+            'categoria_nombre': categoria_nombre,
+        })
+
+    # Business rule: if indicator 16 is present AND any of indicators {8,9,10,11,12,13} present,
+    # then add indicator 61 to the results (with its name, significado and id_categoria)
+    try:
+        present_ids = {r.get('id_indicador') for r in resultados_local}
+        trigger_set = {8, 9, 10, 11, 12, 13}
+        if 16 in present_ids and (present_ids & trigger_set):
+            # Fetch indicator 61 details
+            try:
+                df61 = load_indicadores_por_ids('61')
+                if df61 is not None and not df61.empty:
+                    row = df61.iloc[0]
                     try:
-                        iid = int(row.get('id_indicador'))
+                        nombre61 = row.get('nombre', '')
                     except Exception:
-                        continue
+                        nombre61 = ''
                     try:
-                        id_map[iid] = {
-                            'nombre': row.get('nombre', '') if 'nombre' in row.index else row.get('nombre', ''),
-                            'significado': row.get('significado', '') if 'significado' in row.index else row.get('significado', ''),
-                            'id_categoria': row.get('id_categoria') if 'id_categoria' in row.index else None,
-                            'categoria_nombre': row.get('categoria_nombre') if 'categoria_nombre' in row.index else None,
-                        }
+                        significado61 = row.get('significado', '')
                     except Exception:
-                        id_map[iid] = {
-                            'nombre': row.get('nombre', ''),
-                            'significado': row.get('significado', ''),
-                            'id_categoria': None,
-                            'categoria_nombre': None,
-                        }
-
-            resultados_local: List[Dict] = []
-            for p in indicadores_local:
-                iid = p['id_indicador']
-                meta = id_map.get(iid, {}) if isinstance(id_map, dict) else {}
-                nombre = meta.get('nombre') if isinstance(meta, dict) else ''
-                significado = meta.get('significado') if isinstance(meta, dict) else ''
-                id_categoria = meta.get('id_categoria') if isinstance(meta, dict) else None
-                categoria_nombre = meta.get('categoria_nombre') if isinstance(meta, dict) else None
-                resultados_local.append({
-                    'id_indicador': iid,
-                    'nombre': nombre,
-                    'significado': significado,
-                    'confianza': p.get('confianza', 0.0),
-                    'x_min': p.get('x_min', 0),
-                    'x_max': p.get('x_max', 0),
-                    'y_min': p.get('y_min', 0),
-                    'y_max': p.get('y_max', 0),
-                    'ruta_imagen': p.get('ruta_imagen', None),
-                    'id_categoria': id_categoria,
-                    'categoria_nombre': categoria_nombre,
-                })
-
-            # Business rule: if indicator 16 is present AND any of indicators {8,9,10,11,12,13} present,
-            # then add indicator 61 to the results (with its name, significado and id_categoria)
-            try:
-                present_ids = {r.get('id_indicador') for r in resultados_local}
-                trigger_set = {8, 9, 10, 11, 12, 13}
-                if 16 in present_ids and (present_ids & trigger_set):
-                    # Fetch indicator 61 details
+                        significado61 = ''
                     try:
-                        df61 = load_indicadores_por_ids('61')
-                        if df61 is not None and not df61.empty:
-                            row = df61.iloc[0]
-                            try:
-                                nombre61 = row.get('nombre', '')
-                            except Exception:
-                                nombre61 = ''
-                            try:
-                                significado61 = row.get('significado', '')
-                            except Exception:
-                                significado61 = ''
-                            try:
-                                id_categoria61 = row.get('id_categoria') if 'id_categoria' in row.index else None
-                            except Exception:
-                                id_categoria61 = None
-                            # Append if not already present
-                            if 61 not in present_ids:
-                                resultados_local.append({
-                                    'id_indicador': 61,
-                                    'nombre': nombre61,
-                                    'significado': significado61,
-                                    'confianza': 0.0,
-                                    'x_min': 0,
-                                    'x_max': 0,
-                                    'y_min': 0,
-                                    'y_max': 0,
-                                    'ruta_imagen': None,
-                                    'id_categoria': id_categoria61,
-                                })
+                        id_categoria61 = row.get('id_categoria') if 'id_categoria' in row.index else None
                     except Exception:
-                        # Ignore failures to fetch the extra indicator
-                        pass
-            except Exception:
-                pass
-
-            result_holder['result'] = resultados_local
-        except Exception as e:
-            # Report the error concisely to avoid noisy stack traces in normal runs
-            logging.error("Error in simular_resultado worker: %s", str(e))
-            result_holder['error'] = e
-        finally:
-            result_holder['done'] = True
-
-    t = threading.Thread(target=worker, daemon=True)
-    t.start()
-
-    overlay_ph = st.empty()
-
-    # rotate messages once while the worker is running; if worker finishes earlier, stop
-    for msg in loading_messages:
-        if result_holder.get('done'):
-            break
-        try:
-            if show_overlay:
-                overlay_html = f"""
-                <div style="width:100%;display:flex;align-items:center;justify-content:center;background:rgba(255,255,255,0.96);padding:1rem;border-radius:8px;">
-                    <div style="max-width:900px;width:100%;text-align:center;">
-                        <div style="font-family: Poppins, sans-serif; font-weight:600; font-size:1.05rem; color:#222;margin-bottom:12px;">{msg}</div>
-                        <style>
-                            @keyframes inlineLoaderJump {{ 0%,60%,100% {{ transform: translateY(0); }} 30% {{ transform: translateY(-8px); }} }}
-                            .inline-loader-dots {{ display:flex; gap:10px; justify-content:center; align-items:center; margin-top:6px; }}
-                            .inline-loader-dots span {{ width:12px; height:12px; background:#FFC107; border-radius:50%; display:inline-block; animation:inlineLoaderJump 0.8s infinite ease-in-out; }}
-                            .inline-loader-dots span:nth-child(2) {{ animation-delay: 0.15s; }}
-                            .inline-loader-dots span:nth-child(3) {{ animation-delay: 0.3s; }}
-                        </style>
-                        <div class="inline-loader-dots">
-                            <span></span><span></span><span></span>
-                        </div>
-                    </div>
-                </div>
-                """
-                overlay_ph.markdown(overlay_html, unsafe_allow_html=True)
-            else:
-                overlay_ph.info(msg)
-        except Exception:
-            try:
-                overlay_ph.markdown(f"**{msg}**")
+                        id_categoria61 = None
+                    # Append if not already present
+                    if 61 not in present_ids:
+                        resultados_local.append({
+                            'id_indicador': 61,
+                            'nombre': nombre61,
+                            'significado': significado61,
+                            'confianza': 0.0,
+                            'x_min': 0,
+                            'x_max': 0,
+                            'y_min': 0,
+                            'y_max': 0,
+                            'ruta_imagen': None,
+                            'id_categoria': id_categoria61,
+                        })
             except Exception:
+                # Ignore failures to fetch the extra indicator
                 pass
-        # wait up to 10 seconds but exit early if worker finishes
-        waited = 0.0
-        while waited < 10.0 and not result_holder.get('done'):
-            time.sleep(0.25)
-            waited += 0.25
+    except Exception:
+        pass
 
-    if not result_holder.get('done'):
-        try:
-            if show_overlay:
-                overlay_html = f"""
-                <div style="width:100%;display:flex;align-items:center;justify-content:center;background:rgba(255,255,255,0.96);padding:1rem;border-radius:8px;">
-                    <div style="max-width:900px;width:100%;text-align:center;">
-                        <div style="font-family: Poppins, sans-serif; font-weight:600; font-size:1.05rem; color:#222;margin-bottom:12px;">{loading_messages[-1]}</div>
-                        <style>
-                            @keyframes inlineLoaderJump {{ 0%,60%,100% {{ transform: translateY(0); }} 30% {{ transform: translateY(-8px); }} }}
-                            .inline-loader-dots {{ display:flex; gap:10px; justify-content:center; align-items:center; margin-top:6px; }}
-                            .inline-loader-dots span {{ width:12px; height:12px; background:#FFC107; border-radius:50%; display:inline-block; animation:inlineLoaderJump 0.8s infinite ease-in-out; }}
-                            .inline-loader-dots span:nth-child(2) {{ animation-delay: 0.15s; }}
-                            .inline-loader-dots span:nth-child(3) {{ animation-delay: 0.3s; }}
-                        </style>
-                        <div class="inline-loader-dots">
-                            <span></span><span></span><span></span>
-                        </div>
-                    </div>
-                </div>
-                """
-                overlay_ph.markdown(overlay_html, unsafe_allow_html=True)
-            else:
-                overlay_ph.info(loading_messages[-1] + " (finalizando...)")
-        except Exception:
-            try:
-                overlay_ph.markdown(f"**{loading_messages[-1]} (finalizando...)**")
-            except Exception:
-                pass
+    resultado['resultados'] = resultados_local
+    return resultado
 
-    # poll until done (avoid busy loop)
-    while not result_holder.get('done'):
-        time.sleep(0.25)
 
-    # clean placeholder
-    try:
-        overlay_ph.empty()
-    except Exception:
-        pass
+def simular_resultado(image_name_or_id, show_overlay: bool = False) -> List[Dict]:
+    """Envía la imagen a la cola de inferencia y espera el resultado (bloqueante).
 
-    if result_holder.get('error') is not None:
-        raise result_holder.get('error')
+    Se mantiene para usos fuera de la UI paso a paso; los componentes usan
+    `services.inferencia.enviar_inferencia` + `resultado_inferencia`, que no
+    bloquean el hilo del script.
+    """
+    from services.inferencia import enviar_inferencia, esperar_inferencia
 
-    return result_holder.get('result') or []
+    job_id = enviar_inferencia(image_name_or_id)
+    return esperar_inferencia(job_id)
@@ -3,24 +3,32 @@ import pandas as pd
 from pathlib import Path
 from datetime import datetime
 import time
-from services.db import fetch_df
+from services.db import fetch_df, transaction
+from services.busqueda import mascara_busqueda
 from services.queries.q_indicadores import *
 
-def verificar_indicador_unico(nombre, id_indicador=None):
-    """Verifica que el nombre del indicador sea único"""
-    # Hacer verificación case-insensitive para evitar duplicados con diferente capitalización
-    all_ind = fetch_df(GET_ALL_INDICADORES)
-    if all_ind is not None and not all_ind.empty:
-        for _, row in all_ind.iterrows():
-            try:
-                existing_id = row.get('id_indicador')
-                existing_name = (row.get('nombre') or '').strip().lower()
-                if existing_name == (nombre or '').strip().lower():
-                    if id_indicador is None or int(existing_id) != int(id_indicador):
-                        return False, "El nombre del indicador ya está en uso"
-            except Exception:
-                continue
+def verificar_indicador_unico(uow, nombre, id_indicador=None):
+    """Verifica dentro de la transacción `uow` que el nombre del indicador sea único"""
+    # Verificación case-insensitive para evitar duplicados con diferente capitalización
+    dup = uow.fetch_df(GET_INDICADOR_DUPLICADO, {
+        "nombre": (nombre or '').strip().lower(),
+        "id_indicador": int(id_indicador) if id_indicador is not None else None,
+    })
+    if dup is not None and not dup.empty:
+        return False, "El nombre del indicador ya está en uso"
+    return True, ""
 
+
+def guardar_indicador(sql, params, id_indicador=None):
+    """Verifica unicidad y ejecuta el INSERT/UPDATE en una sola transacción.
+
+    Devuelve `(True, "")` o `(False, mensaje)` si el nombre ya existe.
+    """
+    with transaction() as uow:
+        es_unico, mensaje = verificar_indicador_unico(uow, params["nombre"], id_indicador)
+        if not es_unico:
+            return False, mensaje
+        uow.execute(sql, params)
     return True, ""
 
 label = ":material/add: Agregar Indicador"
@@ -110,13 +118,6 @@ def agregar_indicador_dialog():
             except Exception:
                 pass
             
-            # Verificar unicidad
-            es_unico, mensaje = verificar_indicador_unico(nombre)
-            if not es_unico:
-                label = ":material/warning:"
-                st.error(f"{label} {mensaje}")
-                st.stop()
-            
             try:
                 # Resolver id_categoria seleccionado (None si vacio)
                 sel_cat_id = None
@@ -129,14 +130,18 @@ def agregar_indicador_dialog():
                 except Exception:
                     sel_cat_id = None
 
-                # Insertar indicador
-                fetch_df(INSERT_INDICADOR, {
+                # Insertar indicador (verificando unicidad en la misma transacción)
+                es_unico, mensaje = guardar_indicador(INSERT_INDICADOR, {
                     "nombre": nombre.strip(),
                     "indicador_1": (indicador_1.strip() if isinstance(indicador_1, str) else None),
                     "indicador_2": (indicador_2.strip() if isinstance(indicador_2, str) else None),
                     "significado": significado.strip(),
                     "id_categoria": sel_cat_id
                 })
+                if not es_unico:
+                    label = ":material/warning:"
+                    st.error(f"{label} {mensaje}")
+                    st.stop()
                 
                 label = f":material/check: Indicador '{nombre}'"
                 st.success(f"{label} creado exitosamente")
@@ -276,13 +281,6 @@ def editar_indicador_dialog(indicador_data):
             except Exception:
                 pass
             
-            # Verificar unicidad (excluyendo el indicador actual)
-            es_unico, mensaje = verificar_indicador_unico(nombre, indicador_data["id_indicador"])
-            if not es_unico:
-                label = ":material/warning:"
-                st.error(f"{label} {mensaje}")
-                st.stop()
-            
             try:
                 # Resolver id_categoria seleccionado (None si vacio)
                 sel_cat_id = None
@@ -297,15 +295,19 @@ def editar_indicador_dialog(indicador_data):
                 except Exception:
                     sel_cat_id = None
 
-                # Actualizar indicador con id_categoria
-                fetch_df(UPDATE_INDICADOR, {
+                # Actualizar indicador con id_categoria (verificando unicidad, excluyendo el actual)
+                es_unico, mensaje = guardar_indicador(UPDATE_INDICADOR, {
                     "id_indicador": indicador_data["id_indicador"],
                     "nombre": nombre.strip(),
                     "indicador_1": indicador_1.strip(),
                     "indicador_2": indicador_2.strip(),
                     "significado": significado.strip(),
                     "id_categoria": sel_cat_id
-                })
+                }, indicador_data["id_indicador"])
+                if not es_unico:
+                    label = ":material/warning:"
+                    st.error(f"{label} {mensaje}")
+                    st.stop()
                 
                 label = f":material/check: Indicador '{nombre}'"
                 st.success(f"{label} actualizado exitosamente")
@@ -322,8 +324,11 @@ def eliminar_indicadores_seleccionados(indicadores_seleccionados):
     try:
         eliminados = []
         
+        with transaction() as uow:
+            for idx, indicador in indicadores_seleccionados.iterrows():
+                uow.execute(DELETE_INDICADOR, {"id_indicador": indicador["id_indicador"]})
+
         for idx, indicador in indicadores_seleccionados.iterrows():
-            fetch_df(DELETE_INDICADOR, {"id_indicador": indicador["id_indicador"]})
             eliminados.append(f":material/check: Indicador '{indicador['nombre']}' eliminado")
         
         for msg in eliminados:
@@ -422,9 +427,7 @@ def indicadores():
     
     # Aplicar búsqueda si hay texto
     if buscar:
-        mask = df_display[['nombre', 'significado']].apply(
-            lambda row: row.astype(str).str.contains(buscar, case=False).any(), axis=1
-        )
+        mask = mascara_busqueda(st.session_state.indicadores_df, buscar, ['nombre', 'significado'])
         df_display = df_display[mask]
         df = df[mask]
     
@@ -0,0 +1,414 @@
+import hashlib
+import json
+import logging
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import streamlit as st
+
+from services import cache_inferencia
+from config.settings import get_setting, get_float_setting, get_int_setting
+from services.image_preprocess import preparar_para_archivo, preparar_para_modelo
+from services.indicadores import (
+    INFERENCE_UPLOAD_QUALITY, InferenciaHTTPError, ejecutar_inferencia, preparar_imagen_envio,
+    resolver_id_evaluado,
+)
+
+try:
+    import requests
+except Exception:
+    requests = None
+
+# Cola de inferencia: `enviar_inferencia` devuelve un id de trabajo al instante y
+# un pool de hilos llama al modelo con reintentos. El estado de cada trabajo se
+# guarda en disco (<id>.json), así que un rerun o una recarga de la página con la
+# misma imagen reutiliza el resultado en lugar de volver a enviarla.
+INFERENCE_JOBS_DIR = str(get_setting("INFERENCE_JOBS_DIR", "") or os.path.join(tempfile.gettempdir(), "pef_jobs"))
+INFERENCE_WORKERS = get_int_setting("INFERENCE_WORKERS", 2)
+# Reintentos ante errores transitorios (conexión, timeout, 408/429/5xx)
+INFERENCE_MAX_RETRIES = get_int_setting("INFERENCE_MAX_RETRIES", 2)
+INFERENCE_BACKOFF_S = get_float_setting("INFERENCE_BACKOFF_S", 2.0)
+INFERENCE_BACKOFF_MAX_S = get_float_setting("INFERENCE_BACKOFF_MAX_S", 30.0)
+# Cada cuánto el fragmento de la UI vuelve a consultar el estado mientras el trabajo corre
+INFERENCE_POLL_S = get_float_setting("INFERENCE_POLL_S", 1.0)
+# Los trabajos (json, imagen enviada y vista previa) se borran pasado este tiempo
+INFERENCE_JOB_TTL_S = get_int_setting("INFERENCE_JOB_TTL_S", 24 * 3600)
+# Lado mayor (px) de la copia que se envía al modelo; 0 envía la imagen original
+INFERENCE_INPUT_PX = get_int_setting("INFERENCE_INPUT_PX", 1280)
+
+PENDIENTE, EJECUTANDO, LISTO, ERROR = "pendiente", "ejecutando", "listo", "error"
+
+LOADING_MESSAGES = [
+    "Cargando imagen...",
+    "Analizando trazos del dibujo...",
+    "Detectando indicadores...",
+    "Interpretando elementos...",
+    "Generando análisis completo...",
+]
+
+# id -> registro del trabajo / evento que se activa al terminar
+_TRABAJOS = {}
+_EVENTOS = {}
+_LOCK = threading.Lock()
+_EXECUTOR = None
+
+
+def _executor() -> ThreadPoolExecutor:
+    global _EXECUTOR
+    with _LOCK:
+        if _EXECUTOR is None:
+            _EXECUTOR = ThreadPoolExecutor(max_workers=max(1, INFERENCE_WORKERS), thread_name_prefix="inferencia")
+        return _EXECUTOR
+
+
+def _ruta(job_id: str, sufijo: str) -> str:
+    return os.path.join(INFERENCE_JOBS_DIR, f"{job_id}{sufijo}")
+
+
+def _json_valor(v):
+    # Valores numpy que vienen de los DataFrames (id_categoria, etc.)
+    if hasattr(v, "item"):
+        return v.item()
+    return str(v)
+
+
+def _guardar(trabajo: dict):
+    fd, tmp = tempfile.mkstemp(dir=INFERENCE_JOBS_DIR, prefix=".tmp-", suffix=".json")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as fh:
+            json.dump(trabajo, fh, default=_json_valor)
+        os.replace(tmp, _ruta(trabajo["id"], ".json"))
+    except Exception:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def _leer(job_id: str):
+    try:
+        with open(_ruta(job_id, ".json"), "r", encoding="utf-8") as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+
+def _actualizar(job_id: str, **cambios):
+    with _LOCK:
+        trabajo = dict(_TRABAJOS.get(job_id) or {})
+        trabajo.update(cambios, actualizado=time.time())
+        _TRABAJOS[job_id] = trabajo
+    try:
+        _guardar(trabajo)
+    except Exception as e:
+        logging.warning(f"inferencia: no se pudo guardar el trabajo {job_id}: {e}")
+
+
+def _purgar_vencidos():
+    limite = time.time() - INFERENCE_JOB_TTL_S
+    try:
+        nombres = os.listdir(INFERENCE_JOBS_DIR)
+    except OSError:
+        return
+    vencidos = set()
+    for nombre in nombres:
+        if nombre.endswith(".json") and not nombre.startswith("."):
+            try:
+                if os.path.getmtime(os.path.join(INFERENCE_JOBS_DIR, nombre)) < limite:
+                    vencidos.add(nombre[:-5])
+            except OSError:
+                continue
+    if not vencidos:
+        return
+    with _LOCK:
+        for job_id in vencidos:
+            if _TRABAJOS.get(job_id, {}).get("estado") in (PENDIENTE, EJECUTANDO):
+                continue
+            _TRABAJOS.pop(job_id, None)
+            _EVENTOS.pop(job_id, None)
+    for nombre in nombres:
+        if nombre.split(".")[0].split("_")[0] in vencidos:
+            try:
+                os.remove(os.path.join(INFERENCE_JOBS_DIR, nombre))
+            except OSError:
+                pass
+
+
+def _es_transitorio(e: Exception) -> bool:
+    if isinstance(e, InferenciaHTTPError):
+        return e.status in (408, 429) or e.status >= 500
+    if requests is not None and isinstance(e, (requests.ConnectionError, requests.Timeout)):
+        return True
+    return False
+
+
+def _preprocesar(job_id: str, ruta: str) -> dict:
+    """Copia reducida para el modelo; si falla se envía el original."""
+    if INFERENCE_INPUT_PX <= 0:
+        return {"ruta": ruta, "escala_x": 1.0, "escala_y": 1.0}
+    try:
+        return preparar_para_modelo(ruta, _ruta(job_id, "_modelo.jpg"), INFERENCE_INPUT_PX, INFERENCE_UPLOAD_QUALITY)
+    except Exception as e:
+        logging.warning(f"inferencia {job_id}: sin preprocesado ({e}); se envía el original")
+        return {"ruta": ruta, "escala_x": 1.0, "escala_y": 1.0}
+
+
+def _para_archivo(job_id: str, ruta: str, envio: dict):
+    """Imagen a tamaño completo que reemplaza la copia reducida archivada por el modelo."""
+    if envio["ruta"] == ruta:
+        return None
+    try:
+        return preparar_para_archivo(ruta, _ruta(job_id, "_archivo.jpg"), INFERENCE_UPLOAD_QUALITY)
+    except Exception as e:
+        logging.warning(f"inferencia {job_id}: no se pudo preparar la copia a archivar ({e})")
+        return None
+
+
+def _ejecutar(job_id: str):
+    trabajo = _TRABAJOS[job_id]
+    try:
+        envio = _preprocesar(job_id, trabajo["ruta_envio"])
+        archivo = _para_archivo(job_id, trabajo["ruta_envio"], envio)
+        for intento in range(1, INFERENCE_MAX_RETRIES + 2):
+            _actualizar(job_id, estado=EJECUTANDO, intentos=intento)
+            try:
+                res = ejecutar_inferencia(
+                    envio["ruta"], trabajo["id_evaluado"],
+                    used_uploaded=trabajo["used_uploaded"], ruta_preview=_ruta(job_id, "_preview.jpg"),
+                    escala=(envio["escala_x"], envio["escala_y"]) if archivo else (1.0, 1.0),
+                    ruta_archivo=archivo,
+                )
+            except Exception as e:
+                if intento <= INFERENCE_MAX_RETRIES and _es_transitorio(e):
+                    # Backoff exponencial con jitter para no reintentar todos a la vez
+                    espera = min(INFERENCE_BACKOFF_MAX_S, INFERENCE_BACKOFF_S * 2 ** (intento - 1))
+                    espera *= random.uniform(0.5, 1.0)
+                    logging.warning(f"inferencia {job_id}: intento {intento} falló ({e}); reintento en {espera:.1f}s")
+                    time.sleep(espera)
+                    continue
+                logging.error(f"inferencia {job_id}: {e}")
+                _actualizar(job_id, estado=ERROR, error=str(e))
+                return
+            _actualizar(
+                job_id, estado=LISTO, error=None, resultados=res.get("resultados") or [],
+                ruta_gcs=res.get("ruta_gcs"), preview_local=res.get("preview_local"),
+            )
+            if trabajo.get("clave_cache"):
+                cache_inferencia.guardar(trabajo["clave_cache"], res)
+            return
+    except Exception as e:
+        logging.exception(f"inferencia {job_id}: error inesperado")
+        _actualizar(job_id, estado=ERROR, error=str(e))
+    finally:
+        evento = _EVENTOS.get(job_id)
+        if evento is not None:
+            evento.set()
+
+
+def enviar_inferencia(image_name_or_id, archivo=None, forzar: bool = False):
+    """Encola la inferencia de la imagen y devuelve el id del trabajo sin esperar.
+
+    El id depende del evaluado y del contenido de la imagen: si ya hay un
+    trabajo en curso o terminado para la misma imagen se devuelve ese (salvo
+    `forzar` o que haya terminado con error). `archivo` (un UploadedFile)
+    reemplaza a `st.session_state['uploaded_file']`. Devuelve None si no hay imagen.
+    """
+    id_evaluado = resolver_id_evaluado(image_name_or_id)
+    if id_evaluado is None:
+        raise RuntimeError("El endpoint de inferencia requiere 'id_evaluado'. Establece 'st.session_state[\'id_evaluado\']' o pasa el id como argumento.")
+
+    os.makedirs(INFERENCE_JOBS_DIR, exist_ok=True)
+    _purgar_vencidos()
+
+    fd, tmp = tempfile.mkstemp(dir=INFERENCE_JOBS_DIR, prefix=".tmp-", suffix=".img")
+    os.close(fd)
+    try:
+        preparada = preparar_imagen_envio(image_name_or_id, id_evaluado, tmp, archivo=archivo)
+        if preparada is None:
+            return None
+        ruta, used_uploaded = preparada
+        h = hashlib.sha256()
+        with open(ruta, "rb") as fh:
+            for chunk in iter(lambda: fh.read(1024 * 1024), b""):
+                h.update(chunk)
+        digest = h.hexdigest()
+        job_id = f"{id_evaluado}-{digest[:32]}"
+        clave = cache_inferencia.clave_cache(digest, id_evaluado, f"px{INFERENCE_INPUT_PX}")
+
+        with _LOCK:
+            trabajo = _TRABAJOS.get(job_id)
+            en_memoria = trabajo is not None
+        if trabajo is None:
+            trabajo = _leer(job_id)
+        if trabajo is not None and not forzar:
+            estado = trabajo.get("estado")
+            # Un trabajo 'pendiente' en disco pero no en memoria quedó cortado por un reinicio
+            if estado == LISTO or (en_memoria and estado in (PENDIENTE, EJECUTANDO)):
+                if not en_memoria:
+                    with _LOCK:
+                        _TRABAJOS.setdefault(job_id, trabajo)
+                return job_id
+
+        # La imagen preparada en `tmp` se envía como .jpg, igual que antes
+        ext = os.path.splitext(ruta)[1] if ruta != tmp else ""
+        destino = _ruta(job_id, ext or ".jpg")
+        if ruta == tmp:
+            os.replace(tmp, destino)
+        else:
+            shutil.copyfile(ruta, destino)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+    ahora = time.time()
+    nuevo = {
+        "id": job_id,
+        "id_evaluado": id_evaluado,
+        "ruta_envio": destino,
+        "used_uploaded": used_uploaded,
+        "clave_cache": clave,
+        "estado": PENDIENTE,
+        "intentos": 0,
+        "error": None,
+        "resultados": None,
+        "ruta_gcs": None,
+        "preview_local": None,
+        "creado": ahora,
+        "actualizado": ahora,
+    }
+    cacheado = None if forzar else cache_inferencia.obtener(clave, _ruta(job_id, "_preview.jpg"))
+    if cacheado is not None:
+        # Misma imagen y mismo modelo: el trabajo nace terminado, sin llamar a /predict
+        nuevo.update(estado=LISTO, desde_cache=True, **cacheado)
+        with _LOCK:
+            _TRABAJOS[job_id] = nuevo
+            _EVENTOS[job_id] = threading.Event()
+            _EVENTOS[job_id].set()
+        _guardar(nuevo)
+        return job_id
+    with _LOCK:
+        actual = _TRABAJOS.get(job_id)
+        if actual is not None and not forzar and actual.get("estado") in (PENDIENTE, EJECUTANDO):
+            # Otro rerun lo encoló mientras preparábamos la imagen
+            return job_id
+        _TRABAJOS[job_id] = nuevo
+        _EVENTOS[job_id] = threading.Event()
+    _guardar(nuevo)
+    _executor().submit(_ejecutar, job_id)
+    return job_id
+
+
+def estado_inferencia(job_id: str):
+    """Registro del trabajo (estado, intentos, error, resultados...) o None si no existe."""
+    if not job_id:
+        return None
+    with _LOCK:
+        trabajo = _TRABAJOS.get(job_id)
+    if trabajo is None:
+        trabajo = _leer(job_id)
+        if trabajo is not None and trabajo.get("estado") in (PENDIENTE, EJECUTANDO):
+            trabajo = dict(trabajo, estado=ERROR, error="El trabajo se interrumpió; vuelve a intentarlo.")
+    return dict(trabajo) if trabajo is not None else None
+
+
+def _resultados(trabajo: dict) -> list:
+    if trabajo.get("estado") == ERROR:
+        raise RuntimeError(trabajo.get("error") or "Error en la inferencia")
+    try:
+        if trabajo.get("ruta_gcs"):
+            st.session_state['last_ruta_gcs'] = trabajo["ruta_gcs"]
+            st.session_state['last_preview_local'] = trabajo.get("preview_local")
+    except Exception:
+        pass
+    return list(trabajo.get("resultados") or [])
+
+
+def esperar_inferencia(job_id, timeout: float | None = None) -> list:
+    """Bloquea hasta que termine el trabajo y devuelve sus resultados."""
+    if job_id is None:
+        return []
+    with _LOCK:
+        evento = _EVENTOS.get(job_id)
+    if evento is not None and not evento.wait(timeout):
+        raise TimeoutError(f"La inferencia {job_id} no terminó a tiempo")
+    trabajo = estado_inferencia(job_id)
+    if trabajo is None:
+        raise RuntimeError("El trabajo de inferencia ya no existe")
+    return _resultados(trabajo)
+
+
+def _loader_html(msg: str) -> str:
+    return f"""
+    <div style="width:100%;display:flex;align-items:center;justify-content:center;background:rgba(255,255,255,0.96);padding:1rem;border-radius:8px;">
+        <div style="max-width:900px;width:100%;text-align:center;">
+            <div style="font-family: Poppins, sans-serif; font-weight:600; font-size:1.05rem; color:#222;margin-bottom:12px;">{msg}</div>
+            <style>
+                @keyframes inlineLoaderJump {{ 0%,60%,100% {{ transform: translateY(0); }} 30% {{ transform: translateY(-8px); }} }}
+                .inline-loader-dots {{ display:flex; gap:10px; justify-content:center; align-items:center; margin-top:6px; }}
+                .inline-loader-dots span {{ width:12px; height:12px; background:#FFC107; border-radius:50%; display:inline-block; animation:inlineLoaderJump 0.8s infinite ease-in-out; }}
+                .inline-loader-dots span:nth-child(2) {{ animation-delay: 0.15s; }}
+                .inline-loader-dots span:nth-child(3) {{ animation-delay: 0.3s; }}
+            </style>
+            <div class="inline-loader-dots">
+                <span></span><span></span><span></span>
+            </div>
+        </div>
+    </div>
+    """
+
+
+def _mostrar_progreso(trabajo: dict, show_overlay: bool):
+    transcurrido = time.time() - float(trabajo.get("creado") or time.time())
+    msg = LOADING_MESSAGES[min(len(LOADING_MESSAGES) - 1, int(transcurrido // 10))]
+    if trabajo.get("intentos", 0) > 1:
+        msg += f" (reintento {trabajo['intentos'] - 1})"
+    if show_overlay:
+        st.markdown(_loader_html(msg), unsafe_allow_html=True)
+    else:
+        st.info(msg)
+
+
+@st.fragment(run_every=INFERENCE_POLL_S)
+def _sondeo(job_id: str, show_overlay: bool, al_terminar=None):
+    """Consulta el trabajo cada INFERENCE_POLL_S volviendo a ejecutar sólo este fragmento."""
+    trabajo = estado_inferencia(job_id)
+    if trabajo is None or trabajo.get("estado") in (LISTO, ERROR):
+        # Terminó: un único rerun de la app para que el llamador muestre los resultados
+        if al_terminar is not None:
+            al_terminar()
+        st.rerun()
+    _mostrar_progreso(trabajo, show_overlay)
+
+
+def resultado_inferencia(job_id, show_overlay: bool = False, al_terminar=None):
+    """Resultados del trabajo si terminó; si no, muestra el progreso y detiene el script.
+
+    Mientras el trabajo sigue en curso no retorna: deja un fragmento con
+    `run_every=INFERENCE_POLL_S` que consulta el estado sin volver a ejecutar
+    la página ni bloquear el hilo del script. Al terminar, el fragmento llama a
+    `al_terminar` (p. ej. para reabrir un diálogo) y hace un solo rerun de la
+    app, en el que esta función ya devuelve los resultados. Lanza RuntimeError
+    si el trabajo falló.
+    """
+    if job_id is None:
+        return []
+    trabajo = estado_inferencia(job_id)
+    if trabajo is None:
+        raise RuntimeError("El trabajo de inferencia ya no existe")
+    if trabajo.get("estado") in (LISTO, ERROR):
+        return _resultados(trabajo)
+    _sondeo(job_id, show_overlay, al_terminar)
+    st.stop()
+
+
+def inferencia_stats() -> dict:
+    """Trabajos de inferencia en memoria por estado."""
+    with _LOCK:
+        estados = [t.get("estado") for t in _TRABAJOS.values()]
+    return {e: estados.count(e) for e in (PENDIENTE, EJECUTANDO, LISTO, ERROR)}
@@ -0,0 +1,188 @@
+import datetime
+
+import pandas as pd
+
+from services.db import fetch_df
+from services.queries.q_historial import (
+    HISTORIAL_PAGINA_SQL, HISTORIAL_CONTEO_SQL, HISTORIAL_OPCIONES_FILTRO_SQL
+)
+from services.queries.q_evaluados import (
+    EVALUADOS_PAGINA_SQL, EVALUADOS_CONTEO_SQL, EVALUADOS_OPCIONES_FILTRO_SQL
+)
+
+
+def patron_like(texto: str) -> str:
+    """Patrón LIKE '%texto%' escapando los comodines de SQL Server."""
+    t = str(texto).strip()
+    for ch in ("[", "%", "_"):
+        t = t.replace(ch, f"[{ch}]")
+    return f"%{t}%"
+
+
+def _where(condiciones) -> str:
+    return ("WHERE " + "\n    AND ".join(condiciones)) if condiciones else ""
+
+
+# ==================== HISTORIAL ====================
+
+def _historial_condiciones(filtros: dict | None, busqueda: str | None, id_usuario: int | None):
+    """Arma sólo los predicados de los filtros activos (sin `@x IS NULL OR ...`)."""
+    filtros = filtros or {}
+    conds, params = [], {}
+
+    if id_usuario is not None:
+        conds.append("e.id_usuario = @id_usuario")
+        params["id_usuario"] = int(id_usuario)
+    if filtros.get("Evaluado"):
+        conds.append("CONCAT(e.nombre, ' ', e.apellido) = @evaluado")
+        params["evaluado"] = filtros["Evaluado"]
+    if filtros.get("Sexo"):
+        conds.append("e.sexo = @sexo")
+        params["sexo"] = filtros["Sexo"]
+    if filtros.get("Grupo"):
+        if filtros["Grupo"] == "Sin grupo":
+            conds.append("g.id_grupo IS NULL")
+        else:
+            conds.append("g.nombre = @grupo")
+            params["grupo"] = filtros["Grupo"]
+    if filtros.get("edad_min"):
+        conds.append("DATEDIFF(YEAR, e.fecha_nacimiento, GETDATE()) >= @edad_min")
+        params["edad_min"] = int(filtros["edad_min"])
+    if filtros.get("fecha_desde"):
+        conds.append("p.fecha >= @fecha_desde")
+        params["fecha_desde"] = filtros["fecha_desde"]
+    if filtros.get("fecha_hasta"):
+        # Rango semiabierto: incluye todo el día 'hasta'
+        conds.append("p.fecha < @fecha_hasta_excl")
+        params["fecha_hasta_excl"] = filtros["fecha_hasta"] + datetime.timedelta(days=1)
+    if busqueda and str(busqueda).strip():
+        conds.append(
+            "(CONCAT(e.nombre, ' ', e.apellido) LIKE @q"
+            " OR e.sexo LIKE @q"
+            " OR ISNULL(g.nombre, 'Sin grupo') LIKE @q"
+            " OR CAST(p.id_prueba AS VARCHAR(20)) LIKE @q)"
+        )
+        params["q"] = patron_like(busqueda)
+    return conds, params
+
+
+def historial_total(filtros: dict | None = None, busqueda: str | None = None,
+                    id_usuario: int | None = None) -> int:
+    """Número de pruebas que cumplen filtros y búsqueda."""
+    conds, params = _historial_condiciones(filtros, busqueda, id_usuario)
+    df = fetch_df(HISTORIAL_CONTEO_SQL.replace("{where}", _where(conds)), params or None)
+    if df is None or df.empty:
+        return 0
+    return int(df.iloc[0, 0])
+
+
+def historial_pagina(filtros: dict | None = None, busqueda: str | None = None,
+                     id_usuario: int | None = None, limite: int = 10,
+                     despues_de: tuple | None = None, offset: int = 0) -> pd.DataFrame:
+    """Una página del historial ordenada por (fecha, id_prueba) DESC.
+
+    Con `despues_de=(fecha, id_prueba)` (la última fila de la página anterior)
+    se usa paginación por keyset, que cuesta lo mismo en cualquier página; sin
+    cursor se recurre a OFFSET. Incluye la columna `fecha_orden` para armar el
+    cursor de la siguiente página.
+    """
+    conds, params = _historial_condiciones(filtros, busqueda, id_usuario)
+    if despues_de is not None:
+        conds.append(
+            "(p.fecha < @cursor_fecha OR (p.fecha = @cursor_fecha AND p.id_prueba < @cursor_id))"
+        )
+        params["cursor_fecha"] = despues_de[0]
+        params["cursor_id"] = int(despues_de[1])
+        offset = 0
+    params["offset"] = max(0, int(offset))
+    params["limite"] = max(1, int(limite))
+    return fetch_df(HISTORIAL_PAGINA_SQL.replace("{where}", _where(conds)), params)
+
+
+def historial_opciones_filtro(id_usuario: int | None = None) -> dict:
+    """Valores distintos de Evaluado, Sexo y Grupo para los selectores de filtros."""
+    conds, params = _historial_condiciones(None, None, id_usuario)
+    df = fetch_df(HISTORIAL_OPCIONES_FILTRO_SQL.replace("{where}", _where(conds)), params or None)
+    opciones = {"Evaluado": [], "Sexo": [], "Grupo": []}
+    if df is None or df.empty:
+        return opciones
+    for campo, grupo_df in df.dropna(subset=["valor"]).groupby("campo"):
+        opciones[campo] = sorted(str(v) for v in grupo_df["valor"].tolist())
+    return opciones
+
+
+# ==================== EVALUADOS ====================
+
+# Filtro del diálogo -> columna (igualdad exacta)
+_EVALUADOS_FILTRO_COLUMNAS = {
+    "Sexo": "e.sexo",
+    "Estado civil": "e.estado_civil",
+    "Escolaridad": "e.escolaridad",
+    "Ocupación": "e.ocupacion",
+    "Grupo": "g.nombre",
+    "Especialista": "u.nombre_completo",
+}
+
+
+def _evaluados_condiciones(filtros: dict | None, busqueda: str | None, id_usuario: int | None):
+    filtros = filtros or {}
+    conds, params = [], {}
+
+    if id_usuario is not None:
+        conds.append("e.id_usuario = @id_usuario")
+        params["id_usuario"] = int(id_usuario)
+    for i, (campo, columna) in enumerate(_EVALUADOS_FILTRO_COLUMNAS.items()):
+        if filtros.get(campo):
+            conds.append(f"{columna} = @f{i}")
+            params[f"f{i}"] = filtros[campo]
+    if filtros.get("edad_min"):
+        conds.append("DATEDIFF(YEAR, e.fecha_nacimiento, GETDATE()) >= @edad_min")
+        params["edad_min"] = int(filtros["edad_min"])
+    if busqueda and str(busqueda).strip():
+        conds.append(
+            "(e.nombre LIKE @q OR e.apellido LIKE @q OR e.sexo LIKE @q"
+            " OR e.estado_civil LIKE @q OR e.escolaridad LIKE @q"
+            " OR e.ocupacion LIKE @q OR g.nombre LIKE @q)"
+        )
+        params["q"] = patron_like(busqueda)
+    return conds, params
+
+
+def evaluados_total(filtros: dict | None = None, busqueda: str | None = None,
+                    id_usuario: int | None = None) -> int:
+    """Número de evaluados que cumplen filtros y búsqueda."""
+    conds, params = _evaluados_condiciones(filtros, busqueda, id_usuario)
+    df = fetch_df(EVALUADOS_CONTEO_SQL.replace("{where}", _where(conds)), params or None)
+    if df is None or df.empty:
+        return 0
+    return int(df.iloc[0, 0])
+
+
+def evaluados_pagina(filtros: dict | None = None, busqueda: str | None = None,
+                     id_usuario: int | None = None, limite: int = 9,
+                     despues_de: int | None = None, offset: int = 0) -> pd.DataFrame:
+    """Una página de evaluados ordenada por id_evaluado.
+
+    Con `despues_de` (el último id_evaluado de la página anterior) se pagina
+    por keyset; sin cursor se recurre a OFFSET.
+    """
+    conds, params = _evaluados_condiciones(filtros, busqueda, id_usuario)
+    if despues_de is not None:
+        conds.append("e.id_evaluado > @cursor_id")
+        params["cursor_id"] = int(despues_de)
+        offset = 0
+    params["offset"] = max(0, int(offset))
+    params["limite"] = max(1, int(limite))
+    return fetch_df(EVALUADOS_PAGINA_SQL.replace("{where}", _where(conds)), params)
+
+
+def evaluados_opciones_filtro(id_usuario: int | None = None) -> dict:
+    """Valores distintos de cada filtro del listado de evaluados."""
+    conds, params = _evaluados_condiciones(None, None, id_usuario)
+    df = fetch_df(EVALUADOS_OPCIONES_FILTRO_SQL.replace("{where}", _where(conds)), params or None)
+    opciones = {campo: [] for campo in _EVALUADOS_FILTRO_COLUMNAS}
+    if df is None or df.empty:
+        return opciones
+    for campo, grupo_df in df.dropna(subset=["valor"]).groupby("campo"):
+        opciones[campo] = sorted(str(v) for v in grupo_df["valor"].tolist() if str(v).strip())
+    return opciones
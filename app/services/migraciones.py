@@ -0,0 +1,68 @@
+import logging
+
+from services.db import transaction
+from services.queries.q_migraciones import (
+    CREAR_MIGRACION_ESQUEMA, GET_MIGRACIONES_APLICADAS, REGISTRAR_MIGRACION,
+    MIGRACION_001_INDICES_PRUEBA, MIGRACION_002_INDICE_RESULTADO, MIGRACION_003_INDICES_EVALUADO,
+    MIGRACION_004_PRUEBA_IMAGEN, MIGRACION_005_RESUMEN_DIARIO,
+)
+
+# (versión, nombre, SQL). Sólo se agregan al final; nunca se renumeran ni se
+# cambia el SQL de una versión ya publicada.
+MIGRACIONES = (
+    (1, "indices_prueba", MIGRACION_001_INDICES_PRUEBA),
+    (2, "indice_resultado", MIGRACION_002_INDICE_RESULTADO),
+    (3, "indices_evaluado", MIGRACION_003_INDICES_EVALUADO),
+    (4, "prueba_imagen", MIGRACION_004_PRUEBA_IMAGEN),
+    (5, "resumen_diario", MIGRACION_005_RESUMEN_DIARIO),
+)
+
+
+def migraciones_aplicadas() -> set:
+    """Versiones registradas en dbo.MigracionEsquema (la crea si falta)."""
+    with transaction() as uow:
+        uow.execute(CREAR_MIGRACION_ESQUEMA)
+        df = uow.fetch_df(GET_MIGRACIONES_APLICADAS)
+    if df is None or df.empty:
+        return set()
+    return {int(v) for v in df["version"].tolist()}
+
+
+def migraciones_pendientes() -> list:
+    """`(version, nombre)` de las migraciones que faltan aplicar, en orden."""
+    aplicadas = migraciones_aplicadas()
+    return [(v, n) for v, n, _ in MIGRACIONES if v not in aplicadas]
+
+
+def aplicar_migraciones() -> list:
+    """Aplica en orden las migraciones pendientes, cada una en su transacción.
+
+    El registro y el SQL de la migración se confirman juntos: si falla, no
+    queda registrada y se reintenta la próxima vez. Si otro proceso la aplica
+    al mismo tiempo, éste espera y la salta. Devuelve `(version, nombre)` de
+    las aplicadas ahora.
+    """
+    aplicadas = migraciones_aplicadas()
+    hechas = []
+    for version, nombre, sql in MIGRACIONES:
+        if version in aplicadas:
+            continue
+        with transaction() as uow:
+            df = uow.fetch_df(REGISTRAR_MIGRACION, {"version": version, "nombre": nombre})
+            if df is None or df.empty or not int(df.iloc[0, 0] or 0):
+                continue
+            uow.execute(sql)
+        logging.info(f"migraciones: aplicada {version:03d} {nombre}")
+        hechas.append((version, nombre))
+    return hechas
+
+
+if __name__ == "__main__":
+    # python -m services.migraciones  (desde app/)
+    logging.basicConfig(level=logging.INFO)
+    hechas = aplicar_migraciones()
+    if hechas:
+        for v, n in hechas:
+            print(f"Aplicada {v:03d} {n}")
+    else:
+        print("Sin migraciones pendientes")
@@ -0,0 +1,171 @@
+import base64
+import hashlib
+import logging
+import mimetypes
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+
+from PIL import Image
+
+from config.settings import get_setting, get_int_setting
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# Tamaños (lado mayor, px) por uso: carrusel, visor principal y zoom del modal.
+TAMANOS = {
+    "thumb": 192,
+    "viewer": 1024,
+    "zoom": 2048,
+}
+
+# Copias reducidas <sha256(original)>_<lado><ext>, compartidas por los procesos
+# del host. Igual que el cache de GCS: presupuesto en bytes con desalojo LRU
+# por mtime (cada uso actualiza el mtime) y un lock de archivo para desalojar.
+THUMB_CACHE_DIR = str(get_setting("THUMB_CACHE_DIR", "") or os.path.join(tempfile.gettempdir(), "thumb_cache"))
+THUMB_CACHE_MAX_BYTES = get_int_setting("THUMB_CACHE_MAX_BYTES", 256 * 1024 * 1024)
+
+# (ruta, mtime_ns, tamaño) -> sha256 del contenido, para no releer el archivo en cada rerun
+_HASHES = {}
+_HASHES_MAX = 4096
+_LOCK = threading.Lock()
+_PROCESS_LOCK = threading.RLock()
+
+
+@contextmanager
+def _cache_lock():
+    """Lock exclusivo entre procesos (flock); sin fcntl sólo protege el proceso."""
+    os.makedirs(THUMB_CACHE_DIR, exist_ok=True)
+    with _PROCESS_LOCK:
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(THUMB_CACHE_DIR, ".lock"), "a") as fh:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+def evict_thumb_cache(max_bytes: int = None) -> int:
+    """Desaloja copias reducidas (menos usadas primero) hasta quedar bajo el
+    presupuesto. Devuelve el número de archivos eliminados."""
+    budget = THUMB_CACHE_MAX_BYTES if max_bytes is None else int(max_bytes)
+    if not os.path.isdir(THUMB_CACHE_DIR):
+        return 0
+    removed = 0
+    with _cache_lock():
+        entries, total = [], 0
+        for entry in os.scandir(THUMB_CACHE_DIR):
+            if not entry.is_file() or entry.name.startswith("."):
+                continue
+            try:
+                info = entry.stat()
+            except OSError:
+                continue
+            entries.append((info.st_mtime, info.st_size, entry.path))
+            total += info.st_size
+        if total <= budget:
+            return 0
+        # Bajar a ~90% del presupuesto para no desalojar en cada miniatura nueva
+        target = int(budget * 0.9)
+        for _mtime, size, path in sorted(entries):
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+    if removed:
+        logging.info("miniaturas: %d copia(s) desalojadas del cache", removed)
+    return removed
+
+
+def hash_contenido(path: str) -> str:
+    """SHA-256 del archivo, memorizado mientras no cambie (mtime/tamaño)."""
+    info = os.stat(path)
+    key = (os.path.abspath(path), info.st_mtime_ns, info.st_size)
+    with _LOCK:
+        digest = _HASHES.get(key)
+    if digest:
+        return digest
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1024 * 1024), b""):
+            h.update(chunk)
+    digest = h.hexdigest()
+    with _LOCK:
+        if len(_HASHES) >= _HASHES_MAX:
+            _HASHES.clear()
+        _HASHES[key] = digest
+    return digest
+
+
+def _generar(src_path: str, dest_path: str, lado: int):
+    with Image.open(src_path) as im:
+        # Sin exif_transpose: las cajas de los resultados están en píxeles de la imagen tal cual
+        im.thumbnail((lado, lado), Image.LANCZOS)
+        fd, tmp = tempfile.mkstemp(dir=THUMB_CACHE_DIR, prefix=".tmp-", suffix=os.path.splitext(dest_path)[1])
+        os.close(fd)
+        try:
+            if dest_path.endswith(".png"):
+                im.save(tmp, format="PNG", optimize=True)
+            else:
+                if im.mode not in ("RGB", "L"):
+                    im = im.convert("RGB")
+                im.save(tmp, format="JPEG", quality=85, optimize=True, progressive=True)
+            # Escritura atómica: otros procesos nunca ven un archivo a medias
+            os.replace(tmp, dest_path)
+        except Exception:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+
+
+def miniatura_path(src_path: str, tamano: str = "thumb") -> str:
+    """Ruta de la versión reducida de `src_path`, generándola si no existe.
+
+    El archivo se nombra por el hash del contenido original y el tamaño, así
+    que sirve para cualquier copia de la misma imagen. Si la imagen ya cabe en
+    el tamaño pedido se devuelve la original.
+    """
+    lado = TAMANOS[tamano]
+    os.makedirs(THUMB_CACHE_DIR, exist_ok=True)
+    digest = hash_contenido(src_path)
+    # PNG conserva transparencias; el resto se guarda como JPEG
+    ext = ".png" if src_path.lower().endswith(".png") else ".jpg"
+    dest = os.path.join(THUMB_CACHE_DIR, f"{digest}_{lado}{ext}")
+    if os.path.exists(dest):
+        try:
+            # Uso reciente para el LRU
+            os.utime(dest, None)
+            return dest
+        except OSError:
+            pass  # desalojada entre exists() y utime(): se regenera
+    with Image.open(src_path) as im:
+        if max(im.size) <= lado:
+            return src_path
+    _generar(src_path, dest, lado)
+    evict_thumb_cache()
+    return dest
+
+
+def miniatura_data_uri(src_path: str, tamano: str = "thumb") -> str | None:
+    """Data URI de la versión reducida; None si no se pudo generar."""
+    try:
+        path = miniatura_path(src_path, tamano)
+        mime = mimetypes.guess_type(path)[0] or "image/jpeg"
+        with open(path, "rb") as fh:
+            return f"data:{mime};base64,{base64.b64encode(fh.read()).decode('ascii')}"
+    except Exception as e:
+        logging.warning("No se pudo generar la miniatura %s de %s: %s", tamano, src_path, e)
+        return None
@@ -0,0 +1,158 @@
+import hashlib
+import io
+import logging
+import os
+
+from services.db import execute_batch
+from services.estadisticas import invalidar_estadisticas
+from services.queries.q_estadisticas import RESUMEN_DIARIO_DE_PRUEBA_NUEVA
+from services.queries.q_registro import POST_PRUEBA_CON_RESULTADOS, RESULTADOS_DE_PRUEBA_NUEVA
+
+# Filas por bloque INSERT ... SELECT FROM (VALUES ...). Sólo acota el tamaño
+# de cada constructor VALUES: todos los bloques van en un mismo execute con
+# 10 + 6N valores, que pymssql interpola en el texto del lote del lado del
+# cliente (no son parámetros RPC, así que no aplica el límite de 2100).
+RESULTADOS_POR_BLOQUE = 300
+
+_COLUMNAS_PRUEBA = ("id_evaluado", "nombre_archivo", "ruta_imagen", "formato", "fecha")
+_COLUMNAS_IMAGEN = ("ancho", "alto", "orientacion", "bytes", "sha256")
+_COLUMNAS_RESULTADO = ("id_indicador", "confianza", "x_min", "x_max", "y_min", "y_max")
+
+# Etiqueta EXIF Orientation
+_EXIF_ORIENTATION = 0x0112
+
+
+def _nativo(v):
+    """Convierte escalares numpy / Path a tipos nativos aceptados por pymssql."""
+    from pathlib import Path as _Path
+
+    item = getattr(v, "item", None)
+    if callable(item):
+        try:
+            return item()
+        except Exception:
+            pass
+    if isinstance(v, _Path):
+        return str(v)
+    return v
+
+
+def metadata_imagen(archivo) -> dict:
+    """Ancho, alto, orientación EXIF, tamaño en bytes y SHA-256 de la imagen.
+
+    `archivo` puede ser un UploadedFile de Streamlit, bytes o una ruta. Sólo se
+    decodifica el encabezado de la imagen, no los píxeles. Los campos que no se
+    puedan obtener quedan en None.
+    """
+    from PIL import Image
+
+    meta = {c: None for c in _COLUMNAS_IMAGEN}
+    try:
+        if isinstance(archivo, (bytes, bytearray)):
+            data = bytes(archivo)
+        elif hasattr(archivo, "getvalue"):
+            data = archivo.getvalue()
+        else:
+            with open(archivo, "rb") as fh:
+                data = fh.read()
+    except Exception as e:
+        logging.warning(f"No se pudo leer la imagen para su metadata: {e}")
+        return meta
+
+    meta["bytes"] = len(data)
+    meta["sha256"] = hashlib.sha256(data).hexdigest()
+    try:
+        with Image.open(io.BytesIO(data)) as im:
+            meta["ancho"], meta["alto"] = im.size
+            try:
+                meta["orientacion"] = int(im.getexif().get(_EXIF_ORIENTATION, 1))
+            except Exception:
+                meta["orientacion"] = 1
+    except Exception as e:
+        logging.warning(f"No se pudo leer el encabezado de la imagen: {e}")
+    return meta
+
+
+def metadata_imagen_archivada(ruta_imagen, subida, ruta_gcs=None, copia_local=None) -> dict:
+    """`metadata_imagen` de la imagen que queda en Prueba.ruta_imagen.
+
+    `copia_local` es la copia en disco de lo archivado en `ruta_gcs` (la vista
+    previa de la inferencia). Si corresponde a `ruta_imagen` se usa esa: puede
+    diferir de la subida (recodificada, HEIC a JPEG) y las cajas están en sus
+    píxeles. Si no, se usa `subida`.
+    """
+    if ruta_imagen and ruta_imagen == ruta_gcs and copia_local and os.path.isfile(str(copia_local)):
+        return metadata_imagen(str(copia_local))
+    return metadata_imagen(subida)
+
+
+def construir_resultados(indicadores, img_w=None, img_h=None):
+    """Arma las filas de Resultado a partir de los indicadores del modelo.
+
+    Las cajas se guardan normalizadas como (x_min, y_min, ancho, alto) relativos
+    al tamaño de la imagen cuando éste se conoce; si no, en píxeles.
+    """
+    resultados = []
+    for ind in indicadores or []:
+        iid = ind.get("id_indicador") or ind.get("id")
+        x_min = float(ind.get("x_min", 0))
+        x_max = float(ind.get("x_max", 0))
+        y_min = float(ind.get("y_min", 0))
+        y_max = float(ind.get("y_max", 0))
+        confianza = float(ind.get("confianza", 0.0))
+
+        if img_w and img_h and img_w > 0 and img_h > 0:
+            x_min_norm = x_min / img_w
+            y_min_norm = y_min / img_h
+            w_norm = (x_max - x_min) / img_w
+            h_norm = (y_max - y_min) / img_h
+        else:
+            x_min_norm = x_min
+            y_min_norm = y_min
+            w_norm = (x_max - x_min)
+            h_norm = (y_max - y_min)
+
+        resultados.append({
+            "id_indicador": _nativo(iid),
+            "x_min": x_min_norm,
+            "y_min": y_min_norm,
+            "x_max": w_norm,
+            "y_max": h_norm,
+            "confianza": confianza,
+        })
+    return resultados
+
+
+def guardar_prueba_con_resultados(params_prueba: dict, resultados, imagen: dict | None = None) -> int:
+    """Inserta la prueba, la metadata de su imagen y todos sus resultados de forma atómica.
+
+    `params_prueba` usa las mismas llaves que POST_PRUEBA, `imagen` las de
+    `metadata_imagen` y `resultados` las de `construir_resultados`. Se envía un
+    único lote a SQL Server; si cualquier INSERT falla no queda ni la prueba ni
+    resultados parciales. En el mismo lote se recalcula el día de la prueba en
+    el resumen diario EvaluacionDiaria.
+    Devuelve el id_prueba creado.
+    """
+    resultados = list(resultados or [])
+    imagen = imagen or {}
+    values = [_nativo(params_prueba.get(c)) for c in _COLUMNAS_PRUEBA]
+    values.extend(_nativo(imagen.get(c)) for c in _COLUMNAS_IMAGEN)
+
+    bloques = []
+    for i in range(0, len(resultados), RESULTADOS_POR_BLOQUE):
+        bloque = resultados[i:i + RESULTADOS_POR_BLOQUE]
+        fila = "(" + ", ".join(["%s"] * len(_COLUMNAS_RESULTADO)) + ")"
+        bloques.append(RESULTADOS_DE_PRUEBA_NUEVA.format(filas=", ".join([fila] * len(bloque))))
+        for r in bloque:
+            values.extend(_nativo(r.get(c)) for c in _COLUMNAS_RESULTADO)
+
+    bloques.append(RESUMEN_DIARIO_DE_PRUEBA_NUEVA)
+    sql = POST_PRUEBA_CON_RESULTADOS.replace("{resultados}", "".join(bloques))
+    df = execute_batch(sql, tuple(values))
+    invalidar_estadisticas()
+    if df is None or df.empty:
+        raise Exception("No se obtuvo id_prueba al insertar la prueba")
+    try:
+        return int(df.at[0, "id_prueba"])
+    except Exception:
+        return int(df.iloc[0, 0])
@@ -1,182 +1,10 @@
 # =====================================================
-# QUERIES CON FILTROS PARA ESTADÍSTICAS
+# QUERIES DEL TABLERO DE ESTADÍSTICAS
+# Los KPIs y series salen de ESTADISTICAS_RESUMEN_SQL o, sin filtro por
+# evaluado, de las consultas *_DIARIO_SQL (services/estadisticas.py arma sólo
+# los predicados de los filtros activos).
 # =====================================================
 
-# ==================== QUERIES BASE (SIN FILTROS) ====================
-
-GET_EVALUACIONES_TOTALES = """
--- =====================================================
--- CONSULTA: GET_EVALUACIONES_TOTALES
--- Descripción: Obtiene el total de evaluaciones (pruebas) registradas
--- Devuelve: total_evaluaciones (int)
--- =====================================================
-SELECT COUNT(*) AS total_evaluaciones
-FROM dbo.Prueba;
-"""
-
-GET_CANTIDAD_EVALUADOS = """
--- =====================================================
--- CONSULTA: GET_CANTIDAD_EVALUADOS
--- Descripción: Cantidad de evaluados registrados (únicos)
--- Devuelve: cantidad_evaluados (int)
--- =====================================================
-SELECT COUNT(*) AS cantidad_evaluados
-FROM dbo.Evaluado;
-"""
-
-GET_EVALUACIONES_POR_PERSONA = """
--- =====================================================
--- CONSULTA: GET_EVALUACIONES_POR_PERSONA
--- Descripción: Promedio de evaluaciones por evaluado
--- Devuelve: promedio_evaluaciones (decimal)
--- =====================================================
-SELECT AVG(evaluacion_count * 1.0) AS promedio_evaluaciones
-FROM (
-    SELECT COUNT(*) AS evaluacion_count
-    FROM dbo.Prueba
-    GROUP BY id_evaluado
-) AS subquery;
-"""
-
-GET_EVALUACIONES_POR_MES = """
--- =====================================================
--- CONSULTA: GET_EVALUACIONES_POR_MES
--- Descripción: Cantidad de evaluaciones por mes para un año dado
--- Parámetro: anio (int)
--- Devuelve: mes_num (1-12), mes_nombre, cantidad
--- =====================================================
-SELECT
-    DATEPART(MONTH, fecha) AS mes_num,
-    DATENAME(MONTH, fecha) AS mes_nombre,
-    COUNT(*) AS cantidad
-FROM dbo.Prueba
-WHERE YEAR(fecha) = @anio
-GROUP BY DATEPART(MONTH, fecha), DATENAME(MONTH, fecha)
-ORDER BY mes_num;
-"""
-
-GET_EVALUACIONES_POR_ANIO = """
--- =====================================================
--- CONSULTA: GET_EVALUACIONES_POR_ANIO
--- Descripción: Cantidad de evaluaciones agrupadas por año
--- Devuelve: anio, cantidad
--- =====================================================
-SELECT
-    YEAR(fecha) AS anio,
-    COUNT(*) AS cantidad
-FROM dbo.Prueba
-GROUP BY YEAR(fecha)
-ORDER BY anio;
-"""
-
-
-# ==================== QUERIES CON FILTROS ====================
-
-GET_EVALUACIONES_TOTALES_FILTERED = """
--- =====================================================
--- CONSULTA: GET_EVALUACIONES_TOTALES_FILTERED
--- Descripción: Obtiene el total de evaluaciones filtradas
--- Parámetros: id_evaluado, sexo, id_grupo, fecha_inicio, fecha_fin (opcionales)
--- Devuelve: total_evaluaciones (int)
--- =====================================================
-SELECT COUNT(*) AS total_evaluaciones
-FROM dbo.Prueba p
-INNER JOIN dbo.Evaluado e ON p.id_evaluado = e.id_evaluado
-WHERE 1=1
-    AND (@id_evaluado IS NULL OR e.id_evaluado = @id_evaluado)
-    AND (@sexo IS NULL OR e.sexo = @sexo)
-    AND (@id_grupo IS NULL OR e.id_grupo = @id_grupo)
-    AND (@fecha_inicio IS NULL OR p.fecha >= @fecha_inicio)
-    AND (@fecha_fin IS NULL OR p.fecha <= @fecha_fin);
-"""
-
-GET_CANTIDAD_EVALUADOS_FILTERED = """
--- =====================================================
--- CONSULTA: GET_CANTIDAD_EVALUADOS_FILTERED
--- Descripción: Cantidad de evaluados únicos que cumplen con los filtros
--- Parámetros: id_evaluado, sexo, id_grupo, fecha_inicio, fecha_fin (opcionales)
--- Devuelve: cantidad_evaluados (int)
--- =====================================================
-SELECT COUNT(DISTINCT e.id_evaluado) AS cantidad_evaluados
-FROM dbo.Evaluado e
-LEFT JOIN dbo.Prueba p ON e.id_evaluado = p.id_evaluado
-WHERE 1=1
-    AND (@id_evaluado IS NULL OR e.id_evaluado = @id_evaluado)
-    AND (@sexo IS NULL OR e.sexo = @sexo)
-    AND (@id_grupo IS NULL OR e.id_grupo = @id_grupo)
-    AND (
-        (@fecha_inicio IS NULL AND @fecha_fin IS NULL) 
-        OR (p.fecha >= @fecha_inicio AND p.fecha <= @fecha_fin)
-        OR (p.id_prueba IS NULL)
-    );
-"""
-
-GET_EVALUACIONES_POR_PERSONA_FILTERED = """
--- =====================================================
--- CONSULTA: GET_EVALUACIONES_POR_PERSONA_FILTERED
--- Descripción: Promedio de evaluaciones por evaluado filtrado
--- Parámetros: id_evaluado, sexo, id_grupo, fecha_inicio, fecha_fin (opcionales)
--- Devuelve: promedio_evaluaciones (decimal)
--- =====================================================
-SELECT 
-    CASE 
-        WHEN COUNT(DISTINCT e.id_evaluado) = 0 THEN 0
-        ELSE CAST(COUNT(p.id_prueba) AS FLOAT) / COUNT(DISTINCT e.id_evaluado)
-    END AS promedio_evaluaciones
-FROM dbo.Evaluado e
-LEFT JOIN dbo.Prueba p ON e.id_evaluado = p.id_evaluado
-    AND (@fecha_inicio IS NULL OR p.fecha >= @fecha_inicio)
-    AND (@fecha_fin IS NULL OR p.fecha <= @fecha_fin)
-WHERE 1=1
-    AND (@id_evaluado IS NULL OR e.id_evaluado = @id_evaluado)
-    AND (@sexo IS NULL OR e.sexo = @sexo)
-    AND (@id_grupo IS NULL OR e.id_grupo = @id_grupo);
-"""
-
-GET_EVALUACIONES_POR_MES_FILTERED = """
--- =====================================================
--- CONSULTA: GET_EVALUACIONES_POR_MES_FILTERED
--- Descripción: Cantidad de evaluaciones por mes para un año dado con filtros
--- Parámetros: anio (requerido), id_evaluado, sexo, id_grupo (opcionales)
--- Devuelve: mes_num (1-12), mes_nombre, cantidad
--- =====================================================
-SELECT
-    DATEPART(MONTH, p.fecha) AS mes_num,
-    DATENAME(MONTH, p.fecha) AS mes_nombre,
-    COUNT(*) AS cantidad
-FROM dbo.Prueba p
-INNER JOIN dbo.Evaluado e ON p.id_evaluado = e.id_evaluado
-WHERE YEAR(p.fecha) = @anio
-    AND (@id_evaluado IS NULL OR e.id_evaluado = @id_evaluado)
-    AND (@sexo IS NULL OR e.sexo = @sexo)
-    AND (@id_grupo IS NULL OR e.id_grupo = @id_grupo)
-GROUP BY DATEPART(MONTH, p.fecha), DATENAME(MONTH, p.fecha)
-ORDER BY mes_num;
-"""
-
-GET_EVALUACIONES_POR_ANIO_FILTERED = """
--- =====================================================
--- CONSULTA: GET_EVALUACIONES_POR_ANIO_FILTERED
--- Descripción: Cantidad de evaluaciones agrupadas por año con filtros
--- Parámetros: id_evaluado, sexo, id_grupo, fecha_inicio, fecha_fin (opcionales)
--- Devuelve: anio, cantidad
--- =====================================================
-SELECT
-    YEAR(p.fecha) AS anio,
-    COUNT(*) AS cantidad
-FROM dbo.Prueba p
-INNER JOIN dbo.Evaluado e ON p.id_evaluado = e.id_evaluado
-WHERE 1=1
-    AND (@id_evaluado IS NULL OR e.id_evaluado = @id_evaluado)
-    AND (@sexo IS NULL OR e.sexo = @sexo)
-    AND (@id_grupo IS NULL OR e.id_grupo = @id_grupo)
-    AND (@fecha_inicio IS NULL OR p.fecha >= @fecha_inicio)
-    AND (@fecha_fin IS NULL OR p.fecha <= @fecha_fin)
-GROUP BY YEAR(p.fecha)
-ORDER BY anio;
-"""
-
-
 # ==================== QUERIES AUXILIARES PARA FILTROS ====================
 
 GET_LISTA_EVALUADOS = """
@@ -232,37 +60,6 @@ FROM dbo.Prueba;
 
 # ==================== QUERIES ADICIONALES ====================
 
-GET_EVALUACIONES_POR_GRUPO = """
--- =====================================================
--- CONSULTA: GET_EVALUACIONES_POR_GRUPO
--- Descripción: Cuenta de evaluaciones por grupo de evaluados
--- Devuelve: id_grupo, nombre_grupo, cantidad
--- =====================================================
-SELECT
-    g.id_grupo,
-    g.nombre AS nombre_grupo,
-    COUNT(p.id_prueba) AS cantidad
-FROM dbo.Grupo g
-LEFT JOIN dbo.Evaluado e ON e.id_grupo = g.id_grupo
-LEFT JOIN dbo.Prueba p ON p.id_evaluado = e.id_evaluado
-GROUP BY g.id_grupo, g.nombre
-ORDER BY cantidad DESC;
-"""
-
-GET_DISTRIBUCION_SEXO = """
--- =====================================================
--- CONSULTA: GET_DISTRIBUCION_SEXO
--- Descripción: Distribución de evaluaciones por sexo del evaluado
--- Devuelve: sexo, cantidad
--- =====================================================
-SELECT
-    ISNULL(e.sexo, 'No especificado') AS sexo,
-    COUNT(p.id_prueba) AS cantidad
-FROM dbo.Evaluado e
-LEFT JOIN dbo.Prueba p ON p.id_evaluado = e.id_evaluado
-GROUP BY ISNULL(e.sexo, 'No especificado');
-"""
-
 GET_TOP_INDICADORES = """
 -- =====================================================
 -- CONSULTA: GET_TOP_INDICADORES
@@ -282,4 +79,308 @@ GROUP BY i.id_indicador, i.nombre, i.significado
 ORDER BY apariciones DESC
 OFFSET 0 ROWS
 FETCH NEXT @top_n ROWS ONLY;
-"""
\ No newline at end of file
+"""
+
+
+# ==================== RESUMEN CONSOLIDADO ====================
+
+ESTADISTICAS_RESUMEN_SQL = """
+-- =====================================================
+-- CONSULTA: ESTADISTICAS_RESUMEN_SQL
+-- Descripción: KPIs y series del tablero de estadísticas en un solo viaje.
+--   where_evaluado         predicados activos sobre Evaluado e (o vacío)
+--   en_rango              predicado de fechas sobre p.fecha (o 1 = 1)
+--   where_evaluado_fechas igual que where_evaluado y, con fechas, sólo
+--                         evaluados con pruebas en el rango o sin pruebas
+-- Devuelve 3 result sets:
+--   1) total_evaluaciones, evaluados_con_prueba, cantidad_evaluados, evaluados_filtro
+--   2) anio, cantidad                (pruebas dentro del rango de fechas)
+--   3) anio, mes_num, cantidad       (todas las fechas: el gráfico elige el año)
+-- =====================================================
+SET NOCOUNT ON;
+IF OBJECT_ID('tempdb..#kpi_pruebas') IS NOT NULL DROP TABLE #kpi_pruebas;
+
+SELECT
+    p.id_evaluado,
+    p.fecha,
+    CASE WHEN {en_rango} THEN 1 ELSE 0 END AS en_rango
+INTO #kpi_pruebas
+FROM dbo.Prueba p
+INNER JOIN dbo.Evaluado e ON p.id_evaluado = e.id_evaluado
+{where_evaluado};
+
+SELECT
+    (SELECT COUNT(*) FROM #kpi_pruebas WHERE en_rango = 1) AS total_evaluaciones,
+    (SELECT COUNT(DISTINCT id_evaluado) FROM #kpi_pruebas WHERE en_rango = 1) AS evaluados_con_prueba,
+    (SELECT COUNT(*) FROM dbo.Evaluado e {where_evaluado_fechas}) AS cantidad_evaluados,
+    (SELECT COUNT(*) FROM dbo.Evaluado e {where_evaluado}) AS evaluados_filtro;
+
+SELECT YEAR(fecha) AS anio, COUNT(*) AS cantidad
+FROM #kpi_pruebas
+WHERE en_rango = 1
+GROUP BY YEAR(fecha)
+ORDER BY anio;
+
+SELECT YEAR(fecha) AS anio, MONTH(fecha) AS mes_num, COUNT(*) AS cantidad
+FROM #kpi_pruebas
+GROUP BY YEAR(fecha), MONTH(fecha)
+ORDER BY anio, mes_num;
+
+DROP TABLE #kpi_pruebas;
+"""
+
+
+# Con el resumen diario las tres partes son independientes y se piden en
+# paralelo (services.db.fetch_df_many). Placeholders:
+#   where_resumen         predicados de sexo y grupo sobre EvaluacionDiaria r
+#   where_resumen_rango   los mismos más el rango de fechas sobre r.dia
+#   where_evaluado        predicados activos sobre Evaluado e (o vacío)
+#   where_evaluado_fechas igual que where_evaluado y, con fechas, sólo
+#                         evaluados con pruebas en el rango o sin pruebas
+
+ESTADISTICAS_KPIS_DIARIO_SQL = """
+-- =====================================================
+-- CONSULTA: ESTADISTICAS_KPIS_DIARIO_SQL
+-- Descripción: KPIs del tablero; el total sale de EvaluacionDiaria.
+-- Devuelve: total_evaluaciones, evaluados_con_prueba, cantidad_evaluados, evaluados_filtro
+-- =====================================================
+SELECT
+    (SELECT ISNULL(SUM(r.n_pruebas), 0) FROM dbo.EvaluacionDiaria r {where_resumen_rango}) AS total_evaluaciones,
+    (SELECT COUNT(*) FROM dbo.Evaluado e
+        WHERE EXISTS (SELECT 1 FROM dbo.Prueba p WHERE p.id_evaluado = e.id_evaluado)) AS evaluados_con_prueba,
+    (SELECT COUNT(*) FROM dbo.Evaluado e {where_evaluado_fechas}) AS cantidad_evaluados,
+    (SELECT COUNT(*) FROM dbo.Evaluado e {where_evaluado}) AS evaluados_filtro;
+"""
+
+ESTADISTICAS_POR_ANIO_DIARIO_SQL = """
+-- =====================================================
+-- CONSULTA: ESTADISTICAS_POR_ANIO_DIARIO_SQL
+-- Descripción: Evaluaciones por año dentro del rango de fechas
+-- Devuelve: anio, cantidad
+-- =====================================================
+SELECT YEAR(r.dia) AS anio, SUM(r.n_pruebas) AS cantidad
+FROM dbo.EvaluacionDiaria r
+{where_resumen_rango}
+GROUP BY YEAR(r.dia)
+ORDER BY anio;
+"""
+
+ESTADISTICAS_POR_MES_DIARIO_SQL = """
+-- =====================================================
+-- CONSULTA: ESTADISTICAS_POR_MES_DIARIO_SQL
+-- Descripción: Evaluaciones por mes de todos los años (el gráfico elige el año)
+-- Devuelve: anio, mes_num, cantidad
+-- =====================================================
+SELECT YEAR(r.dia) AS anio, MONTH(r.dia) AS mes_num, SUM(r.n_pruebas) AS cantidad
+FROM dbo.EvaluacionDiaria r
+{where_resumen}
+GROUP BY YEAR(r.dia), MONTH(r.dia)
+ORDER BY anio, mes_num;
+"""
+
+
+# ==================== RESUMEN DIARIO (EvaluacionDiaria) ====================
+# Una fila por (dia, id_grupo, sexo, id_usuario) con la cantidad de pruebas y
+# de evaluados distintos de ese día. Se mantiene recalculando sólo los días
+# afectados por cada alta o baja: el conteo de evaluados distintos no se puede
+# sumar/restar, pero sí recalcular por día desde Prueba.
+
+EXISTE_RESUMEN_DIARIO = """
+-- =====================================================
+-- CONSULTA: EXISTE_RESUMEN_DIARIO
+-- Descripción: Si ya se aplicó la migración 005 (sólo consulta el catálogo)
+-- Devuelve: existe (1/0)
+-- =====================================================
+SELECT CASE WHEN OBJECT_ID('dbo.EvaluacionDiaria', 'U') IS NULL THEN 0 ELSE 1 END AS existe;
+"""
+
+RECONSTRUIR_RESUMEN_DIARIO = """
+-- =====================================================
+-- CONSULTA: RECONSTRUIR_RESUMEN_DIARIO
+-- Descripción: Vuelve a calcular todo EvaluacionDiaria desde Prueba/Evaluado
+--              (bloquea la tabla mientras tanto).
+-- Devuelve: filas, pruebas
+-- =====================================================
+SET NOCOUNT ON;
+DELETE FROM dbo.EvaluacionDiaria WITH (TABLOCKX);
+
+INSERT INTO dbo.EvaluacionDiaria (dia, id_grupo, sexo, id_usuario, n_pruebas, n_evaluados)
+SELECT CAST(p.fecha AS DATE), e.id_grupo, e.sexo, e.id_usuario,
+       COUNT(*), COUNT(DISTINCT p.id_evaluado)
+FROM dbo.Prueba p
+INNER JOIN dbo.Evaluado e ON e.id_evaluado = p.id_evaluado
+GROUP BY CAST(p.fecha AS DATE), e.id_grupo, e.sexo, e.id_usuario;
+
+SELECT COUNT(*) AS filas, ISNULL(SUM(n_pruebas), 0) AS pruebas
+FROM dbo.EvaluacionDiaria;
+"""
+
+# Recalcula los días de la tabla variable @dias_resumen, que debe declarar y
+# llenar la sentencia que lo antecede en el mismo texto SQL. Si la tabla aún no
+# existe no hace nada: la migración 005 la llena completa al crearla.
+_RECALCULAR_DIAS_RESUMEN = """
+IF OBJECT_ID('dbo.EvaluacionDiaria', 'U') IS NOT NULL
+BEGIN
+    WITH objetivo AS (
+        SELECT dia, id_grupo, sexo, id_usuario, n_pruebas, n_evaluados
+        FROM dbo.EvaluacionDiaria WITH (UPDLOCK, HOLDLOCK)
+        WHERE dia IN (SELECT dia FROM @dias_resumen)
+    )
+    MERGE objetivo AS t
+    USING (
+        SELECT d.dia, e.id_grupo, e.sexo, e.id_usuario,
+               COUNT(*) AS n_pruebas, COUNT(DISTINCT p.id_evaluado) AS n_evaluados
+        FROM @dias_resumen d
+        INNER JOIN dbo.Prueba p ON p.fecha >= d.dia AND p.fecha < DATEADD(DAY, 1, d.dia)
+        INNER JOIN dbo.Evaluado e ON e.id_evaluado = p.id_evaluado
+        GROUP BY d.dia, e.id_grupo, e.sexo, e.id_usuario
+    ) AS s
+    ON t.dia = s.dia
+        AND (t.id_grupo = s.id_grupo OR (t.id_grupo IS NULL AND s.id_grupo IS NULL))
+        AND (t.sexo = s.sexo OR (t.sexo IS NULL AND s.sexo IS NULL))
+        AND (t.id_usuario = s.id_usuario OR (t.id_usuario IS NULL AND s.id_usuario IS NULL))
+    WHEN MATCHED AND (t.n_pruebas <> s.n_pruebas OR t.n_evaluados <> s.n_evaluados) THEN
+        UPDATE SET n_pruebas = s.n_pruebas, n_evaluados = s.n_evaluados
+    WHEN NOT MATCHED BY TARGET THEN
+        INSERT (dia, id_grupo, sexo, id_usuario, n_pruebas, n_evaluados)
+        VALUES (s.dia, s.id_grupo, s.sexo, s.id_usuario, s.n_pruebas, s.n_evaluados)
+    WHEN NOT MATCHED BY SOURCE THEN
+        DELETE;
+END
+"""
+
+ACTUALIZAR_RESUMEN_DIARIO = """
+-- =====================================================
+-- CONSULTA: ACTUALIZAR_RESUMEN_DIARIO
+-- Descripción: Recalcula EvaluacionDiaria para una lista de días.
+-- Parámetros: dias_csv -> fechas 'AAAA-MM-DD' separadas por coma
+-- =====================================================
+SET NOCOUNT ON;
+DECLARE @dias_resumen TABLE (dia DATE PRIMARY KEY);
+
+INSERT INTO @dias_resumen (dia)
+SELECT DISTINCT TRY_CAST(value AS DATE)
+FROM STRING_SPLIT(@dias_csv, ',')
+WHERE TRY_CAST(value AS DATE) IS NOT NULL;
+""" + _RECALCULAR_DIAS_RESUMEN
+
+RESUMEN_DIARIO_DE_PRUEBA_NUEVA = """
+DECLARE @dias_resumen TABLE (dia DATE PRIMARY KEY);
+
+INSERT INTO @dias_resumen (dia)
+SELECT DISTINCT CAST(p.fecha AS DATE)
+FROM dbo.Prueba p
+INNER JOIN @nueva_prueba n ON n.id_prueba = p.id_prueba;
+""" + _RECALCULAR_DIAS_RESUMEN
+
+DIAS_DE_PRUEBAS = """
+-- =====================================================
+-- CONSULTA: DIAS_DE_PRUEBAS
+-- Descripción: Días con pruebas de la lista (antes de eliminarlas).
+-- Parámetros: ids_csv -> ids de Prueba separados por coma
+-- Devuelve: dia
+-- =====================================================
+SELECT DISTINCT CAST(p.fecha AS DATE) AS dia
+FROM dbo.Prueba p
+WHERE p.id_prueba IN (SELECT TRY_CAST(value AS INT) FROM STRING_SPLIT(@ids_csv, ','));
+"""
+
+DIAS_DE_EVALUADOS = """
+-- =====================================================
+-- CONSULTA: DIAS_DE_EVALUADOS
+-- Descripción: Días con pruebas de los evaluados de la lista.
+-- Parámetros: ids_csv -> ids de Evaluado separados por coma
+-- Devuelve: dia
+-- =====================================================
+SELECT DISTINCT CAST(p.fecha AS DATE) AS dia
+FROM dbo.Prueba p
+WHERE p.id_evaluado IN (SELECT TRY_CAST(value AS INT) FROM STRING_SPLIT(@ids_csv, ','));
+"""
+
+DIAS_DE_GRUPOS = """
+-- =====================================================
+-- CONSULTA: DIAS_DE_GRUPOS
+-- Descripción: Días con pruebas de evaluados de los grupos de la lista o de
+--              sus subgrupos.
+-- Parámetros: ids_csv -> ids de Grupo separados por coma
+-- Devuelve: dia
+-- =====================================================
+WITH ids AS (
+    SELECT TRY_CAST(value AS INT) AS id_grupo FROM STRING_SPLIT(@ids_csv, ',')
+)
+SELECT DISTINCT CAST(p.fecha AS DATE) AS dia
+FROM dbo.Prueba p
+INNER JOIN dbo.Evaluado e ON e.id_evaluado = p.id_evaluado
+WHERE e.id_grupo IN (
+    SELECT id_grupo FROM ids
+    UNION
+    SELECT g.id_grupo FROM dbo.Grupo g WHERE g.parent_id IN (SELECT id_grupo FROM ids)
+);
+"""
+
+
+# ==================== ANALÍTICA DE INDICADORES ====================
+# Carga de la matriz de incidencia prueba x indicador (services/analitica_indicadores.py).
+# Las pruebas y sus pares se piden por tramo de id_prueba (desde_id, hasta_id]
+# para poder agregar sólo lo nuevo.
+
+ANALITICA_ESTADO_SQL = """
+-- =====================================================
+-- CONSULTA: ANALITICA_ESTADO_SQL
+-- Descripción: Pruebas que siguen existiendo hasta el último id cargado y el
+--              id más alto actual (detecta bajas y altas desde la última carga)
+-- Parámetros: hasta_id
+-- Devuelve: previas, max_id
+-- =====================================================
+SELECT
+    COUNT(CASE WHEN id_prueba <= @hasta_id THEN 1 END) AS previas,
+    ISNULL(MAX(id_prueba), 0) AS max_id
+FROM dbo.Prueba;
+"""
+
+ANALITICA_PRUEBAS_SQL = """
+-- =====================================================
+-- CONSULTA: ANALITICA_PRUEBAS_SQL
+-- Parámetros: desde_id, hasta_id
+-- Devuelve: id_prueba, id_evaluado, dia
+-- =====================================================
+SELECT p.id_prueba, p.id_evaluado, CAST(p.fecha AS DATE) AS dia
+FROM dbo.Prueba p
+WHERE p.id_prueba > @desde_id AND p.id_prueba <= @hasta_id
+ORDER BY p.id_prueba;
+"""
+
+ANALITICA_PARES_SQL = """
+-- =====================================================
+-- CONSULTA: ANALITICA_PARES_SQL
+-- Descripción: Pares (prueba, indicador) distintos; varias cajas del mismo
+--              indicador en una prueba cuentan una vez
+-- Parámetros: desde_id, hasta_id
+-- Devuelve: id_prueba, id_indicador
+-- =====================================================
+SELECT DISTINCT r.id_prueba, r.id_indicador
+FROM dbo.Resultado r
+WHERE r.id_prueba > @desde_id AND r.id_prueba <= @hasta_id
+ORDER BY r.id_prueba, r.id_indicador;
+"""
+
+ANALITICA_EVALUADOS_SQL = """
+-- =====================================================
+-- CONSULTA: ANALITICA_EVALUADOS_SQL
+-- Descripción: Atributos de cohorte vigentes de cada evaluado
+-- Devuelve: id_evaluado, sexo, id_grupo
+-- =====================================================
+SELECT id_evaluado, sexo, id_grupo
+FROM dbo.Evaluado;
+"""
+
+ANALITICA_CATALOGOS_SQL = """
+-- =====================================================
+-- CONSULTA: ANALITICA_CATALOGOS_SQL
+-- Descripción: Nombres de indicadores y grupos para las etiquetas
+-- Devuelve: tipo ('indicador' | 'grupo'), id, nombre
+-- =====================================================
+SELECT 'indicador' AS tipo, id_indicador AS id, nombre FROM dbo.Indicador
+UNION ALL
+SELECT 'grupo', id_grupo, nombre FROM dbo.Grupo;
+"""
@@ -36,3 +36,53 @@ WHERE id_evaluado IN (
     SELECT TRY_CAST(value AS INT) FROM STRING_SPLIT(@ids_csv, ',')
 );
 """
+
+# =====================================================
+# LISTADO PAGINADO: sólo viaja la página visible.
+# Placeholders: {where} (predicados de filtros activos) y @offset/@limite.
+# =====================================================
+EVALUADOS_PAGINA_SQL = """
+SELECT
+    e.id_evaluado,
+    e.nombre       AS Nombre,
+    e.apellido     AS Apellido,
+    DATEDIFF(YEAR, e.fecha_nacimiento, GETDATE()) AS Edad,
+    e.sexo         AS Sexo,
+    e.estado_civil AS [Estado civil],
+    e.escolaridad  AS Escolaridad,
+    e.ocupacion    AS [Ocupación],
+    g.nombre       AS [Grupo],
+    e.id_usuario   AS id_usuario,
+    u.nombre_completo AS Especialista
+FROM Evaluado e
+LEFT JOIN Grupo g ON e.id_grupo = g.id_grupo
+LEFT JOIN Usuario u ON e.id_usuario = u.id_usuario
+{where}
+ORDER BY e.id_evaluado ASC
+OFFSET @offset ROWS FETCH NEXT @limite ROWS ONLY;
+"""
+
+EVALUADOS_CONTEO_SQL = """
+SELECT COUNT(*) AS total
+FROM Evaluado e
+LEFT JOIN Grupo g ON e.id_grupo = g.id_grupo
+LEFT JOIN Usuario u ON e.id_usuario = u.id_usuario
+{where};
+"""
+
+# Valores distintos para los selectores del diálogo de filtros (un solo viaje)
+EVALUADOS_OPCIONES_FILTRO_SQL = """
+SELECT DISTINCT 'Sexo' AS campo, e.sexo AS valor FROM Evaluado e {where}
+UNION
+SELECT DISTINCT 'Estado civil', e.estado_civil FROM Evaluado e {where}
+UNION
+SELECT DISTINCT 'Escolaridad', e.escolaridad FROM Evaluado e {where}
+UNION
+SELECT DISTINCT 'Ocupación', e.ocupacion FROM Evaluado e {where}
+UNION
+SELECT DISTINCT 'Grupo', g.nombre
+FROM Evaluado e INNER JOIN Grupo g ON e.id_grupo = g.id_grupo {where}
+UNION
+SELECT DISTINCT 'Especialista', u.nombre_completo
+FROM Evaluado e INNER JOIN Usuario u ON e.id_usuario = u.id_usuario {where};
+"""
@@ -43,3 +43,13 @@ UPDATE Grupo
 SET nombre = @nombre, direccion = @direccion, id_municipio = @id_municipio, parent_id = @parent_id
 WHERE id_grupo = @id_grupo
 """
+
+# Nombre ya usado por otro grupo/subgrupo (case-insensitive). Dentro de una
+# transacción el bloqueo de rango impide que otra sesión inserte el mismo
+# nombre entre la verificación y el INSERT/UPDATE.
+GET_GRUPO_DUPLICADO = """
+SELECT TOP 1 id_grupo
+FROM Grupo WITH (UPDLOCK, HOLDLOCK)
+WHERE LOWER(nombre) = LOWER(@nombre)
+  AND (@id_grupo IS NULL OR id_grupo <> @id_grupo)
+"""
@@ -149,4 +149,57 @@ FROM
     dbo.Prueba p
     LEFT JOIN dbo.Evaluado e ON p.id_evaluado = e.id_evaluado
     LEFT JOIN dbo.Grupo g ON e.id_grupo = g.id_grupo;
-"""
\ No newline at end of file
+"""
+# ==================== LISTADO PAGINADO (SERVER-SIDE) ====================
+# {where} lo arma services/listados.py sólo con los filtros activos.
+# Orden estable (fecha, id_prueba) DESC: permite paginar por keyset usando
+# la última fila de la página anterior, o por OFFSET cuando no hay cursor.
+# LEFT JOIN a Evaluado en página, conteo y opciones (como el resumen del
+# historial): las pruebas sin evaluado se cuentan y también se listan.
+
+HISTORIAL_PAGINA_SQL = """
+SELECT
+    p.id_prueba,
+    p.id_evaluado,
+    p.ruta_imagen,
+    CONCAT(e.nombre, ' ', e.apellido) AS [Nombre del evaluado],
+    DATEDIFF(YEAR, e.fecha_nacimiento, GETDATE()) AS Edad,
+    e.sexo AS Sexo,
+    ISNULL(g.nombre, 'Sin grupo') AS Grupo,
+    FORMAT(p.fecha, 'dd/MM/yyyy') AS [Fecha de evaluación],
+    p.fecha AS fecha_orden
+FROM
+    dbo.Prueba p
+    LEFT JOIN dbo.Evaluado e ON p.id_evaluado = e.id_evaluado
+    LEFT JOIN dbo.Grupo g ON e.id_grupo = g.id_grupo
+{where}
+ORDER BY
+    p.fecha DESC, p.id_prueba DESC
+OFFSET @offset ROWS FETCH NEXT @limite ROWS ONLY;
+"""
+
+HISTORIAL_CONTEO_SQL = """
+SELECT COUNT(*) AS total
+FROM
+    dbo.Prueba p
+    LEFT JOIN dbo.Evaluado e ON p.id_evaluado = e.id_evaluado
+    LEFT JOIN dbo.Grupo g ON e.id_grupo = g.id_grupo
+{where};
+"""
+
+# Valores distintos para los selectores del diálogo de filtros (un solo viaje)
+HISTORIAL_OPCIONES_FILTRO_SQL = """
+SELECT DISTINCT 'Evaluado' AS campo, CONCAT(e.nombre, ' ', e.apellido) AS valor
+FROM dbo.Prueba p LEFT JOIN dbo.Evaluado e ON p.id_evaluado = e.id_evaluado
+{where}
+UNION
+SELECT DISTINCT 'Sexo', e.sexo
+FROM dbo.Prueba p LEFT JOIN dbo.Evaluado e ON p.id_evaluado = e.id_evaluado
+{where}
+UNION
+SELECT DISTINCT 'Grupo', ISNULL(g.nombre, 'Sin grupo')
+FROM dbo.Prueba p
+    LEFT JOIN dbo.Evaluado e ON p.id_evaluado = e.id_evaluado
+    LEFT JOIN dbo.Grupo g ON e.id_grupo = g.id_grupo
+{where};
+"""
@@ -17,6 +17,15 @@ GET_INDICADOR_BY_NOMBRE = """
     WHERE nombre = @nombre
 """
 
+# Query para verificar unicidad del nombre (case-insensitive) dentro de una
+# transacción (el bloqueo de rango evita duplicados concurrentes)
+GET_INDICADOR_DUPLICADO = """
+    SELECT TOP 1 id_indicador
+    FROM Indicador WITH (UPDLOCK, HOLDLOCK)
+    WHERE LOWER(LTRIM(RTRIM(nombre))) = LOWER(@nombre)
+      AND (@id_indicador IS NULL OR id_indicador <> @id_indicador)
+"""
+
 # Query para obtener un indicador por ID
 GET_INDICADOR_BY_ID = """
     SELECT id_indicador, nombre, significado
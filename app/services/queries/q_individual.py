@@ -4,7 +4,8 @@ GET_PRUEBAS_POR_EVALUADO = """
 -- CONSULTA: GET_PRUEBAS_POR_EVALUADO
 -- Descripción: Obtiene las pruebas asociadas a un evaluado
 -- Parámetro esperado: id_evaluado (named param for sqlalchemy.text)
--- Devuelve: id_prueba, nombre_archivo, ruta_imagen, formato, fecha (YYYY-MM-DD)
+-- Devuelve: id_prueba, nombre_archivo, ruta_imagen, formato, fecha (YYYY-MM-DD),
+--           ancho/alto de la imagen (NULL en pruebas anteriores a PruebaImagen)
 -- Además agrega una columna `resultados_json` con los resultados de cada prueba en formato JSON
 -- =====================================================
 
@@ -14,6 +15,8 @@ SELECT
     p.ruta_imagen,
     p.formato,
     CONVERT(VARCHAR(10), p.fecha, 120) AS fecha,
+    pi.ancho,
+    pi.alto,
     (
         SELECT
             r.id_resultado,
@@ -35,6 +38,7 @@ SELECT
         FOR JSON PATH
     ) AS resultados_json
 FROM dbo.Prueba p
+LEFT JOIN dbo.PruebaImagen pi ON pi.id_prueba = p.id_prueba
 WHERE p.id_evaluado = @id_evaluado
 ORDER BY p.fecha ASC;
 """
@@ -0,0 +1,123 @@
+# =====================================================
+# MIGRACIONES DE ESQUEMA (versionadas)
+# Cada migración es idempotente por sí misma (IF NOT EXISTS) y además queda
+# registrada en dbo.MigracionEsquema para no volver a ejecutarse.
+# =====================================================
+
+CREAR_MIGRACION_ESQUEMA = """
+-- =====================================================
+-- CONSULTA: CREAR_MIGRACION_ESQUEMA (idempotente)
+-- Descripción: Registro de las migraciones aplicadas
+-- =====================================================
+IF OBJECT_ID('dbo.MigracionEsquema', 'U') IS NULL
+BEGIN
+    CREATE TABLE dbo.MigracionEsquema (
+        version  INT NOT NULL PRIMARY KEY,
+        nombre   NVARCHAR(200) NOT NULL,
+        aplicada DATETIME2 NOT NULL DEFAULT SYSUTCDATETIME()
+    );
+END
+"""
+
+GET_MIGRACIONES_APLICADAS = """
+-- =====================================================
+-- CONSULTA: GET_MIGRACIONES_APLICADAS
+-- Devuelve: version, nombre, aplicada
+-- =====================================================
+SELECT version, nombre, aplicada
+FROM dbo.MigracionEsquema
+ORDER BY version;
+"""
+
+REGISTRAR_MIGRACION = """
+-- =====================================================
+-- CONSULTA: REGISTRAR_MIGRACION
+-- Descripción: Registra la migración si nadie lo hizo antes. El bloqueo de
+--              rango hace esperar a otro proceso que la esté aplicando.
+-- Parámetros: version, nombre
+-- Devuelve: registrada (1 si hay que aplicarla en esta transacción)
+-- =====================================================
+SET NOCOUNT ON;
+INSERT INTO dbo.MigracionEsquema (version, nombre)
+SELECT @version, @nombre
+WHERE NOT EXISTS (
+    SELECT 1 FROM dbo.MigracionEsquema WITH (UPDLOCK, HOLDLOCK) WHERE version = @version
+);
+SELECT @@ROWCOUNT AS registrada;
+"""
+
+# ==================== 001: índices de Prueba ====================
+# Prueba(id_evaluado, fecha): pruebas de un evaluado y EXISTS por rango.
+# Prueba(fecha, id_prueba): rangos de fechas y recálculo del resumen diario.
+MIGRACION_001_INDICES_PRUEBA = """
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_Prueba_id_evaluado_fecha' AND object_id = OBJECT_ID('dbo.Prueba'))
+    CREATE NONCLUSTERED INDEX IX_Prueba_id_evaluado_fecha ON dbo.Prueba (id_evaluado, fecha);
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_Prueba_fecha_id_prueba' AND object_id = OBJECT_ID('dbo.Prueba'))
+    CREATE NONCLUSTERED INDEX IX_Prueba_fecha_id_prueba ON dbo.Prueba (fecha, id_prueba) INCLUDE (id_evaluado);
+"""
+
+# ==================== 002: índice de Resultado ====================
+# Resultado(id_prueba): resultados de una prueba y borrado en cascada.
+MIGRACION_002_INDICE_RESULTADO = """
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_Resultado_id_prueba' AND object_id = OBJECT_ID('dbo.Resultado'))
+    CREATE NONCLUSTERED INDEX IX_Resultado_id_prueba ON dbo.Resultado (id_prueba) INCLUDE (id_indicador);
+"""
+
+# ==================== 003: índices de Evaluado ====================
+# Evaluado(id_usuario) y Evaluado(id_grupo): filtros del listado de evaluados
+# por especialista y por grupo.
+MIGRACION_003_INDICES_EVALUADO = """
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_Evaluado_id_usuario' AND object_id = OBJECT_ID('dbo.Evaluado'))
+    CREATE NONCLUSTERED INDEX IX_Evaluado_id_usuario ON dbo.Evaluado (id_usuario) INCLUDE (id_grupo);
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_Evaluado_id_grupo' AND object_id = OBJECT_ID('dbo.Evaluado'))
+    CREATE NONCLUSTERED INDEX IX_Evaluado_id_grupo ON dbo.Evaluado (id_grupo);
+"""
+
+# ==================== 004: tabla PruebaImagen ====================
+# Metadata de la imagen de cada prueba, guardada al registrarla para que las
+# vistas no tengan que abrir la imagen.
+#   orientacion -> etiqueta EXIF Orientation (1 = normal)
+#   sha256      -> hash en hexadecimal de la imagen archivada (Prueba.ruta_imagen)
+MIGRACION_004_PRUEBA_IMAGEN = """
+IF OBJECT_ID('dbo.PruebaImagen', 'U') IS NULL
+BEGIN
+    CREATE TABLE dbo.PruebaImagen (
+        id_prueba   INT NOT NULL PRIMARY KEY
+            REFERENCES dbo.Prueba (id_prueba) ON DELETE CASCADE,
+        ancho       INT NULL,
+        alto        INT NULL,
+        orientacion TINYINT NULL,
+        bytes       BIGINT NULL,
+        sha256      CHAR(64) NULL
+    );
+END
+"""
+
+# ==================== 005: resumen diario EvaluacionDiaria ====================
+# Una fila por (dia, id_grupo, sexo, id_usuario) con la cantidad de pruebas y
+# de evaluados distintos; se llena desde Prueba/Evaluado al crearla. Después
+# cada alta o baja recalcula sus días (services/resumen_diario.py).
+MIGRACION_005_RESUMEN_DIARIO = """
+IF OBJECT_ID('dbo.EvaluacionDiaria', 'U') IS NULL
+BEGIN
+    CREATE TABLE dbo.EvaluacionDiaria (
+        dia         DATE NOT NULL,
+        id_grupo    INT NULL,
+        sexo        NVARCHAR(50) NULL,
+        id_usuario  INT NULL,
+        n_pruebas   INT NOT NULL,
+        n_evaluados INT NOT NULL
+    );
+    CREATE UNIQUE CLUSTERED INDEX UX_EvaluacionDiaria
+        ON dbo.EvaluacionDiaria (dia, id_grupo, sexo, id_usuario);
+
+    INSERT INTO dbo.EvaluacionDiaria (dia, id_grupo, sexo, id_usuario, n_pruebas, n_evaluados)
+    SELECT CAST(p.fecha AS DATE), e.id_grupo, e.sexo, e.id_usuario,
+           COUNT(*), COUNT(DISTINCT p.id_evaluado)
+    FROM dbo.Prueba p
+    INNER JOIN dbo.Evaluado e ON e.id_evaluado = p.id_evaluado
+    GROUP BY CAST(p.fecha AS DATE), e.id_grupo, e.sexo, e.id_usuario;
+END
+"""
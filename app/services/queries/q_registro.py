@@ -57,4 +57,40 @@ POST_RESULTADO = """
 -- Parámetros esperados:
     INSERT INTO Resultado (id_prueba, id_indicador, confianza, x_min, x_max, y_min, y_max)
     VALUES (@id_prueba, @id_indicador, @confianza, @x_min, @x_max, @y_min, @y_max);
-"""
\ No newline at end of file
+"""
+
+POST_PRUEBA_CON_RESULTADOS = """
+-- =====================================================
+-- CONSULTA: POST_PRUEBA_CON_RESULTADOS
+-- Descripción: Registra una prueba y todos sus resultados en un solo lote
+--              (un viaje a la base y una transacción).
+-- Parámetros: posicionales. Primero los 5 de la prueba
+--             (id_evaluado, nombre_archivo, ruta_imagen, formato, fecha), luego
+--             los 5 de la imagen (ancho, alto, orientacion, bytes, sha256) y
+--             6 por resultado (id_indicador, confianza, x_min, x_max, y_min, y_max).
+-- Los bloques RESULTADOS_DE_PRUEBA_NUEVA (y el recálculo del resumen diario)
+-- se insertan antes del SELECT final. XACT_ABORT hace que cualquier error
+-- (p. ej. una FK de Resultado) aborte el lote y revierta la transacción
+-- completa en lugar de seguir con las sentencias restantes.
+-- Devuelve: id_prueba (el id de la prueba recién creada)
+-- =====================================================
+SET NOCOUNT ON;
+SET XACT_ABORT ON;
+DECLARE @nueva_prueba TABLE (id_prueba INT);
+
+INSERT INTO Prueba (id_evaluado, nombre_archivo, ruta_imagen, formato, fecha)
+OUTPUT INSERTED.id_prueba INTO @nueva_prueba (id_prueba)
+VALUES (%s, %s, %s, %s, %s);
+
+INSERT INTO PruebaImagen (id_prueba, ancho, alto, orientacion, bytes, sha256)
+SELECT id_prueba, %s, %s, %s, %s, %s FROM @nueva_prueba;
+{resultados}
+SELECT id_prueba FROM @nueva_prueba;
+"""
+
+RESULTADOS_DE_PRUEBA_NUEVA = """
+INSERT INTO Resultado (id_prueba, id_indicador, confianza, x_min, x_max, y_min, y_max)
+SELECT n.id_prueba, v.id_indicador, v.confianza, v.x_min, v.x_max, v.y_min, v.y_max
+FROM @nueva_prueba n
+CROSS JOIN (VALUES {filas}) AS v (id_indicador, confianza, x_min, x_max, y_min, y_max);
+"""
@@ -60,6 +60,18 @@ GET_USUARIO_BY_EMAIL = """
     WHERE email = @email
 """
 
+# Query para verificar unicidad de usuario/email dentro de una transacción
+# (el bloqueo de rango evita altas duplicadas concurrentes)
+GET_USUARIO_DUPLICADO = """
+    SELECT TOP 1
+        id_usuario,
+        CASE WHEN usuario = @usuario THEN 1 ELSE 0 END AS mismo_usuario
+    FROM Usuario WITH (UPDLOCK, HOLDLOCK)
+    WHERE (usuario = @usuario OR email = @email)
+      AND (@id_usuario IS NULL OR id_usuario <> @id_usuario)
+    ORDER BY mismo_usuario DESC
+"""
+
 # Query para crear un nuevo usuario
 INSERT_USUARIO = """
     INSERT INTO Usuario (usuario, nombre_completo, email, telefono, rol, password_hash)
@@ -0,0 +1,96 @@
+import logging
+
+from services.db import fetch_df, transaction
+from services.queries.q_estadisticas import (
+    EXISTE_RESUMEN_DIARIO, RECONSTRUIR_RESUMEN_DIARIO, ACTUALIZAR_RESUMEN_DIARIO,
+    DIAS_DE_PRUEBAS, DIAS_DE_EVALUADOS, DIAS_DE_GRUPOS,
+)
+
+# Resumen diario EvaluacionDiaria: pruebas y evaluados distintos por
+# (día, grupo, sexo, especialista). La crea y llena la migración 005
+# (services/migraciones.py); cada alta o baja recalcula sólo sus días dentro
+# de la misma transacción y `reconstruir_resumen_diario` lo rehace entero.
+
+_resumen_existe = False
+
+
+def resumen_diario_disponible() -> bool:
+    """True si EvaluacionDiaria ya existe (migración 005 aplicada).
+
+    Sólo consulta el catálogo, nunca crea la tabla. Mientras falte, el tablero
+    consulta las tablas base; una vez encontrada se recuerda por proceso.
+    """
+    global _resumen_existe
+    if _resumen_existe:
+        return True
+    try:
+        df = fetch_df(EXISTE_RESUMEN_DIARIO)
+    except Exception as e:
+        logging.warning(f"resumen_diario: no se pudo consultar EvaluacionDiaria: {e}")
+        return False
+    _resumen_existe = df is not None and not df.empty and bool(int(df.iloc[0, 0] or 0))
+    return _resumen_existe
+
+
+def _csv(valores) -> str:
+    return ",".join(str(int(v)) for v in valores or [])
+
+
+def _dias(df) -> list:
+    if df is None or df.empty:
+        return []
+    return [str(d)[:10] for d in df.iloc[:, 0].tolist() if d is not None]
+
+
+def dias_de_pruebas(uow, ids_prueba) -> list:
+    """Días ('AAAA-MM-DD') de las pruebas dadas; llamar antes de eliminarlas."""
+    if not ids_prueba:
+        return []
+    return _dias(uow.fetch_df(DIAS_DE_PRUEBAS, {"ids_csv": _csv(ids_prueba)}))
+
+
+def dias_de_evaluados(uow, ids_evaluado) -> list:
+    """Días con pruebas de los evaluados dados."""
+    if not ids_evaluado:
+        return []
+    return _dias(uow.fetch_df(DIAS_DE_EVALUADOS, {"ids_csv": _csv(ids_evaluado)}))
+
+
+def dias_de_grupos(uow, ids_grupo) -> list:
+    """Días con pruebas de evaluados de los grupos dados o de sus subgrupos."""
+    if not ids_grupo:
+        return []
+    return _dias(uow.fetch_df(DIAS_DE_GRUPOS, {"ids_csv": _csv(ids_grupo)}))
+
+
+def actualizar_resumen_diario(uow, dias):
+    """Encola en `uow` el recálculo de EvaluacionDiaria para `dias`.
+
+    No abre otra conexión: si la tabla aún no existe el SQL no hace nada y la
+    migración 005 la llena completa al crearla.
+    """
+    dias = sorted(set(dias or []))
+    if not dias:
+        return
+    uow.execute(ACTUALIZAR_RESUMEN_DIARIO, {"dias_csv": ",".join(dias)})
+
+
+def reconstruir_resumen_diario() -> dict:
+    """Recalcula todo EvaluacionDiaria desde Prueba/Evaluado.
+
+    La tabla debe existir (migración 005). Devuelve `{'filas', 'pruebas'}` del
+    resumen resultante.
+    """
+    if not resumen_diario_disponible():
+        raise RuntimeError("Falta EvaluacionDiaria: aplica las migraciones (python -m services.migraciones)")
+    with transaction() as uow:
+        df = uow.fetch_df(RECONSTRUIR_RESUMEN_DIARIO)
+    fila = df.iloc[0] if df is not None and not df.empty else {}
+    return {"filas": int(fila.get("filas", 0) or 0), "pruebas": int(fila.get("pruebas", 0) or 0)}
+
+
+if __name__ == "__main__":
+    # python -m services.resumen_diario  (desde app/)
+    logging.basicConfig(level=logging.INFO)
+    r = reconstruir_resumen_diario()
+    print(f"EvaluacionDiaria reconstruida: {r['filas']} filas, {r['pruebas']} pruebas")
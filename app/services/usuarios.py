@@ -5,7 +5,8 @@ from pathlib import Path
 from datetime import datetime
 import hashlib
 import time
-from services.db import fetch_df
+from services.db import fetch_df, transaction
+from services.busqueda import mascara_busqueda
 from services.queries.q_usuarios import *
 from components.evaluados import evaluados
 
@@ -19,20 +20,30 @@ def hash_password(password):
     """Genera un hash de la contraseña"""
     return hashlib.sha256(password.encode()).hexdigest()
 
-def verificar_usuario_unico(usuario, email, usuario_id=None):
-    """Verifica que el usuario y email sean únicos"""
-    # Verificar usuario
-    result_usuario = fetch_df(GET_USUARIO_BY_USERNAME, {"usuario": usuario})
-    
-    if not result_usuario.empty and (usuario_id is None or result_usuario.iloc[0]['id_usuario'] != usuario_id):
+def verificar_usuario_unico(uow, usuario, email, usuario_id=None):
+    """Verifica dentro de la transacción `uow` que el usuario y email sean únicos"""
+    dup = uow.fetch_df(GET_USUARIO_DUPLICADO, {
+        "usuario": usuario,
+        "email": email,
+        "id_usuario": int(usuario_id) if usuario_id is not None else None,
+    })
+    if dup is None or dup.empty:
+        return True, ""
+    if int(dup.iloc[0]["mismo_usuario"]):
         return False, "El nombre de usuario ya está en uso"
-    
-    # Verificar email
-    result_email = fetch_df(GET_USUARIO_BY_EMAIL, {"email": email})
-    
-    if not result_email.empty and (usuario_id is None or result_email.iloc[0]['id_usuario'] != usuario_id):
-        return False, "El email ya está registrado"
-    
+    return False, "El email ya está registrado"
+
+
+def guardar_usuario(sql, params, usuario_id=None):
+    """Verifica unicidad y ejecuta el INSERT/UPDATE en una sola transacción.
+
+    Devuelve `(True, "")` o `(False, mensaje)` si el usuario o email ya existen.
+    """
+    with transaction() as uow:
+        es_unico, mensaje = verificar_usuario_unico(uow, params["usuario"], params["email"], usuario_id)
+        if not es_unico:
+            return False, mensaje
+        uow.execute(sql, params)
     return True, ""
 
 label = ":material/add: Agregar Usuario"
@@ -131,16 +142,10 @@ def agregar_usuario_dialog():
                 st.error("El correo debe tener el formato nombre@dominio.com")
                 st.stop()
 
-            es_unico, mensaje = verificar_usuario_unico(usuario, email)
-            if not es_unico:
-                label = ":material/warning:"
-                st.error(f"{label} {mensaje}")
-                st.stop()
-            
             try:
                 password_hash = hash_password(password)
                 
-                fetch_df(INSERT_USUARIO, {
+                es_unico, mensaje = guardar_usuario(INSERT_USUARIO, {
                     "usuario": usuario.strip(),
                     "nombre_completo": nombre_completo.strip(),
                     "email": email.strip().lower(),
@@ -148,6 +153,10 @@ def agregar_usuario_dialog():
                     "rol": rol,
                     "password_hash": password_hash
                 })
+                if not es_unico:
+                    label = ":material/warning:"
+                    st.error(f"{label} {mensaje}")
+                    st.stop()
                 
                 label = f":material/check: Usuario '{usuario}'"
                 st.success(f"{label} creado exitosamente")
@@ -269,15 +278,6 @@ def editar_usuario_dialog(usuario_data):
                 st.error(f"{label} El correo debe tener el formato nombre@dominio.com")
                 st.stop()
 
-            # Verificar unicidad (excluyendo el usuario actual)
-            es_unico, mensaje = verificar_usuario_unico(
-                usuario, email, usuario_data["id_usuario"]
-            )
-            if not es_unico:
-                label = ":material/warning:"
-                st.error(f"{label} {mensaje}")
-                st.stop()
-            
             try:
                 # Preparar hash de contraseña (solo cambiar si se proporcionó nueva)
                 if nueva_password:
@@ -285,8 +285,8 @@ def editar_usuario_dialog(usuario_data):
                 else:
                     password_hash = usuario_data["password_hash"]
                 
-                # Actualizar usuario
-                fetch_df(UPDATE_USUARIO, {
+                # Actualizar usuario (verificando unicidad, excluyendo el actual)
+                es_unico, mensaje = guardar_usuario(UPDATE_USUARIO, {
                     "id_usuario": usuario_data["id_usuario"],
                     "usuario": usuario.strip(),
                     "nombre_completo": nombre_completo.strip(),
@@ -294,7 +294,11 @@ def editar_usuario_dialog(usuario_data):
                     "telefono": telefono.strip() if telefono else None,
                     "rol": rol,
                     "password_hash": password_hash
-                })
+                }, usuario_data["id_usuario"])
+                if not es_unico:
+                    label = ":material/warning:"
+                    st.error(f"{label} {mensaje}")
+                    st.stop()
                 
                 label = f":material/check: Usuario '{usuario}'"
                 st.success(f"{label} actualizado exitosamente")
@@ -319,8 +323,11 @@ def eliminar_usuarios_seleccionados(usuarios_seleccionados):
     try:
         eliminados = []
         
+        with transaction() as uow:
+            for idx, usuario in usuarios_seleccionados.iterrows():
+                uow.execute(DELETE_USUARIO, {"id_usuario": usuario["id_usuario"]})
+
         for idx, usuario in usuarios_seleccionados.iterrows():
-            fetch_df(DELETE_USUARIO, {"id_usuario": usuario["id_usuario"]})
             eliminados.append(f":material/check: Usuario '{usuario['usuario']}' eliminado")
         
         for msg in eliminados:
@@ -426,9 +433,7 @@ def usuarios():
     st.markdown("<br/>", unsafe_allow_html=True)
     # Aplicar búsqueda si hay texto
     if buscar:
-        mask = df_display[['nombre_completo', 'usuario', 'email', 'rol']].apply(
-            lambda row: row.astype(str).str.contains(buscar, case=False).any(), axis=1
-        )
+        mask = mascara_busqueda(st.session_state.usuarios_df, buscar, ['nombre_completo', 'usuario', 'email', 'rol'])
         df_display = df_display[mask]
         df = df[mask]  
     
@@ -0,0 +1,7 @@
+import sys
+from pathlib import Path
+
+# Los módulos se importan como en la app (`services.db`), con app/ como raíz.
+APP_DIR = Path(__file__).resolve().parent.parent
+if str(APP_DIR) not in sys.path:
+    sys.path.insert(0, str(APP_DIR))
@@ -0,0 +1,106 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+
+from services.analitica_indicadores import _Incidencia, asociaciones, coocurrencia, prevalencia_por_cohorte
+
+
+def _pruebas(ids, id_evaluado=None, dia="2024-05-01"):
+    return pd.DataFrame({
+        "id_prueba": ids,
+        "id_evaluado": id_evaluado or [1] * len(ids),
+        "dia": [dia] * len(ids),
+    })
+
+
+def _pares(filas):
+    return pd.DataFrame(filas, columns=["id_prueba", "id_indicador"])
+
+
+def _matriz():
+    """Cuatro pruebas en dos cargas: la segunda trae un indicador nuevo."""
+    m = _Incidencia()
+    m.agregar(_pruebas([10, 11, 12], [1, 1, 2]), _pares([(10, 5), (10, 7), (11, 7), (12, 5), (12, 7)]))
+    m.agregar(_pruebas([13], [3], dia="2024-06-01"), _pares([(13, 9), (13, 5)]))
+    return m
+
+
+def test_agregar_construye_csr_incremental():
+    m = _matriz()
+    assert m.n == 4 and m.hasta_id == 13
+    assert m.columnas == [5, 7, 9]
+    assert m.indptr.tolist() == [0, 2, 3, 5, 7]
+    # Índices ordenados dentro de cada fila
+    assert m.indices.tolist() == [0, 1, 1, 0, 1, 0, 2]
+    assert m.densa(np.arange(m.n)).tolist() == [
+        [1, 1, 0],
+        [0, 1, 0],
+        [1, 1, 0],
+        [1, 0, 1],
+    ]
+
+
+def test_agregar_pruebas_sin_pares_e_ignora_pares_ajenos():
+    m = _Incidencia()
+    # La prueba 21 no tiene indicadores; el par de la 99 no es de esta carga
+    m.agregar(_pruebas([20, 21]), _pares([(20, 4), (99, 4)]))
+    assert m.indptr.tolist() == [0, 1, 1]
+    assert m.indices.tolist() == [0]
+    m.agregar(_pruebas([22]), _pares([]))
+    assert m.indptr.tolist() == [0, 1, 1, 1]
+    assert m.densa(np.array([1, 2])).sum() == 0
+
+
+def test_copia_no_comparte_columnas():
+    m = _matriz()
+    otra = m.copia()
+    otra.agregar(_pruebas([14]), _pares([(14, 11)]))
+    assert m.columnas == [5, 7, 9] and 11 not in m._columna
+    assert otra.columnas == [5, 7, 9, 11] and m.n == 4
+
+
+def test_mascara_por_fecha_y_evaluado():
+    m = _matriz()
+    assert m.mascara((None, None, None, None, None)).tolist() == [True] * 4
+    assert m.mascara((1, None, None, None, None)).tolist() == [True, True, False, False]
+    assert m.mascara((None, None, None, datetime.date(2024, 5, 15), None)).tolist() == [False, False, False, True]
+
+
+def test_coocurrencia_en_bloques(monkeypatch):
+    from services import analitica_indicadores
+
+    m = _matriz()
+    esperada = [[3, 2, 1], [2, 3, 0], [1, 0, 1]]
+    assert coocurrencia(m, np.arange(m.n)).tolist() == esperada
+    # El resultado no depende del tamaño del bloque
+    monkeypatch.setattr(analitica_indicadores, "ANALITICA_BLOQUE_FILAS", 1)
+    assert coocurrencia(m, np.arange(m.n)).tolist() == esperada
+    assert coocurrencia(m, np.array([1, 3])).tolist() == [[1, 0, 1], [0, 1, 0], [1, 0, 1]]
+
+
+def test_prevalencia_por_cohorte():
+    m = _matriz()
+    cohortes, n, conteos = prevalencia_por_cohorte(m, np.arange(m.n), np.array(["F", "F", "M", "M"], dtype=object))
+    assert cohortes.tolist() == ["F", "M"]
+    assert n.tolist() == [2, 2]
+    assert conteos.tolist() == [[1, 2, 0], [2, 1, 1]]
+
+
+def test_asociaciones_lift_y_confianza():
+    # 10 pruebas: a en 4, b en 5, juntos en 4 -> lift = 4 * 10 / (4 * 5) = 2
+    c = np.array([[4, 4, 1], [4, 5, 0], [1, 0, 2]])
+    df = asociaciones(c, 10, top_k=5, min_pruebas=1)
+    assert df[["a", "b", "pruebas"]].values.tolist() == [[0, 1, 4], [0, 2, 1]]
+    primera = df.iloc[0]
+    assert primera["lift"] == 2.0
+    assert primera["soporte"] == 0.4
+    assert primera["confianza_ab"] == 1.0 and primera["confianza_ba"] == 0.8
+    assert df.iloc[1]["lift"] == 1 * 10 / (4 * 2)
+
+
+def test_asociaciones_respeta_min_pruebas_y_top_k():
+    c = np.array([[4, 4, 1], [4, 5, 0], [1, 0, 2]])
+    assert asociaciones(c, 10, min_pruebas=2)[["a", "b"]].values.tolist() == [[0, 1]]
+    assert len(asociaciones(c, 10, top_k=1, min_pruebas=1)) == 1
+    assert asociaciones(np.zeros((3, 3), dtype=np.int64), 0).empty
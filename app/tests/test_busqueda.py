@@ -0,0 +1,58 @@
+import gc
+
+import pandas as pd
+
+from services import busqueda
+from services.busqueda import columna_busqueda, mascara_busqueda
+
+
+def _df():
+    return pd.DataFrame({
+        "nombre": ["Ana López", "Luis Pérez", None],
+        "email": ["ana@x.com", "LUIS@Y.COM", "sin@z.com"],
+        "rol": ["admin", "especialista", "especialista"],
+    }, index=[10, 20, 30])
+
+
+def test_busqueda_sin_mayusculas_y_sin_regex():
+    df = _df()
+    assert mascara_busqueda(df, "luis@y", ["nombre", "email"]).tolist() == [False, True, False]
+    assert mascara_busqueda(df, "  ANA ", ["nombre"]).tolist() == [True, False, False]
+    # '.' es literal, no comodín
+    assert mascara_busqueda(df, "a.c", ["email"]).tolist() == [False, False, False]
+
+
+def test_busqueda_conserva_el_indice_y_tolera_nulos():
+    df = _df()
+    mascara = mascara_busqueda(df, "sin@", ["nombre", "email"])
+    assert list(mascara.index) == [10, 20, 30]
+    assert mascara.tolist() == [False, False, True]
+
+
+def test_texto_vacio_devuelve_todo():
+    df = _df()
+    assert mascara_busqueda(df, "", ["nombre"]).all()
+    assert mascara_busqueda(df, None, ["nombre"]).all()
+
+
+def test_no_coincide_cruzando_columnas():
+    df = _df()
+    # "admin" está en rol y "ana@x.com" en email: unirlos no debe coincidir
+    assert not mascara_busqueda(df, "comadmin", ["email", "rol"]).any()
+
+
+def test_columnas_inexistentes_se_ignoran():
+    df = _df()
+    assert mascara_busqueda(df, "admin", ["rol", "no_existe"]).tolist() == [True, False, False]
+    assert not mascara_busqueda(df, "admin", ["no_existe"]).any()
+
+
+def test_columna_se_calcula_una_vez_y_se_olvida_con_el_df():
+    df = _df()
+    primera = columna_busqueda(df, ["nombre", "email"])
+    assert columna_busqueda(df, ["nombre", "email"]) is primera
+    key = id(df)
+    assert key in busqueda._INDICES
+    del df, primera
+    gc.collect()
+    assert key not in busqueda._INDICES
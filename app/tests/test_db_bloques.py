@@ -0,0 +1,127 @@
+import datetime
+
+import pandas as pd
+import pytest
+
+from services import db
+
+
+FILAS = [
+    (i, f"nombre {i}", None if i % 4 == 0 else 1.5 * i, datetime.datetime(2026, 1, 1 + i % 28))
+    for i in range(1, 11)
+]
+COLUMNAS = ("id", "nombre", "valor", "fecha")
+
+
+class _Cursor:
+    def __init__(self, conn):
+        self._conn = conn
+        self.description = None
+        self._filas = []
+
+    def execute(self, sql, values=None):
+        self._conn.sentencias.append((sql, values))
+        self.description = [(c,) for c in self._conn.columnas]
+        self._filas = list(self._conn.filas)
+
+    def fetchall(self):
+        filas, self._filas = self._filas, []
+        return filas
+
+    def fetchmany(self, n):
+        self._conn.bloques.append(min(n, len(self._filas)))
+        bloque, self._filas = self._filas[:n], self._filas[n:]
+        return bloque
+
+    def close(self):
+        pass
+
+
+class _Conexion:
+    def __init__(self, filas=FILAS, columnas=COLUMNAS):
+        self.filas = filas
+        self.columnas = columnas
+        self.sentencias = []
+        self.bloques = []
+
+    def cursor(self):
+        return _Cursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    estado = {"conn": _Conexion(), "devueltas": [], "descartadas": []}
+    monkeypatch.setattr(db, "borrow_connection", lambda **_: estado["conn"])
+    monkeypatch.setattr(db, "return_connection", estado["devueltas"].append)
+    monkeypatch.setattr(db, "discard_connection", estado["descartadas"].append)
+    return estado
+
+
+def test_fetch_df_por_bloques_igual_que_fetchall(pool):
+    completo = db.fetch_df("SELECT * FROM Prueba")
+    por_bloques = db.fetch_df("SELECT * FROM Prueba", chunk_rows=3)
+
+    pd.testing.assert_frame_equal(por_bloques, completo)
+    assert pool["conn"].bloques == [3, 3, 3, 1, 0]
+    assert por_bloques["id"].dtype == "int64"
+    assert por_bloques["valor"].dtype == "float64"
+    assert str(por_bloques["fecha"].dtype).startswith("datetime64")
+
+
+def test_fetch_df_por_bloques_respeta_columnas_repetidas_y_vacias(pool):
+    pool["conn"] = _Conexion(filas=[], columnas=("id", "id"))
+    df = db.fetch_df("SELECT 1 AS id, 2 AS id WHERE 1 = 0", chunk_rows=5)
+    assert list(df.columns) == ["id", "id"]
+    assert df.empty
+
+
+def test_fetch_df_dtype_backend_nullable(pool):
+    df = db.fetch_df("SELECT * FROM Prueba", chunk_rows=4, dtype_backend="numpy_nullable")
+    assert df["id"].dtype == "Int64"
+    assert df["valor"].isna().sum() == 2
+
+
+def test_iter_df_entrega_bloques_y_devuelve_la_conexion(pool):
+    bloques = list(db.iter_df("SELECT * FROM Prueba WHERE id > @id", {"id": 0}, chunk_rows=4))
+
+    assert [len(b) for b in bloques] == [4, 4, 2]
+    assert list(bloques[0].columns) == list(COLUMNAS)
+    assert pd.concat(bloques, ignore_index=True)["id"].tolist() == list(range(1, 11))
+    assert pool["conn"].sentencias == [("SELECT * FROM Prueba WHERE id > %s", (0,))]
+    assert pool["devueltas"] == [pool["conn"]] and pool["descartadas"] == []
+
+
+def test_iter_df_cerrado_antes_de_tiempo_descarta_la_conexion(pool):
+    gen = db.iter_df("SELECT * FROM Prueba", chunk_rows=4)
+    next(gen)
+    gen.close()
+    assert pool["descartadas"] == [pool["conn"]] and pool["devueltas"] == []
+
+
+def test_iter_df_reintenta_una_vez_si_la_conexion_estaba_muerta(pool, monkeypatch):
+    muerta = _Conexion()
+    conexiones = [muerta, pool["conn"]]
+    validadas = []
+
+    def borrow_connection(validate=False):
+        validadas.append(validate)
+        return conexiones.pop(0)
+
+    def execute_muerta(sql, values=None):
+        raise db._StaleConnection("DB-Lib error message 20006")
+
+    monkeypatch.setattr(db, "borrow_connection", borrow_connection)
+    muerta.cursor = lambda: type("C", (), {"execute": staticmethod(execute_muerta), "close": lambda self: None})()
+
+    bloques = list(db.iter_df("SELECT * FROM Prueba", chunk_rows=20))
+
+    assert validadas == [False, True]
+    assert [len(b) for b in bloques] == [10]
+    assert pool["descartadas"] == [muerta]
+    assert pool["devueltas"] == [pool["conn"]]
@@ -0,0 +1,53 @@
+import pytest
+
+from services.db import MissingParameterError, _compile, _to_positional
+
+
+def test_compile_reescribe_parametros_en_orden():
+    sql, nombres = _compile("SELECT * FROM Prueba WHERE id_evaluado = @id AND fecha >= @desde")
+    assert sql == "SELECT * FROM Prueba WHERE id_evaluado = %s AND fecha >= %s"
+    assert nombres == ("id", "desde")
+
+
+def test_compile_respeta_variables_declaradas_y_globales():
+    sql, nombres = _compile(
+        "DECLARE @nueva TABLE (id INT); INSERT INTO @nueva VALUES (@id); SELECT @@ROWCOUNT"
+    )
+    assert "@nueva" in sql and "@@ROWCOUNT" in sql
+    assert nombres == ("id",)
+
+
+def test_compile_escapa_porcentajes_literales():
+    sql, nombres = _compile("SELECT * FROM Evaluado WHERE nombre LIKE 'a%' AND id = @id")
+    assert sql == "SELECT * FROM Evaluado WHERE nombre LIKE 'a%%' AND id = %s"
+    assert nombres == ("id",)
+
+
+def test_compile_sin_parametros_devuelve_el_texto_original():
+    sql = "SELECT nombre FROM Grupo WHERE nombre LIKE 'a%'"
+    assert _compile(sql) == (sql, ())
+
+
+def test_compile_memoiza_por_texto():
+    sql = "SELECT @a AS a -- test_compile_memoiza_por_texto"
+    antes = _compile.cache_info().hits
+    assert _compile(sql) is _compile(sql)
+    assert _compile.cache_info().hits == antes + 1
+
+
+def test_to_positional_repite_valores_de_parametros_repetidos():
+    sql, valores = _to_positional(
+        "SELECT 1 WHERE (@id IS NULL OR x = @id) AND y = @y", {"id": 3, "y": "b", "extra": 0}
+    )
+    assert sql == "SELECT 1 WHERE (%s IS NULL OR x = %s) AND y = %s"
+    assert valores == (3, 3, "b")
+
+
+def test_to_positional_falla_si_falta_un_parametro():
+    with pytest.raises(MissingParameterError) as exc:
+        _to_positional("SELECT 1 WHERE a = @a AND b = @b AND c = @b", {"a": 1})
+    assert "@b" in str(exc.value)
+
+
+def test_to_positional_deja_pasar_tuplas_posicionales():
+    assert _to_positional("SELECT %s", (1,)) == ("SELECT %s", (1,))
@@ -0,0 +1,94 @@
+import queue
+import threading
+import time
+
+import pytest
+
+from services import db
+
+
+class _Conexion:
+    def __init__(self):
+        self.cerrada = False
+
+    def close(self):
+        self.cerrada = True
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    """Pool vacío de 1 + 1 overflow con conexiones falsas y sin reaper."""
+    monkeypatch.setattr(db, "_make_connection", _Conexion)
+    monkeypatch.setattr(db, "_POOL", queue.Queue(maxsize=1))
+    monkeypatch.setattr(db, "_OPEN_COUNT", 0)
+    monkeypatch.setattr(db, "_CONN_META", {})
+    monkeypatch.setattr(db, "POOL_MIN_SIZE", 0)
+    monkeypatch.setattr(db, "POOL_MAX_SIZE", 1)
+    monkeypatch.setattr(db, "POOL_MAX_OVERFLOW", 1)
+    monkeypatch.setattr(db, "REAPER_INTERVAL_S", 0)
+    return db
+
+
+def _esperar_prestamo(pool, timeout):
+    resultado = {}
+
+    def pedir():
+        inicio = time.monotonic()
+        try:
+            resultado["conn"] = pool.borrow_connection(timeout=timeout)
+        except Exception as e:
+            resultado["error"] = e
+        resultado["espera"] = time.monotonic() - inicio
+
+    hilo = threading.Thread(target=pedir)
+    hilo.start()
+    return hilo, resultado
+
+
+def test_devolver_overflow_despierta_al_que_espera(pool):
+    base = pool.borrow_connection()
+    extra = pool.borrow_connection()
+    assert pool._OPEN_COUNT == 2
+
+    hilo, resultado = _esperar_prestamo(pool, timeout=3.0)
+    time.sleep(0.2)
+    # La de overflow se cierra al devolverla: libera cupo sin pasar por la cola
+    pool.return_connection(extra)
+    hilo.join(5)
+
+    assert extra.cerrada
+    assert "error" not in resultado
+    assert resultado["espera"] < 1.0
+    assert resultado["conn"] is not base
+    pool.return_connection(resultado["conn"])
+    pool.return_connection(base)
+
+
+def test_devolver_a_la_cola_despierta_al_que_espera(pool, monkeypatch):
+    monkeypatch.setattr(pool, "POOL_MAX_OVERFLOW", 0)
+    base = pool.borrow_connection()
+    hilo, resultado = _esperar_prestamo(pool, timeout=3.0)
+    time.sleep(0.2)
+    pool.return_connection(base)
+    hilo.join(5)
+    assert resultado["espera"] < 1.0
+    assert resultado["conn"] is base
+
+
+def test_descartar_una_conexion_rota_libera_cupo(pool):
+    pool.borrow_connection()
+    rota = pool.borrow_connection()
+    hilo, resultado = _esperar_prestamo(pool, timeout=3.0)
+    time.sleep(0.2)
+    pool.discard_connection(rota)
+    hilo.join(5)
+    assert "error" not in resultado and resultado["espera"] < 1.0
+
+
+def test_sin_capacidad_agota_el_timeout(pool):
+    pool.borrow_connection()
+    pool.borrow_connection()
+    inicio = time.monotonic()
+    with pytest.raises(pool.PoolTimeout):
+        pool.borrow_connection(timeout=0.3)
+    assert 0.25 <= time.monotonic() - inicio < 2.0
@@ -0,0 +1,88 @@
+import pytest
+
+from services import db
+
+
+class _Cursor:
+    def __init__(self, conn):
+        self._conn = conn
+        self.description = None
+
+    def execute(self, sql, values=None):
+        self._conn.sentencias.append((sql, values))
+
+    def close(self):
+        pass
+
+
+class _Conexion:
+    def __init__(self):
+        self.sentencias = []
+        self.confirmada = False
+        self.revertida = False
+
+    def cursor(self):
+        return _Cursor(self)
+
+    def commit(self):
+        self.confirmada = True
+
+    def rollback(self):
+        self.revertida = True
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def conexion(monkeypatch):
+    conn = _Conexion()
+    devueltas = []
+    monkeypatch.setattr(db, "borrow_connection", lambda **_: conn)
+    monkeypatch.setattr(db, "return_connection", devueltas.append)
+    conn.devueltas = devueltas
+    return conn
+
+
+def test_commit_desactiva_xact_abort_antes_de_devolver(conexion):
+    with db.transaction() as uow:
+        uow.execute("DELETE FROM Grupo WHERE id_grupo = @id", {"id": 1})
+
+    assert conexion.confirmada
+    assert conexion.sentencias[0][0].startswith("SET XACT_ABORT ON;")
+    assert conexion.sentencias[-1] == ("SET XACT_ABORT OFF", None)
+    assert conexion.devueltas == [conexion]
+
+
+def test_rollback_desactiva_xact_abort_antes_de_devolver(conexion):
+    with pytest.raises(RuntimeError):
+        with db.transaction() as uow:
+            uow.execute("DELETE FROM Grupo WHERE id_grupo = @id", {"id": 1})
+            uow.flush()
+            raise RuntimeError("falla")
+
+    assert conexion.revertida and not conexion.confirmada
+    assert conexion.sentencias[-1] == ("SET XACT_ABORT OFF", None)
+    assert conexion.devueltas == [conexion]
+
+
+def test_sin_envios_no_toca_la_sesion(conexion):
+    with db.transaction():
+        pass
+    assert conexion.sentencias == []
+
+
+def test_execute_rechaza_dict_si_el_sql_no_tiene_parametros(conexion):
+    with pytest.raises(ValueError) as exc:
+        with db.transaction() as uow:
+            uow.execute("DELETE FROM Grupo", {"id": 1})
+    assert "@id" in str(exc.value)
+
+
+def test_execute_ignora_dict_vacio(conexion):
+    with db.transaction() as uow:
+        uow.execute("DELETE FROM Grupo WHERE nombre LIKE 'a%'", {})
+        uow.execute("DELETE FROM Grupo WHERE id_grupo = @id", {"id": 2})
+    lote, valores = conexion.sentencias[0]
+    assert "LIKE 'a%%'" in lote
+    assert valores == (2,)
@@ -0,0 +1,49 @@
+import datetime
+
+from services.estadisticas import _predicados, clave_filtros
+
+
+def test_clave_filtros_normaliza_vacios_y_tipos():
+    assert clave_filtros(None) == (None, None, None, None, None)
+    assert clave_filtros({"id_evaluado": "", "sexo": "  ", "id_grupo": None}) == (None, None, None, None, None)
+    clave = clave_filtros({
+        "id_evaluado": "7", "sexo": " Femenino ", "id_grupo": 3.0,
+        "fecha_inicio": datetime.datetime(2024, 1, 5, 13, 30), "fecha_fin": "2024-02-10",
+    })
+    assert clave == (7, "Femenino", 3, datetime.date(2024, 1, 5), datetime.date(2024, 2, 10))
+
+
+def test_clave_filtros_descarta_valores_invalidos():
+    assert clave_filtros({"id_evaluado": "abc", "fecha_inicio": "no es fecha"}) == (None, None, None, None, None)
+
+
+def test_clave_filtros_es_hashable_y_estable():
+    a = clave_filtros({"sexo": "M", "fecha_inicio": "2024-03-01"})
+    b = clave_filtros({"fecha_inicio": datetime.date(2024, 3, 1), "sexo": "M"})
+    assert a == b and hash(a) == hash(b)
+
+
+def test_predicados_sin_filtros():
+    pred = _predicados(clave_filtros({}))
+    assert pred["evaluado"] == pred["resumen"] == pred["rango"] == []
+    assert pred["params"] == {}
+
+
+def test_predicados_solo_los_filtros_activos():
+    pred = _predicados(clave_filtros({"sexo": "F", "id_grupo": 2}))
+    assert pred["evaluado"] == ["e.sexo = @sexo", "e.id_grupo = @id_grupo"]
+    assert pred["resumen"] == ["r.sexo = @sexo", "r.id_grupo = @id_grupo"]
+    assert pred["params"] == {"sexo": "F", "id_grupo": 2}
+    # El filtro por evaluado no existe en el resumen diario
+    pred = _predicados(clave_filtros({"id_evaluado": 9}))
+    assert pred["evaluado"] == ["e.id_evaluado = @id_evaluado"] and pred["resumen"] == []
+
+
+def test_predicados_rango_semiabierto_por_columna():
+    pred = _predicados(clave_filtros({"fecha_inicio": "2024-01-01", "fecha_fin": "2024-01-31"}))
+    assert pred["rango"] == ["p.fecha >= @fecha_inicio", "p.fecha < @fecha_fin_excl"]
+    assert pred["rango_resumen"] == ["r.dia >= @fecha_inicio", "r.dia < @fecha_fin_excl"]
+    assert pred["rango_p2"] == ["p2.fecha >= @fecha_inicio", "p2.fecha < @fecha_fin_excl"]
+    # Incluye todo el día 'hasta'
+    assert pred["params"]["fecha_fin_excl"] == datetime.date(2024, 2, 1)
+    assert not any("YEAR(" in c for c in pred["rango"])
@@ -0,0 +1,109 @@
+import os
+import threading
+import time
+
+import pytest
+
+from services import gcs
+
+
+URI = "gs://bucket/pruebas/a.png"
+
+
+class _Blob:
+    def __init__(self, contenido):
+        self.contenido = contenido
+        self.generation = 1
+        self.etag = "e1"
+        self.descargas = 0
+
+    def download_to_filename(self, path, if_generation_not_match=None):
+        self.descargas += 1
+        with open(path, "wb") as fh:
+            fh.write(self.contenido)
+
+
+class _Cliente:
+    def __init__(self, blob):
+        self._blob = blob
+
+    def bucket(self, nombre):
+        return self
+
+    def blob(self, ruta):
+        return self._blob
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(gcs, "GCS_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(gcs, "GCS_CACHE_MAX_BYTES", 0)
+    blob = _Blob(b"x" * 100)
+    monkeypatch.setattr(gcs, "get_gcs_client", lambda: _Cliente(blob))
+    return blob
+
+
+def _envejecer(path, segundos):
+    t = time.time() - segundos
+    os.utime(path, (t, t))
+
+
+def test_acierto_concurrente_con_desalojo_no_entrega_un_archivo_borrado(cache, tmp_path, monkeypatch):
+    leida = gcs.download_gcs_uri_to_tmp(URI)
+    otra = tmp_path / "otra.png"
+    otra.write_bytes(b"y" * 100)
+    # La entrada pedida es la menos usada: el desalojo la elegiría primero
+    _envejecer(leida, 120)
+    _envejecer(otra, 60)
+
+    # El desalojo de otro hilo llega justo cuando el lector marca el uso
+    touch_real = gcs._touch
+    desalojo = []
+
+    def touch_con_desalojo(path):
+        if not desalojo:
+            hilo = threading.Thread(target=lambda: gcs.evict_gcs_cache(max_bytes=150))
+            desalojo.append(hilo)
+            hilo.start()
+            hilo.join(0.3)
+        touch_real(path)
+
+    monkeypatch.setattr(gcs, "_touch", touch_con_desalojo)
+    ruta = gcs.download_gcs_uri_to_tmp(URI)
+    desalojo[0].join(5)
+
+    assert ruta == leida
+    assert os.path.exists(ruta)
+    assert not otra.exists()
+    assert cache.descargas == 1
+
+
+def test_entrada_desalojada_se_descarga_de_nuevo(cache):
+    ruta = gcs.download_gcs_uri_to_tmp(URI)
+    os.remove(ruta)
+    assert gcs.download_gcs_uri_to_tmp(URI) == ruta
+    assert os.path.exists(ruta)
+    assert cache.descargas == 2
+
+
+def test_el_desalojo_tras_descargar_no_borra_la_descarga(cache, monkeypatch):
+    monkeypatch.setattr(gcs, "GCS_CACHE_MAX_BYTES", 10)
+    ruta = gcs.download_gcs_uri_to_tmp(URI)
+    assert ruta and os.path.exists(ruta)
+
+
+def test_data_uri_reintenta_si_el_archivo_desaparece(cache, monkeypatch):
+    rutas = []
+    real = gcs.get_image_local_path
+
+    def local_path(uri):
+        ruta = real(uri)
+        if not rutas:
+            os.remove(ruta)
+        rutas.append(ruta)
+        return ruta
+
+    monkeypatch.setattr(gcs, "get_image_local_path", local_path)
+    data = gcs.get_image_data_uri(URI)
+    assert data.startswith("data:image/png;base64,")
+    assert len(rutas) == 2
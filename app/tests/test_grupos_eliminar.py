@@ -0,0 +1,56 @@
+from contextlib import contextmanager
+
+import pandas as pd
+
+from services import grupos
+from services.queries.q_estadisticas import DIAS_DE_GRUPOS
+
+
+class _Uow:
+    def __init__(self):
+        self.llamadas = []
+
+    def fetch_df(self, sql, params=None):
+        self.llamadas.append(("fetch", sql, params))
+        return pd.DataFrame({"dia": pd.to_datetime(["2026-01-02", "2026-01-05"])})
+
+    def execute(self, sql, params=None):
+        self.llamadas.append(("execute", sql, params))
+
+
+def _con_uow(monkeypatch):
+    uow = _Uow()
+
+    @contextmanager
+    def transaction():
+        yield uow
+
+    monkeypatch.setattr(grupos, "transaction", transaction)
+    monkeypatch.setattr(grupos, "invalidar_estadisticas", lambda: None)
+    return uow
+
+
+def test_eliminar_grupos_lee_los_dias_una_sola_vez(monkeypatch):
+    uow = _con_uow(monkeypatch)
+    seleccion = pd.DataFrame({"ID": [4, 7, 9], "Nombre": ["a", "b", "c"]})
+
+    grupos.eliminar_grupos_seleccionados(seleccion)
+
+    lecturas = [c for c in uow.llamadas if c[0] == "fetch"]
+    assert lecturas == [("fetch", DIAS_DE_GRUPOS, {"ids_csv": "4,7,9"})]
+    # La lectura va antes de encolar cualquier borrado
+    assert uow.llamadas[0][0] == "fetch"
+    borrados = [c[2] for c in uow.llamadas if c[1] is grupos.DELETE_GRUPO]
+    assert borrados == [{"id_grupo": 4}, {"id_grupo": 7}, {"id_grupo": 9}]
+
+
+def test_eliminar_subgrupos_lee_los_dias_una_sola_vez(monkeypatch):
+    uow = _con_uow(monkeypatch)
+    seleccion = pd.DataFrame({"ID": [11, 12], "Nombre": ["x", "y"]})
+
+    grupos.eliminar_subgrupos_seleccionados(seleccion)
+
+    assert [c for c in uow.llamadas if c[0] == "fetch"] == [
+        ("fetch", DIAS_DE_GRUPOS, {"ids_csv": "11,12"})
+    ]
+    assert uow.llamadas[0][0] == "fetch"
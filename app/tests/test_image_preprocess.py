@@ -0,0 +1,56 @@
+from PIL import Image
+
+from services.image_preprocess import escalar_caja, preparar_para_archivo, preparar_para_modelo
+
+
+def _imagen(tmp_path, nombre, size, formato):
+    ruta = tmp_path / nombre
+    Image.new("RGB", size, (255, 255, 255)).save(ruta, format=formato)
+    return ruta
+
+
+def test_escalar_caja_vuelve_a_pixeles_originales():
+    # Copia enviada a la mitad en x y a un cuarto en y
+    assert escalar_caja([10, 20, 50.4, 40], 0.5, 0.25) == (20, 80, 101, 160)
+
+
+def test_escalar_caja_sin_escala_y_caja_incompleta():
+    assert escalar_caja([1.6, 2.4, 3, 4], 1.0, 1.0) == (2, 2, 3, 4)
+    assert escalar_caja([5, 6], 0.5, 0.5) == (10, 12, 0, 0)
+    assert escalar_caja(None, 0.5, 0.5) == (0, 0, 0, 0)
+    # Escala 0 (desconocida) se trata como 1
+    assert escalar_caja([7, 8, 9, 10], 0, 0) == (7, 8, 9, 10)
+
+
+def test_preparar_para_modelo_reduce_y_devuelve_escala(tmp_path):
+    origen = _imagen(tmp_path, "grande.png", (4000, 2000), "PNG")
+    envio = preparar_para_modelo(origen, tmp_path / "modelo.jpg", 1280)
+
+    assert envio["ruta"] == str(tmp_path / "modelo.jpg")
+    with Image.open(envio["ruta"]) as im:
+        assert im.format == "JPEG"
+        assert im.size == (1280, 640)
+    assert envio["escala_x"] == 1280 / 4000
+    assert envio["escala_y"] == 640 / 2000
+    # Una caja de la copia reducida cae sobre la misma zona del original
+    assert escalar_caja([128, 64, 640, 320], envio["escala_x"], envio["escala_y"]) == (400, 200, 2000, 1000)
+
+
+def test_preparar_para_modelo_no_recodifica_si_cabe(tmp_path):
+    origen = _imagen(tmp_path, "chica.jpg", (800, 600), "JPEG")
+    envio = preparar_para_modelo(origen, tmp_path / "modelo.jpg", 1280)
+
+    assert envio == {"ruta": str(origen), "escala_x": 1.0, "escala_y": 1.0}
+    assert not (tmp_path / "modelo.jpg").exists()
+
+
+def test_preparar_para_archivo_conserva_jpeg_png_y_recodifica_otros(tmp_path):
+    png = _imagen(tmp_path, "dibujo.png", (3000, 2000), "PNG")
+    assert preparar_para_archivo(png, tmp_path / "archivo.jpg") == str(png)
+
+    tiff = _imagen(tmp_path, "dibujo.tiff", (3000, 2000), "TIFF")
+    archivo = preparar_para_archivo(tiff, tmp_path / "archivo.jpg")
+    with Image.open(archivo) as im:
+        assert im.format == "JPEG"
+        # Tamaño completo: las cajas en píxeles originales siguen valiendo
+        assert im.size == (3000, 2000)
@@ -0,0 +1,40 @@
+from PIL import Image
+
+from components import individual
+from services import miniaturas
+
+
+def _dibujo(tmp_path, size=(2400, 1600)):
+    ruta = tmp_path / "dibujo.jpg"
+    Image.new("RGB", size, (250, 250, 250)).save(ruta, format="JPEG")
+    return ruta
+
+
+def test_tamano_guardado_no_omite_las_fuentes(tmp_path, monkeypatch):
+    monkeypatch.setattr(miniaturas, "THUMB_CACHE_DIR", str(tmp_path / "thumbs"))
+    ruta = _dibujo(tmp_path)
+    # Prueba con PruebaImagen: el tamaño guardado no coincide a propósito con
+    # el archivo para comprobar que no se vuelve a medir
+    prueba = {"ruta_imagen": "gs://bucket-pbll/pruebas/1/dibujo.jpg", "ancho": 1200, "alto": 800}
+
+    nw, nh, data_uri, thumb_uri, zoom_uri = individual._fuentes_imagen(prueba, ruta, True)
+
+    assert (nw, nh) == (1200, 800)
+    assert (prueba["_natural_w"], prueba["_natural_h"]) == (1200, 800)
+    for src in (data_uri, thumb_uri, zoom_uri):
+        assert src and src.startswith("data:image/")
+        assert not src.startswith("gs://")
+    assert thumb_uri != data_uri
+
+
+def test_sin_tamano_guardado_se_mide_la_imagen(tmp_path, monkeypatch):
+    monkeypatch.setattr(miniaturas, "THUMB_CACHE_DIR", str(tmp_path / "thumbs"))
+    ruta = _dibujo(tmp_path, (640, 480))
+    prueba = {"ancho": None, "alto": float("nan")}
+
+    nw, nh, data_uri, thumb_uri, zoom_uri = individual._fuentes_imagen(prueba, ruta, False)
+
+    assert (nw, nh) == (640, 480)
+    # Prueba no activa sin servidor de imágenes: sólo viaja la miniatura
+    assert data_uri == thumb_uri and data_uri.startswith("data:image/")
+    assert zoom_uri is None